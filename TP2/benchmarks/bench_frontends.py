@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los front ends de la Parte B: threaded vs asyncio.
+
+Uso:
+  python3 TP2/benchmarks/bench_frontends.py --clients 1000 --processes 4 --work-ms 5
+
+Para cada front end:
+- levanta el servidor en este mismo proceso (con un ProcessPoolExecutor real)
+- abre `--clients` conexiones concurrentes con el protocolo simple
+  (una request por conexión, como el cliente legacy)
+- mide tiempo total, requests/s, latencias p50/p95 y el pico de threads
+  del proceso mientras dura la carga
+
+La tarea del pool es un sleep de `--work-ms` ms (no hace red ni Selenium),
+de modo que la diferencia medida corresponde al front end.
+"""
+import argparse
+import asyncio
+import json
+import pathlib
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BASE = pathlib.Path(__file__).resolve().parents[1]
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+
+from common.protocol import LEN_STRUCT  # noqa: E402
+from server_processing import (  # noqa: E402
+    AsyncProcessingServer,
+    LengthPrefixedTCPHandler,
+    ThreadedTCPServer,
+)
+
+
+def bench_task(payload):
+    """Tarea de prueba: simula trabajo del worker sin red."""
+    time.sleep(payload.get("work_ms", 0) / 1000)
+    return {"status": "success", "processing_data": {"n": payload.get("n")}}
+
+
+class ThreadSampler:
+    """Muestrea threading.active_count() en segundo plano y guarda el pico."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def one_client(port, n, work_ms, latencies):
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps({"n": n, "work_ms": work_ms}).encode("utf-8")
+    writer.write(LEN_STRUCT.pack(len(data)) + data)
+    await writer.drain()
+    (length,) = LEN_STRUCT.unpack(await reader.readexactly(4))
+    res = json.loads(await reader.readexactly(length))
+    writer.close()
+    await writer.wait_closed()
+    latencies.append(time.perf_counter() - start)
+    return res.get("status") == "success"
+
+
+async def run_load(port, clients, work_ms):
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(one_client(port, n, work_ms, latencies) for n in range(clients)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r is True)
+    return elapsed, ok, latencies
+
+
+def report(name, clients, elapsed, ok, latencies, baseline_threads, peak_threads):
+    lat = sorted(latencies) or [0.0]
+    p95 = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+    print(
+        f"{name:<9} clients={clients} ok={ok} total={elapsed:.2f}s "
+        f"rps={ok / elapsed:.0f} p50={statistics.median(lat) * 1000:.1f}ms "
+        f"p95={p95 * 1000:.1f}ms threads(base={baseline_threads}, peak={peak_threads})"
+    )
+
+
+def bench_threaded(executor, clients, work_ms):
+    server = ThreadedTCPServer(("127.0.0.1", 0), LengthPrefixedTCPHandler)
+    server.executor = executor
+    server.task_fn = bench_task
+    serve_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    serve_thread.start()
+    port = server.server_address[1]
+    baseline = threading.active_count()
+    try:
+        with ThreadSampler() as sampler:
+            elapsed, ok, latencies = asyncio.run(run_load(port, clients, work_ms))
+        report("threaded", clients, elapsed, ok, latencies, baseline, sampler.peak)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_asyncio(executor, clients, work_ms):
+    # El servidor corre en su propio event loop (thread aparte) para no
+    # compartir loop con los clientes del benchmark.
+    loop = asyncio.new_event_loop()
+    server = AsyncProcessingServer("127.0.0.1", 0, executor, task_fn=bench_task)
+    loop.run_until_complete(server.start())
+    port = server.sockets[0].getsockname()[1]
+    serve_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    serve_thread.start()
+    baseline = threading.active_count()
+    try:
+        with ThreadSampler() as sampler:
+            elapsed, ok, latencies = asyncio.run(run_load(port, clients, work_ms))
+        report("asyncio", clients, elapsed, ok, latencies, baseline, sampler.peak)
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        serve_thread.join()
+        loop.close()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark de front ends de la Parte B")
+    p.add_argument("--clients", type=int, default=1000, help="Clientes concurrentes (default: 1000)")
+    p.add_argument("--processes", type=int, default=4, help="Procesos del pool (default: 4)")
+    p.add_argument("--work-ms", type=float, default=5, help="Duración simulada de cada tarea (default: 5 ms)")
+    p.add_argument("--frontend", choices=("both", "threaded", "asyncio"), default="both")
+    args = p.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        # Calentar el pool para no medir el arranque de los workers
+        list(executor.map(bench_task, [{"work_ms": 0}] * args.processes))
+        if args.frontend in ("both", "threaded"):
+            bench_threaded(executor, args.clients, args.work_ms)
+        if args.frontend in ("both", "asyncio"):
+            bench_asyncio(executor, args.clients, args.work_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark del parsing de la Parte A: BeautifulSoup + find_all vs HtmlExtractor.
+
+Uso:
+  python3 TP2/benchmarks/bench_html_parser.py --corpus paginas/
+  python3 TP2/benchmarks/bench_html_parser.py --corpus paginas/ --save-from urls.txt
+  python3 TP2/benchmarks/bench_html_parser.py                    # corpus sintético
+
+- `--corpus DIR`: páginas guardadas (*.html / *.htm). Con `--save-from` se
+  descargan antes las URLs del archivo (una por línea) dentro de DIR.
+- Sin corpus se generan páginas sintéticas de distintos tamaños.
+
+Para cada página se verifica que ambas implementaciones devuelvan exactamente
+lo mismo y se mide el tiempo (mejor de `--repeat`) y el pico de memoria
+(tracemalloc) de cada una.
+"""
+import argparse
+import hashlib
+import pathlib
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+BASE = pathlib.Path(__file__).resolve().parents[1]
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+
+from scraper.html_parser import parse_html_soup, parse_html_with_images  # noqa: E402
+
+IMPLEMENTATIONS = {
+    "soup": lambda html, base: parse_html_soup(html, base, limit=3),
+    "extractor": lambda html, base: parse_html_with_images(html, base, limit=3),
+}
+
+
+def synthetic_page(n_blocks):
+    """Página con la mezcla de tags que interesa al scraper, repetida n_blocks veces."""
+    block = (
+        "<div class='card'><h2>Sección {i}</h2><p>Texto de relleno con <b>negritas</b> "
+        "y <a href='/item/{i}?ref=home'>un enlace</a>.</p><img src='/img/{i}.jpg' alt=''>"
+        "<ul><li><a href='https://otro.example/{i}'>externo</a></li><li>item</li></ul></div>"
+    )
+    head = (
+        "<html><head><title>Página sintética</title>"
+        "<meta name='description' content='desc'><meta property='og:title' content='og'>"
+        "</head><body><h1>Portada</h1>"
+    )
+    return head + "".join(block.format(i=i) for i in range(n_blocks)) + "</body></html>"
+
+
+def save_pages(urls_file, corpus):
+    corpus.mkdir(parents=True, exist_ok=True)
+    for line in pathlib.Path(urls_file).read_text(encoding="utf-8").splitlines():
+        url = line.strip()
+        if not url or url.startswith("#"):
+            continue
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        try:
+            with urllib.request.urlopen(url, timeout=30) as resp:
+                (corpus / name).write_bytes(resp.read())
+            print(f"guardada {url} -> {name}")
+        except Exception as e:
+            print(f"error descargando {url}: {e}")
+
+
+def load_corpus(corpus):
+    pages = []
+    if corpus is not None:
+        for path in sorted(corpus.glob("*.htm*")):
+            pages.append((path.name, path.read_text(encoding="utf-8", errors="replace")))
+    if not pages:
+        for n in (50, 500, 5000, 20000):
+            pages.append((f"sintetica-{n}", synthetic_page(n)))
+    return pages
+
+
+def measure(fn, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(html, "https://example.com/")
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(html, "https://example.com/")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark de parsing HTML (Parte A)")
+    p.add_argument("--corpus", type=pathlib.Path, help="Directorio con páginas guardadas (*.html)")
+    p.add_argument("--save-from", help="Archivo con URLs a descargar dentro de --corpus antes de medir")
+    p.add_argument("--repeat", type=int, default=5, help="Repeticiones por página (default: 5)")
+    args = p.parse_args()
+
+    if args.save_from:
+        if args.corpus is None:
+            p.error("--save-from requiere --corpus")
+        save_pages(args.save_from, args.corpus)
+
+    totals = {name: 0.0 for name in IMPLEMENTATIONS}
+    print(f"{'página':<24} {'KB':>8} " + " ".join(f"{n + ' ms':>13} {n + ' MB':>13}" for n in IMPLEMENTATIONS))
+    for name, html in load_corpus(args.corpus):
+        outputs = [fn(html, "https://example.com/") for fn in IMPLEMENTATIONS.values()]
+        if any(out != outputs[0] for out in outputs[1:]):
+            print(f"{name}: ¡las implementaciones difieren!")
+        row = []
+        for impl, fn in IMPLEMENTATIONS.items():
+            elapsed, peak = measure(fn, html, args.repeat)
+            totals[impl] += elapsed
+            row.append(f"{elapsed * 1000:>13.2f} {peak / 2**20:>13.2f}")
+        print(f"{name[:24]:<24} {len(html) / 1024:>8.0f} " + " ".join(row))
+
+    soup, extractor = totals["soup"], totals["extractor"]
+    print(f"total: soup={soup * 1000:.1f} ms extractor={extractor * 1000:.1f} ms (x{soup / extractor:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la normalización de enlaces: urljoin por cada href vs LinkNormalizer.
+
+Uso:
+  python3 TP2/benchmarks/bench_links.py
+  python3 TP2/benchmarks/bench_links.py --anchors 20000 --unique 0.1 --repeat 10
+
+Genera los href de una página con mucha navegación (`--anchors` enlaces, de
+los cuales una fracción `--unique` son distintos): relativos a la raíz,
+relativos al directorio, fragmentos, absolutos a otros hosts y con parámetros
+de tracking. Compara:
+
+- "urljoin": lo que hacía _extract_links (urljoin por anchor, con repetidos)
+  más la deduplicación con dict.fromkeys;
+- "normalizer": LinkNormalizer (caché por página, atajo para paths simples).
+
+Verifica que ambos devuelvan la misma lista y muestra el mejor tiempo de
+`--repeat` corridas.
+"""
+import argparse
+import pathlib
+import random
+import sys
+import time
+from urllib.parse import urljoin
+
+BASE = pathlib.Path(__file__).resolve().parents[1]
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+
+from scraper.link_normalizer import LinkNormalizer  # noqa: E402
+
+PAGE_URL = "https://www.example.com/seccion/nota.html"
+
+
+def synthetic_hrefs(anchors, unique, seed=0):
+    rnd = random.Random(seed)
+    distinct = max(1, int(anchors * unique))
+    kinds = [
+        lambda i: f"/categoria/{i % 50}/item-{i}",
+        lambda i: f"item-{i}.html",
+        lambda i: f"#seccion-{i}",
+        lambda i: f"https://otro{i % 7}.example/{i}",
+        lambda i: f"/buscar?q={i}&utm_source=nav&utm_medium=menu",
+        lambda i: f"../archivo/{i}/",
+    ]
+    pool = [kinds[i % len(kinds)](i) for i in range(distinct)]
+    return [rnd.choice(pool) for _ in range(anchors)]
+
+
+def with_urljoin(hrefs):
+    return list(dict.fromkeys(urljoin(PAGE_URL, href) for href in hrefs))
+
+
+def with_normalizer(hrefs):
+    links = LinkNormalizer(PAGE_URL)
+    for href in hrefs:
+        links.add(href)
+    return links.links
+
+
+IMPLEMENTATIONS = {"urljoin": with_urljoin, "normalizer": with_normalizer}
+
+
+def best_of(fn, hrefs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(hrefs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark de normalización de enlaces")
+    p.add_argument("--anchors", type=int, nargs="+", default=[1000, 5000, 20000], help="Anchors por página")
+    p.add_argument("--unique", type=float, default=0.2, help="Fracción de href distintos (default: 0.2)")
+    p.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso (default: 5)")
+    args = p.parse_args()
+
+    print(f"{'anchors':>8} {'únicos':>8} " + " ".join(f"{n + ' ms':>14}" for n in IMPLEMENTATIONS) + f" {'speedup':>8}")
+    for anchors in args.anchors:
+        hrefs = synthetic_hrefs(anchors, args.unique)
+        outputs = [fn(hrefs) for fn in IMPLEMENTATIONS.values()]
+        if outputs[0] != outputs[1]:
+            print(f"{anchors}: ¡las implementaciones difieren!")
+        times = [best_of(fn, hrefs, args.repeat) for fn in IMPLEMENTATIONS.values()]
+        row = " ".join(f"{t * 1000:>14.2f}" for t in times)
+        print(f"{anchors:>8} {len(outputs[0]):>8} {row} {times[0] / times[1]:>7.1f}x")
+
+    # Con filtros: cuántos enlaces se colapsan al quitar fragmentos y tracking
+    hrefs = synthetic_hrefs(args.anchors[-1], args.unique)
+    stripped = LinkNormalizer(PAGE_URL, strip_fragments=True, strip_tracking=True)
+    for href in hrefs:
+        stripped.add(href)
+    print(f"con strip_fragments + strip_tracking: {len(stripped.links)} enlaces, {stripped.counts()}")
+
+
+if __name__ == "__main__":
+    main()
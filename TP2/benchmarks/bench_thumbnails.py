@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark del motor de thumbnails de la Parte B (imágenes por segundo).
+
+Uso:
+  python3 TP2/benchmarks/bench_thumbnails.py
+  python3 TP2/benchmarks/bench_thumbnails.py --sizes 1024x768 4000x3000 --images 24 --processes 4
+
+Genera fotos sintéticas JPEG (ruido suave, para que no compriman como un color
+plano) y un PNG por tamaño. Compara:
+
+- "legacy": lo que hacía make_thumbnail (decodificación completa, convert("RGB"),
+  thumbnail y PNG con optimize=True);
+- el motor de processor/thumbnails.py en cada formato (webp, jpeg, png), con
+  draft en JPEG.
+
+Al final mide el pool de procesos con una llamada por imagen vs un lote por
+página (`--per-page` imágenes), con el formato por defecto.
+"""
+import argparse
+import io
+import pathlib
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageFilter
+
+BASE = pathlib.Path(__file__).resolve().parents[1]
+if str(BASE) not in sys.path:
+    sys.path.insert(0, str(BASE))
+
+from processor.thumbnails import DEFAULT_FORMAT, FORMATS, ThumbnailProfile, make_thumbnail, make_thumbnails  # noqa: E402
+
+
+def synthetic_photo(width, height, fmt, seed=0):
+    rnd = random.Random(seed)
+    small = Image.new("RGB", (64, 48))
+    small.putdata([(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)) for _ in range(64 * 48)])
+    img = small.resize((width, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(2))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+def legacy_thumbnail(data):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    img.thumbnail((128, 128))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def images_per_second(fn, images, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in images:
+            fn(data)
+        best = min(best, time.perf_counter() - start)
+    return len(images) / best
+
+
+def parse_size(value):
+    width, _, height = value.partition("x")
+    return int(width), int(height)
+
+
+def bench_pool(images, processes, per_page):
+    """Imágenes/s en el pool: una llamada por imagen vs un lote por página."""
+    pages = [images[i:i + per_page] for i in range(0, len(images), per_page)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        list(pool.map(make_thumbnails, [[images[0]]] * processes))  # calentar los workers
+        start = time.perf_counter()
+        list(pool.map(make_thumbnail, images))
+        single = len(images) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        list(pool.map(make_thumbnails, pages))
+        batched = len(images) / (time.perf_counter() - start)
+    return single, batched
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark de thumbnails (imágenes/s)")
+    p.add_argument("--sizes", type=parse_size, nargs="+", default=[(1024, 768), (4000, 3000)],
+                   help="Tamaños de las imágenes de prueba, ANCHOxALTO")
+    p.add_argument("--images", type=int, default=12, help="Imágenes por caso (default: 12)")
+    p.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso (default: 3)")
+    p.add_argument("--processes", type=int, default=4, help="Procesos del pool (default: 4)")
+    p.add_argument("--per-page", type=int, default=3, help="Imágenes por lote en el pool (default: 3)")
+    args = p.parse_args()
+
+    implementations = {"legacy": legacy_thumbnail}
+    for fmt in FORMATS:
+        profile = ThumbnailProfile(format=fmt)
+        implementations[fmt] = lambda data, profile=profile: make_thumbnail(data, profile)
+
+    print(f"{'imagen':>16} " + " ".join(f"{name + ' img/s':>13}" for name in implementations)
+          + f" {'speedup':>8}")
+    for width, height in args.sizes:
+        for source in ("JPEG", "PNG"):
+            data = synthetic_photo(width, height, source)
+            images = [data] * args.images
+            rates = [images_per_second(fn, images, args.repeat) for fn in implementations.values()]
+            best = max(rates[1:])
+            label = f"{source} {width}x{height}"
+            print(f"{label:>16} " + " ".join(f"{r:>13.1f}" for r in rates) + f" {best / rates[0]:>7.1f}x")
+
+    width, height = args.sizes[0]
+    images = [synthetic_photo(width, height, "JPEG", seed=i) for i in range(max(args.images, args.processes) * 4)]
+    single, batched = bench_pool(images, args.processes, args.per_page)
+    print(f"pool de {args.processes} procesos ({DEFAULT_FORMAT}, JPEG {width}x{height}): "
+          f"{single:.1f} img/s de a una, {batched:.1f} img/s en lotes de {args.per_page}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,36 @@ Cliente de prueba sencillo para el endpoint /scrape del Servidor A.
 
 Uso:
   python3 TP2/client.py --server http://127.0.0.1:8000 --url https://example.com
+  python3 TP2/client.py --server http://127.0.0.1:8000 --file urls.txt
+  python3 TP2/client.py --url https://example.com --fields title,meta_tags
+  python3 TP2/client.py --direct --process-port 9001 --url https://example.com
 
 Este script:
 - realiza una petición GET al servidor A (/scrape?url=...)
 - imprime la respuesta JSON formateada
+- con --file envía todas las URLs del archivo (una por línea) a /scrape/batch
+  e imprime cada resultado (una línea JSON) a medida que el servidor lo envía
+- con --fields pide sólo esos campos (?fields=)
+- con --direct no usa el servidor A: corre el mismo motor (scraper.engine) en
+  este proceso y consulta directamente a la Parte B
 - es útil para pruebas manuales cuando se levanta server_scraping.py
 """
 import argparse
 import asyncio
 import json
+import sys
 import aiohttp
+from aiohttp import web
 
+from common.serialization import json_default
+from scraper.engine import ScrapeEngine, http_error_message, make_options
 
-async def main(server: str, url: str):
+
+async def main(server: str, url: str, fields=None):
     async with aiohttp.ClientSession() as session:
         params = {"url": url}
+        if fields:
+            params["fields"] = fields
         try:
             async with session.get(f"{server}/scrape", params=params, timeout=aiohttp.ClientTimeout(total=60)) as resp:
                 text = await resp.text()
@@ -32,9 +47,83 @@ async def main(server: str, url: str):
             print("Error al conectar con servidor:", e)
 
 
+async def read_url_lines(path: str):
+    """Sube el archivo como NDJSON línea por línea, sin cargarlo entero en memoria."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield (json.dumps(line) + "\n").encode("utf-8")
+
+
+async def main_batch(server: str, path: str, fields=None):
+    async with aiohttp.ClientSession() as session:
+        try:
+            # Sin timeout total: un batch grande puede tardar lo que haga falta
+            async with session.post(
+                f"{server}/scrape/batch",
+                params={"fields": fields} if fields else None,
+                data=read_url_lines(path),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=300),
+            ) as resp:
+                if resp.status != 200:
+                    print(f"Error {resp.status}:", await resp.text())
+                    return
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if item.get("done"):
+                        print(f"total={item['total']} success={item['success']} "
+                              f"partial_failure={item['partial_failure']} failed={item['failed']}",
+                              file=sys.stderr)
+                    else:
+                        print(json.dumps(item, ensure_ascii=False), flush=True)
+        except Exception as e:
+            print("Error al conectar con servidor:", e)
+
+
+async def main_direct(url: str, path=None, fields=None, process_host="127.0.0.1", process_port=9001):
+    """Scraping + procesamiento sin el servidor A, con el motor en este proceso."""
+    try:
+        options = make_options(fields=fields)
+    except ValueError as e:
+        print("Error:", e, file=sys.stderr)
+        return
+    async with ScrapeEngine(process_host=process_host, process_port=process_port) as engine:
+        if path is None:
+            try:
+                data = await engine.run(url, options)
+            except web.HTTPException as e:
+                data = {"url": url, "status": "failed", "error": http_error_message(e), "http_status": e.status}
+            print(json.dumps(data, indent=2, ensure_ascii=False, default=json_default))
+            return
+        with open(path, encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        async for item in engine.run_batch(urls, options):
+            if item.get("done"):
+                print(f"total={item['total']} success={item['success']} "
+                      f"partial_failure={item['partial_failure']} failed={item['failed']}",
+                      file=sys.stderr)
+            else:
+                print(json.dumps(item, ensure_ascii=False, default=json_default), flush=True)
+
+
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("--server", default="http://127.0.0.1:8000", help="URL del servidor A")
     p.add_argument("--url", default="https://example.com", help="URL a scrapear")
+    p.add_argument("--file", help="Archivo con una URL por línea: usa /scrape/batch")
+    p.add_argument("--fields", help="Campos a pedir separados por coma (p. ej. title,meta_tags,screenshot)")
+    p.add_argument("--direct", action="store_true", help="Scrapear en este proceso, sin el servidor A")
+    p.add_argument("--process-host", default="127.0.0.1", help="Con --direct: host de la Parte B")
+    p.add_argument("--process-port", default=9001, type=int, help="Con --direct: puerto de la Parte B")
     args = p.parse_args()
-    asyncio.run(main(args.server, args.url))
\ No newline at end of file
+    if args.direct:
+        asyncio.run(main_direct(args.url, args.file, args.fields, args.process_host, args.process_port))
+    elif args.file:
+        asyncio.run(main_batch(args.server, args.file, args.fields))
+    else:
+        asyncio.run(main(args.server, args.url, args.fields))
@@ -0,0 +1,148 @@
+"""
+Módulo: blob_store.py
+---------------------
+Almacén de blobs (thumbnails, screenshots) direccionado por contenido.
+
+- La clave por defecto es el SHA-256 del contenido: el mismo logo o sprite
+  que aparece en muchas páginas se guarda una sola vez y su id es estable.
+  También se puede guardar con una clave propia (p. ej. el hash de la imagen
+  de origen + los parámetros del thumbnail).
+- Primer nivel en memoria (LRU acotado por bytes) y, opcionalmente, un
+  directorio: los procesos que lo comparten ven los blobs de los demás y los
+  blobs sobreviven a un reinicio. Cada blob es un archivo `<clave[:2]>/<clave>`
+  escrito de forma atómica (archivo temporal + os.replace).
+- Es thread-safe (en la Parte B lo usan los workers y en la Parte A el event loop).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+def blob_id(data: bytes) -> str:
+    """Id de un blob: SHA-256 (hex) de su contenido."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_blob_id(value: str) -> bool:
+    """True si `value` tiene la forma de un id (hex de 64 caracteres)."""
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def sniff_content_type(data: bytes) -> str:
+    """Content-Type de un blob según su firma (PNG, JPEG, WebP, GIF u octet-stream)."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """
+    Blobs en memoria (LRU por bytes) con un directorio opcional como segundo nivel.
+
+    `max_bytes` = 0 deshabilita la memoria (sólo disco, si hay directorio).
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stored": 0, "evictions": 0}
+
+    def put(self, data: bytes, key: Optional[str] = None) -> str:
+        """Guarda `data` (si no estaba) y devuelve su clave."""
+        key = key or blob_id(data)
+        with self._lock:
+            if key in self._blobs:
+                self._blobs.move_to_end(key)
+                return key
+            self._remember(key, data)
+            self.counters["stored"] += 1
+        if self.directory:
+            path = self._path(key)
+            if not os.path.exists(path):
+                self._write(path, data)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Contenido del blob o None."""
+        with self._lock:
+            data = self._blobs.get(key)
+            if data is not None:
+                self._blobs.move_to_end(key)
+                self.counters["hits"] += 1
+                return data
+        data = self._read(key) if self.directory and is_blob_id(key) else None
+        with self._lock:
+            if data is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self._remember(key, data)
+        return data
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._blobs:
+                return True
+        return bool(self.directory) and is_blob_id(key) and os.path.exists(self._path(key))
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return  # no entra en memoria: queda sólo en disco (si hay)
+        self._blobs[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, oldest = self._blobs.popitem(last=False)
+            self._bytes -= len(oldest)
+            self.counters["evictions"] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._blobs),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "persistent": bool(self.directory),
+                **self.counters,
+            }
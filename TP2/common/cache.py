@@ -0,0 +1,283 @@
+"""
+Módulo: cache.py
+----------------
+Caché de resultados de scraping y procesamiento, indexada por URL normalizada.
+
+- Cada espacio de nombres ("scraping", "processing") tiene su propio TTL: el
+  HTML cambia más seguido que lo que vale la pena volver a capturar con Selenium.
+- La memoria se acota por cantidad de entradas y por bytes (tamaño serializado);
+  al superarse se descarta la entrada usada hace más tiempo (LRU).
+- Opcionalmente las entradas se escriben también en SQLite, de modo que
+  sobreviven a un reinicio; la memoria actúa como primer nivel. Desde el
+  event loop (Parte A) se usan aget / aset, que hacen la E/S del backend en
+  un thread propio.
+- SingleFlight colapsa requests concurrentes con la misma clave en una sola
+  ejecución cuyo resultado comparten todos.
+- conditional_headers / response_validators: validadores HTTP (ETag,
+  Last-Modified) para revalidar una descarga previa con un GET condicional.
+"""
+
+import asyncio
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+_MISS = object()
+
+
+def normalize_url(url):
+    """
+    Clave canónica de una URL: esquema y host en minúsculas, sin puerto por
+    defecto, sin fragmento, path vacío como "/" y query ordenada. Los hosts
+    IPv6 conservan los corchetes y el usuario/contraseña se mantiene: una
+    respuesta obtenida con credenciales no se sirve a quien no las envió.
+    Lanza ValueError si la URL está mal formada (p. ej. puerto inválido).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    userinfo, _, _ = parts.netloc.rpartition("@")
+    if userinfo:
+        host = f"{userinfo}@{host}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def response_validators(headers):
+    """ETag / Last-Modified de una respuesta (dict vacío si no trae ninguno)."""
+    validators = {}
+    if headers.get("ETag"):
+        validators["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        validators["last_modified"] = headers["Last-Modified"]
+    return validators
+
+
+def conditional_headers(entry):
+    """Headers If-None-Match / If-Modified-Since a partir de validadores guardados."""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class SqliteBackend:
+    """Segundo nivel persistente: una tabla (key, expires, value) con valores en pickle."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value BLOB)"
+            )
+            self._db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def set(self, key, expires, blob):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)", (key, expires, blob)
+            )
+
+    def delete(self, key):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache:
+    """
+    Caché LRU con TTL por espacio de nombres y backend persistente opcional.
+
+    `ttls` mapea espacio de nombres -> segundos; un TTL de 0 (o un espacio que
+    no figura) deshabilita la caché para ese espacio. Es thread-safe: en la
+    Parte B la usan los threads de I/O (get / set). En un event loop se usan
+    aget / aset: la memoria se consulta en el acto y el backend persistente en
+    un único thread de E/S.
+    """
+
+    def __init__(self, ttls, max_entries=1024, max_bytes=256 * 1024 * 1024, backend=None, clock=time.time):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.backend = backend
+        self.clock = clock  # reloj de pared: las expiraciones se guardan también en disco
+        self._entries = OrderedDict()  # "ns:key" -> (expires, size, value)
+        self._bytes = 0
+        self._counters = {ns: {"hits": 0, "misses": 0} for ns in self.ttls}
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._io = None  # thread de E/S del backend para aget / aset (se crea al usarlo)
+
+    def enabled(self, ns):
+        return self.max_entries > 0 and self.ttls.get(ns, 0) > 0
+
+    def get(self, ns, key):
+        """Valor vigente o None (cuenta hit/miss)."""
+        if not self.enabled(ns):
+            return None
+        with self._lock:
+            value = self._get_memory(ns, key)
+        if value is not _MISS:
+            return value
+        return self._get_backend(ns, key)
+
+    async def aget(self, ns, key):
+        """Como get, pero la consulta al backend no bloquea el event loop."""
+        if not self.enabled(ns):
+            return None
+        with self._lock:
+            value = self._get_memory(ns, key)
+        if value is not _MISS:
+            return value
+        if self.backend is None:
+            return self._get_backend(ns, key)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor(), self._get_backend, ns, key)
+
+    def _get_memory(self, ns, key):
+        """Valor vigente en memoria (cuenta el hit) o _MISS."""
+        full_key = f"{ns}:{key}"
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(full_key)
+                self._counters[ns]["hits"] += 1
+                return entry[2]
+            self._drop(full_key)
+        return _MISS
+
+    def _get_backend(self, ns, key):
+        """Segundo nivel: lo sube a memoria si está vigente; cuenta hit/miss."""
+        full_key = f"{ns}:{key}"
+        if self.backend is not None:
+            row = self.backend.get(full_key)
+            if row is not None:
+                expires, blob = row
+                if expires > self.clock():
+                    value = pickle.loads(blob)
+                    with self._lock:
+                        self._store(full_key, expires, len(blob), value)
+                        self._counters[ns]["hits"] += 1
+                    return value
+                self.backend.delete(full_key)
+        with self._lock:
+            self._counters[ns]["misses"] += 1
+        return None
+
+    def set(self, ns, key, value):
+        row = self._set_memory(ns, key, value)
+        if row is not None and self.backend is not None:
+            self.backend.set(*row)
+
+    async def aset(self, ns, key, value):
+        """Como set, pero la escritura en el backend no bloquea el event loop."""
+        row = self._set_memory(ns, key, value)
+        if row is not None and self.backend is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._io_executor(), self.backend.set, *row)
+
+    def _set_memory(self, ns, key, value):
+        """Guarda en memoria y devuelve la fila (clave, expiración, pickle) para el backend."""
+        if not self.enabled(ns):
+            return None
+        full_key = f"{ns}:{key}"
+        expires = self.clock() + self.ttls[ns]
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._store(full_key, expires, len(blob), value)
+        return full_key, expires, blob
+
+    def _io_executor(self):
+        if self._io is None:
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-io")
+        return self._io
+
+    def _store(self, full_key, expires, size, value):
+        if full_key in self._entries:
+            self._drop(full_key)
+        if size > self.max_bytes:
+            return  # nunca entraría: sólo queda en el backend
+        self._entries[full_key] = (expires, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, full_key):
+        _, size, _ = self._entries.pop(full_key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "persistent": self.backend is not None,
+                **{ns: dict(c, ttl=self.ttls[ns]) for ns, c in self._counters.items()},
+            }
+
+    def close(self):
+        if self._io is not None:
+            self._io.shutdown(wait=True)
+            self._io = None
+        if self.backend is not None:
+            self.backend.close()
+
+
+class SingleFlight:
+    """
+    Colapsa llamadas concurrentes con la misma clave: la primera ejecuta
+    `factory()` y las demás esperan el mismo resultado (o excepción).
+    La tarea compartida sigue aunque quien la inició sea cancelado.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.collapsed = 0
+
+    async def run(self, key, factory):
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # evita "exception was never retrieved" si nadie la esperaba
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "started": self.started, "collapsed": self.collapsed}
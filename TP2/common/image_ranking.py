@@ -0,0 +1,55 @@
+"""
+Módulo: image_ranking.py
+------------------------
+Orden de las imágenes principales de una página, compartido por la Parte A
+(HtmlExtractor, que reenvía las imágenes a B) y la Parte B
+(pipeline.find_image_sources, cuando parsea el HTML ella misma), para que
+ambos caminos elijan las mismas imágenes:
+
+1. og:image (la imagen que la página declara como representativa)
+2. <img> con tamaño declarado, de mayor a menor área
+3. <img> sin tamaño declarado, en orden de aparición
+4. <img> declaradas más chicas que MIN_DECLARED_AREA (íconos, tracking)
+
+Las URIs data: se descartan y los src repetidos se cuentan una vez.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+
+MIN_DECLARED_AREA = 64 * 64  # imágenes declaradas más chicas (íconos, píxeles de tracking) van al final
+OG_IMAGE_PROPERTIES = ("og:image", "og:image:url", "og:image:secure_url")
+MAX_CANDIDATES = 512  # <img> que se consideran por página (acota la memoria del parser en streaming)
+
+
+def declared_area(width, height) -> Optional[int]:
+    """width x height declarados (admite "640px"), o None si falta alguno o no es un número."""
+    try:
+        return int(str(width).rstrip("px")) * int(str(height).rstrip("px"))
+    except ValueError:
+        return None
+
+
+def usable_source(src: Optional[str]) -> bool:
+    return bool(src) and not src.startswith("data:")
+
+
+def rank_image_sources(
+    candidates: Iterable[Tuple[str, object, object]], og_images: Iterable[str] = (), limit: Optional[int] = None
+) -> List[str]:
+    """
+    Hasta `limit` src ordenados según el módulo. `candidates` son los
+    (src, width, height) de los <img> en orden de aparición.
+    """
+    ranked = []
+    for position, (src, width, height) in enumerate(candidates):
+        if not usable_source(src):
+            continue
+        area = declared_area(width, height)
+        if area is None:
+            group, area = 1, 0
+        else:
+            group = 0 if area >= MIN_DECLARED_AREA else 2
+        ranked.append((group, -area, position, src))
+    srcs = [src for src in og_images if usable_source(src)] + [src for *_, src in sorted(ranked)]
+    srcs = list(dict.fromkeys(srcs))
+    return srcs if limit is None else srcs[:limit]
@@ -0,0 +1,66 @@
+"""
+Módulo: loop_monitor.py
+-----------------------
+Medición del retraso (lag) del event loop.
+
+Una tarea duerme `interval` segundos en bucle y registra cuánto tarde se
+despertó respecto de lo pedido: si algo bloquea el loop (p. ej. parsear una
+página grande dentro de un handler), ese bloqueo aparece como lag. Las
+estadísticas (p50/p95/p99/máximo sobre las últimas muestras) permiten ver el
+efecto de mover trabajo de CPU a un executor.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+
+class LoopLagMonitor:
+    def __init__(self, interval=0.05, window=1200):
+        self.interval = interval
+        self._samples = deque(maxlen=window)  # lag en segundos de las últimas muestras
+        self._task = None
+        self.max_lag = 0.0
+        self.count = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - start - self.interval))
+
+    def record(self, lag):
+        self._samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        self.count += 1
+
+    def stats(self):
+        """Percentiles en ms de la ventana reciente y máximo desde el arranque."""
+        samples = sorted(self._samples)
+
+        def pct(q):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 2)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.count,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
@@ -14,15 +14,58 @@ Notas importantes:
 - Siempre usar readexactly para asegurarse de recibir la cantidad esperada de bytes.
 - Maneja timeouts con asyncio.wait_for / reader timeouts.
 - En producción conviene añadir límites de tamaño y validación de payloads.
+
+Modo multiplexado (ProcessorPool):
+- El cliente abre la conexión enviando los 4 bytes mágicos MUX_MAGIC.
+- A partir de ahí cada frame lleva 8 bytes de header: request_id (4 bytes) y
+  longitud del cuerpo (4 bytes), ambos big-endian, seguido del cuerpo JSON.
+- Varias requests viajan por el mismo socket y B puede responderlas en
+  cualquier orden: el request_id permite asociar cada respuesta a su future.
+- MUX_MAGIC interpretado como longitud sería ~1.4 GB, muy por encima de
+  MAX_MESSAGE_SIZE, por lo que no se confunde con el formato simple.
+
+Protocolo binario (versión 2), negociado al conectar:
+- El cliente abre con BIN_MAGIC y un frame de saludo (request_id 0, JSON) con
+  las versiones y codecs que soporta; B responde con la versión y el codec
+  elegidos (el primero de la lista del cliente que B también tenga).
+- Cada frame v2 lleva header (request_id, longitud del cuerpo, cantidad de
+  blobs), el cuerpo serializado con el codec y luego cada blob como segmento
+  crudo con prefijo de longitud de 4 bytes.
+- Los valores bytes del mensaje (PNG de screenshots y thumbnails, HTML
+  comprimido) viajan como blobs. El cuerpo es un sobre {"data": mensaje,
+  "blobs": rutas}: en "data" cada bytes queda como null y "blobs" dice dónde
+  va cada blob (lista de claves/índices), así ningún dato del mensaje se
+  confunde con una referencia. No se pagan el base64 (~33% más) ni la
+  codificación en cada extremo.
+- Si B no entiende el saludo, el cliente vuelve al modo multiplexado JSON
+  (versión 1), donde los bytes se envían en base64 como antes.
 """
 import asyncio
-import json
+import itertools
+import os
 import struct
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from common.serialization import JSON_CODEC, available_codecs, get_codec
 
 # Estructura para pack/unpack de 4 bytes big-endian (unsigned int)
 LEN_STRUCT = struct.Struct("!I")  # network (= big-endian) unsigned int
 
+# Modo multiplexado: bytes de apertura y header (request_id, longitud)
+MUX_MAGIC = b"TP2M"
+MUX_HEADER = struct.Struct("!II")
+
+# Protocolo binario v2: bytes de apertura y header (request_id, longitud, cantidad de blobs)
+BIN_MAGIC = b"TP2B"
+FRAME_V2_HEADER = struct.Struct("!IIH")
+PROTOCOL_VERSIONS = (2,)  # versiones negociables con BIN_MAGIC (la 1 es MUX_MAGIC)
+HANDSHAKE_TIMEOUT = 5
+
+MAX_REQUEST_SIZE = 10 * 1024 * 1024
+MAX_MESSAGE_SIZE = 50 * 1024 * 1024
+
+DEFAULT_POOL_SIZE = int(os.environ.get("PROC_POOL_SIZE", "4"))
+
 
 async def send_request_and_receive_json(host: str, port: int, payload: Dict[str, Any], timeout: int = 30) -> Dict[str, Any]:
     """
@@ -43,8 +86,8 @@ async def send_request_and_receive_json(host: str, port: int, payload: Dict[str,
     reader: asyncio.StreamReader
     writer: asyncio.StreamWriter
 
-    # Serializar el payload a bytes UTF-8
-    data = json.dumps(payload).encode("utf-8")
+    # Serializar el payload a bytes UTF-8 (los bytes viajan en base64)
+    data = JSON_CODEC.encode(payload)
     length = len(data)
     if length > 10 * 1024 * 1024:
         # Protección básica: rechazar mensajes > 10MB (ajustable)
@@ -70,7 +113,7 @@ async def send_request_and_receive_json(host: str, port: int, payload: Dict[str,
         # Leer exactamente resp_len bytes (bloquea de forma asíncrona hasta recibirlos)
         body = await asyncio.wait_for(reader.readexactly(resp_len), timeout=timeout)
         # Decodificar JSON y devolver dict
-        return json.loads(body.decode("utf-8"))
+        return JSON_CODEC.decode(body)
     finally:
         # Cerrar writer correctamente (await writer.wait_closed() en Python 3.7+)
         try:
@@ -78,4 +121,442 @@ async def send_request_and_receive_json(host: str, port: int, payload: Dict[str,
             await writer.wait_closed()
         except Exception:
             # En shutdown / errores de red esto puede fallar; ignorar para no enmascarar el error original
-            pass
\ No newline at end of file
+            pass
+
+
+def pack_mux_frame(request_id: int, body: bytes) -> bytes:
+    """Arma un frame multiplexado: header (request_id, longitud) + cuerpo."""
+    return MUX_HEADER.pack(request_id, len(body)) + body
+
+
+async def read_mux_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """
+    Lee un frame multiplexado completo y devuelve (request_id, cuerpo).
+    Lanza asyncio.IncompleteReadError si el peer cierra la conexión.
+    """
+    header = await reader.readexactly(MUX_HEADER.size)
+    request_id, length = MUX_HEADER.unpack(header)
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError("response too large")
+    body = await reader.readexactly(length)
+    return request_id, body
+
+
+def extract_blobs(data: Any, blobs: List[bytes], paths: List[List[Any]], path: Tuple[Any, ...] = ()) -> Any:
+    """
+    Copia de `data` donde cada valor bytes se reemplaza por None; el bytes se
+    agrega a `blobs` y su ubicación (claves e índices desde la raíz) a `paths`.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        blobs.append(bytes(data))
+        paths.append(list(path))
+        return None
+    if isinstance(data, dict):
+        return {k: extract_blobs(v, blobs, paths, path + (k,)) for k, v in data.items()}
+    if isinstance(data, (list, tuple)):
+        return [extract_blobs(v, blobs, paths, path + (i,)) for i, v in enumerate(data)]
+    return data
+
+
+def restore_blobs(data: Any, blobs: Sequence[bytes], paths: Sequence[Sequence[Any]]) -> Any:
+    """Inversa de extract_blobs: vuelve a colocar cada blob en su ruta (modifica `data`)."""
+    if len(paths) != len(blobs):
+        raise ValueError("blob count mismatch")
+    for blob, path in zip(blobs, paths):
+        if not path:
+            return blob
+        target = data
+        for step in path[:-1]:
+            target = target[step]
+        target[path[-1]] = blob
+    return data
+
+
+def pack_frame_v2(request_id: int, data: Any, codec) -> bytes:
+    """Arma un frame v2: header + cuerpo (codec) + blobs crudos con prefijo de longitud."""
+    blobs: List[bytes] = []
+    paths: List[List[Any]] = []
+    body = codec.encode({"data": extract_blobs(data, blobs, paths), "blobs": paths})
+    parts = [FRAME_V2_HEADER.pack(request_id, len(body), len(blobs)), body]
+    for blob in blobs:
+        parts.append(LEN_STRUCT.pack(len(blob)))
+        parts.append(blob)
+    return b"".join(parts)
+
+
+async def read_frame_v2(reader: asyncio.StreamReader) -> Tuple[int, bytes, List[bytes]]:
+    """Lee un frame v2 y devuelve (request_id, cuerpo sin decodificar, blobs)."""
+    header = await reader.readexactly(FRAME_V2_HEADER.size)
+    request_id, length, n_blobs = FRAME_V2_HEADER.unpack(header)
+    total = length
+    if total > MAX_MESSAGE_SIZE:
+        raise ValueError("message too large")
+    body = await reader.readexactly(length)
+    blobs = []
+    for _ in range(n_blobs):
+        (blob_len,) = LEN_STRUCT.unpack(await reader.readexactly(LEN_STRUCT.size))
+        total += blob_len
+        if total > MAX_MESSAGE_SIZE:
+            raise ValueError("message too large")
+        blobs.append(await reader.readexactly(blob_len))
+    return request_id, body, blobs
+
+
+def decode_frame_v2(body: bytes, blobs: Sequence[bytes], codec) -> Any:
+    envelope = codec.decode(body)
+    try:
+        data, paths = envelope["data"], envelope["blobs"]
+        return restore_blobs(data, blobs, paths)
+    except (TypeError, KeyError, IndexError) as e:
+        raise ValueError(f"invalid frame: {e}")
+
+
+# Operaciones de procesamiento que A puede pedirle a B (payload["operations"]);
+# en modo streaming cada una viaja como un evento propio.
+PROCESSING_OPERATIONS = ("screenshot", "thumbnails", "performance")
+STREAM_PARTS = PROCESSING_OPERATIONS
+# Renderizadores del screenshot que se pueden pedir en payload["renderer"] (processor/renderers.py)
+SCREENSHOT_RENDERERS = ("auto", "browser", "wireframe", "placeholder")
+
+# Chequeo de salud: B lo responde de inmediato (sin pasar por el pool de
+# procesos) con {"status": "ok", "in_flight": tareas en curso, "capacity": procesos}
+# y, si los tiene, "renderers": tiempos acumulados por renderizador del screenshot.
+HEALTH_REQUEST = {"health": True}
+
+
+def is_health_request(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get("health") is True
+
+
+def health_reply(
+    in_flight: int, capacity: Optional[int], renderers: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    reply = {"status": "ok", "in_flight": in_flight, "capacity": capacity}
+    if renderers is not None:
+        reply["renderers"] = renderers
+    return reply
+
+
+def result_to_events(res: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Convierte una respuesta completa de B en la secuencia de eventos del modo
+    streaming: un evento por parte de processing_data y un "done" final.
+    Sirve para front ends (o versiones de B) que sólo producen el resultado entero.
+    """
+    if res.get("status") != "success":
+        return [{"event": "done", "status": res.get("status", "failed"), "error": res.get("error")}]
+    pd = res.get("processing_data") or {}
+    events = [{"event": part, "data": pd[part]} for part in STREAM_PARTS if part in pd]
+    events.append({"event": "done", "status": "success"})
+    return events
+
+
+def negotiate(hello: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lado servidor del saludo v2: elige la versión más alta en común y el
+    primer codec de la lista del cliente que esté disponible localmente.
+    """
+    versions = [v for v in hello.get("versions", []) if v in PROTOCOL_VERSIONS]
+    local = available_codecs()
+    codecs = [c for c in hello.get("codecs", []) if c in local]
+    if not versions or not codecs:
+        return {"error": "no common protocol version/codec"}
+    return {"version": max(versions), "codec": codecs[0]}
+
+
+class MultiplexedConnection:
+    """
+    Conexión TCP persistente hacia B que admite varias requests en vuelo.
+
+    Una tarea lectora (_read_loop) recibe los frames y resuelve el future
+    correspondiente a cada request_id, de modo que las respuestas pueden llegar
+    en cualquier orden. Si la conexión se cae, todas las requests pendientes
+    fallan con ConnectionError y la conexión queda marcada como cerrada.
+
+    `codec` es None en el modo multiplexado JSON (versión 1) o el codec
+    negociado en el protocolo binario (versión 2).
+
+    Con request_stream, B puede enviar varios frames con el mismo request_id
+    (un evento por parte terminada) hasta un evento final {"event": "done"}.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec=None):
+        self._reader = reader
+        self._writer = writer
+        self.codec = codec
+        self.version = 2 if codec is not None else 1
+        self._ids = itertools.count(1)
+        # request_id -> Future (una respuesta) o Queue (request_stream: varios eventos)
+        self._pending: Dict[int, Any] = {}
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def open(
+        cls,
+        host: str,
+        port: int,
+        timeout: float = 10,
+        codecs: Optional[Sequence[str]] = None,
+        binary: bool = True,
+    ) -> "MultiplexedConnection":
+        """
+        Abre la conexión. Con `binary` intenta negociar el protocolo v2 con los
+        `codecs` indicados (por defecto todos los disponibles, en orden de
+        preferencia); si B no lo acepta, reabre en modo multiplexado JSON.
+        """
+        if binary:
+            try:
+                return await cls._open_binary(host, port, timeout, codecs or available_codecs())
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                pass
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        writer.write(MUX_MAGIC)
+        await writer.drain()
+        return cls(reader, writer)
+
+    @classmethod
+    async def _open_binary(cls, host, port, timeout, codecs):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+        try:
+            hello = {"versions": list(PROTOCOL_VERSIONS), "codecs": list(codecs)}
+            writer.write(BIN_MAGIC + pack_mux_frame(0, JSON_CODEC.encode(hello)))
+            await writer.drain()
+            _, body = await asyncio.wait_for(read_mux_frame(reader), timeout=HANDSHAKE_TIMEOUT)
+            answer = JSON_CODEC.decode(body)
+            if "error" in answer:
+                raise ValueError(answer["error"])
+            codec = get_codec(answer["codec"])
+        except BaseException:
+            writer.close()
+            raise
+        return cls(reader, writer, codec=codec)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def pending(self) -> int:
+        """Cantidad de requests en vuelo en esta conexión."""
+        return len(self._pending)
+
+    def _pack(self, request_id: int, payload: Dict[str, Any]) -> bytes:
+        if self.codec is not None:
+            frame = pack_frame_v2(request_id, payload, self.codec)
+            size = len(frame) - FRAME_V2_HEADER.size
+        else:
+            data = JSON_CODEC.encode(payload)
+            frame = pack_mux_frame(request_id, data)
+            size = len(data)
+        if size > MAX_REQUEST_SIZE:
+            raise ValueError("payload too large")
+        return frame
+
+    async def request(self, payload: Dict[str, Any], timeout: float = 30) -> Dict[str, Any]:
+        """Envía `payload` y espera su respuesta (identificada por request_id)."""
+        if self._closed:
+            raise ConnectionError("connection closed")
+        request_id = next(self._ids) & 0xFFFFFFFF
+        frame = self._pack(request_id, payload)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            # El lock evita que dos frames se intercalen en el socket
+            async with self._write_lock:
+                self._writer.write(frame)
+                await self._writer.drain()
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            # Timeout de esta request: la conexión sigue siendo válida para las demás
+            raise
+        except (ConnectionError, OSError) as e:
+            self._fail_pending(ConnectionError(str(e) or "connection lost"))
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def request_stream(self, payload: Dict[str, Any], timeout: float = 30) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Envía `payload` y devuelve los eventos que B emite para esa request,
+        terminando con {"event": "done", ...}. `timeout` es el plazo total.
+        Si B responde con un resultado completo (sin "event"), se convierte
+        con result_to_events.
+        """
+        if self._closed:
+            raise ConnectionError("connection closed")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        request_id = next(self._ids) & 0xFFFFFFFF
+        frame = self._pack(request_id, payload)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        try:
+            async with self._write_lock:
+                self._writer.write(frame)
+                await self._writer.drain()
+            while True:
+                item = await asyncio.wait_for(queue.get(), timeout=max(0, deadline - loop.time()))
+                if isinstance(item, Exception):
+                    raise item
+                if "event" not in item:
+                    for event in result_to_events(item):
+                        yield event
+                    return
+                yield item
+                if item["event"] == "done":
+                    return
+        except asyncio.TimeoutError:
+            raise
+        except (ConnectionError, OSError) as e:
+            self._fail_pending(ConnectionError(str(e) or "connection lost"))
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_frame(self) -> Tuple[int, Any]:
+        if self.codec is not None:
+            request_id, body, blobs = await read_frame_v2(self._reader)
+            return request_id, decode_frame_v2(body, blobs, self.codec)
+        request_id, body = await read_mux_frame(self._reader)
+        return request_id, JSON_CODEC.decode(body)
+
+    async def _read_loop(self) -> None:
+        """Recibe frames y despacha cada respuesta al future de su request_id."""
+        try:
+            while True:
+                request_id, message = await self._read_frame()
+                target = self._pending.get(request_id)
+                if isinstance(target, asyncio.Queue):
+                    target.put_nowait(message)
+                # La request pudo haber expirado por timeout: se descarta la respuesta
+                elif target is not None and not target.done():
+                    target.set_result(message)
+        except asyncio.CancelledError:
+            self._fail_pending(ConnectionError("connection closed"))
+            raise
+        except Exception as e:
+            self._fail_pending(ConnectionError(f"connection lost: {e}"))
+
+    def _fail_pending(self, exc: Exception) -> None:
+        self._closed = True
+        for target in self._pending.values():
+            if isinstance(target, asyncio.Queue):
+                target.put_nowait(exc)
+            elif not target.done():
+                target.set_exception(exc)
+        self._pending.clear()
+
+    async def close(self) -> None:
+        self._closed = True
+        self._reader_task.cancel()
+        try:
+            await self._reader_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+
+
+class ProcessorPool:
+    """
+    Pool de conexiones multiplexadas de larga duración hacia el Servidor B.
+
+    - `size` conexiones como máximo; cada request usa la conexión con menos
+      requests en vuelo.
+    - Las conexiones se abren de forma perezosa y se reabren si se cayeron.
+    - Si una conexión falla durante el envío, la request se reintenta una vez
+      sobre una conexión nueva.
+    - Cada conexión negocia el protocolo binario con `codecs` (por defecto los
+      disponibles); con binary=False se usa siempre el modo JSON.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        size: int = DEFAULT_POOL_SIZE,
+        connect_timeout: float = 10,
+        codecs: Optional[Sequence[str]] = None,
+        binary: bool = True,
+    ):
+        if size < 1:
+            raise ValueError("pool size must be >= 1")
+        self.host = host
+        self.port = port
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.codecs = list(codecs) if codecs else None
+        self.binary = binary
+        self._slots: List[Optional[MultiplexedConnection]] = [None] * size
+        self._slot_locks = [asyncio.Lock() for _ in range(size)]
+        self._closed = False
+
+    def _pick_slot(self) -> int:
+        # Preferimos un slot vacío/caído (para repartir carga entre sockets);
+        # si todos están vivos, el de menos requests en vuelo.
+        best, best_load = 0, None
+        for i, conn in enumerate(self._slots):
+            if conn is None or conn.closed:
+                return i
+            if best_load is None or conn.pending < best_load:
+                best, best_load = i, conn.pending
+        return best
+
+    async def _get_connection(self) -> MultiplexedConnection:
+        if self._closed:
+            raise ConnectionError("pool closed")
+        i = self._pick_slot()
+        conn = self._slots[i]
+        if conn is not None and not conn.closed:
+            return conn
+        async with self._slot_locks[i]:
+            # Otra coroutine pudo reconectar el slot mientras esperábamos el lock
+            conn = self._slots[i]
+            if conn is None or conn.closed:
+                if conn is not None:
+                    await conn.close()
+                conn = await MultiplexedConnection.open(
+                    self.host, self.port, timeout=self.connect_timeout, codecs=self.codecs, binary=self.binary
+                )
+                self._slots[i] = conn
+            return conn
+
+    async def request(self, payload: Dict[str, Any], timeout: float = 30) -> Dict[str, Any]:
+        """Envía `payload` a B por una conexión del pool y devuelve la respuesta."""
+        try:
+            conn = await self._get_connection()
+            return await conn.request(payload, timeout=timeout)
+        except ConnectionError:
+            # Conexión caída (p. ej. B se reinició): un reintento sobre conexión nueva
+            conn = await self._get_connection()
+            return await conn.request(payload, timeout=timeout)
+
+    async def request_stream(self, payload: Dict[str, Any], timeout: float = 30) -> AsyncIterator[Dict[str, Any]]:
+        """Como request, pero devuelve los eventos parciales de B (ver MultiplexedConnection.request_stream)."""
+        started = False
+        try:
+            conn = await self._get_connection()
+            async for event in conn.request_stream(payload, timeout=timeout):
+                started = True
+                yield event
+        except ConnectionError:
+            # Sólo se reintenta si todavía no se entregó ningún evento
+            if started:
+                raise
+            conn = await self._get_connection()
+            async for event in conn.request_stream(payload, timeout=timeout):
+                yield event
+
+    async def close(self) -> None:
+        self._closed = True
+        for i, conn in enumerate(self._slots):
+            if conn is not None:
+                await conn.close()
+            self._slots[i] = None
@@ -0,0 +1,508 @@
+"""
+Módulo: resilience.py
+---------------------
+Llamadas de A hacia B que toleran un B lento o caído.
+
+ResilientProcessor envuelve uno o más ProcessorPool (réplicas de B) y agrega:
+
+- plazo por intento derivado del presupuesto que le queda al cliente: cada
+  intento espera como máximo `attempt_timeout` y nunca más que lo que resta;
+- reintentos con backoff exponencial y jitter completo (espera aleatoria en
+  [0, min(cap, base * 2^intento)]), para que muchas requests que fallan a la
+  vez no vuelvan a golpear a B todas juntas; cada reintento prefiere otra réplica;
+- hedging opcional: si la respuesta tarda más que el p95 de las latencias
+  recientes, se envía la misma request a una segunda réplica y gana la
+  primera que responde (la otra se cancela);
+- un circuit breaker por réplica: tras `breaker_failures` fallas seguidas de
+  transporte (conexión, timeout) la réplica se saltea durante `breaker_reset`
+  segundos; después se deja pasar una sola request de prueba. Si no queda
+  ninguna réplica disponible se falla de inmediato con CircuitOpenError, sin
+  esperar timeouts;
+- reparto por carga: cada request va a la réplica menos cargada, estimando la
+  carga con las requests en curso desde A y las tareas en curso que B informa
+  en el chequeo de salud, relativas a su cantidad de procesos;
+- chequeos de salud periódicos ({"health": true} cada `health_interval`
+  segundos): tras `health_failures` chequeos fallidos seguidos la réplica sale
+  del reparto y vuelve a entrar sola cuando un chequeo responde.
+
+Sólo cuentan como fallas los errores de transporte: una respuesta de B con
+{"error": ...} es una respuesta válida (B está sano, la página no).
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from common.protocol import HEALTH_REQUEST
+
+# Valores por defecto
+DEFAULT_BUDGET = 30.0           # segundos totales para obtener la respuesta de B
+DEFAULT_ATTEMPT_TIMEOUT = 20.0  # segundos como máximo por intento
+DEFAULT_ATTEMPTS = 3            # intentos en total (el primero + reintentos)
+DEFAULT_BACKOFF_BASE = 0.1      # segundos
+DEFAULT_BACKOFF_CAP = 2.0       # segundos
+DEFAULT_BREAKER_FAILURES = 5    # fallas seguidas que abren el circuito
+DEFAULT_BREAKER_RESET = 10.0    # segundos con el circuito abierto antes de probar
+DEFAULT_HEALTH_INTERVAL = 5.0   # segundos entre chequeos de salud (0 = sin chequeos)
+DEFAULT_HEALTH_TIMEOUT = 2.0    # segundos que se espera la respuesta de un chequeo
+DEFAULT_HEALTH_FAILURES = 2     # chequeos fallidos seguidos que sacan a la réplica del reparto
+HEDGE_MIN_SAMPLES = 20          # latencias necesarias para estimar el p95
+MIN_ATTEMPT_TIME = 0.05         # no se empieza un intento con menos tiempo que esto
+
+# Errores que indican un problema de B o de la red (se reintentan y abren el circuito)
+TRANSPORT_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+class CircuitOpenError(ConnectionError):
+    """No hay ninguna réplica de B disponible: todos los circuitos están abiertos."""
+
+
+class ResilienceProfile:
+    """
+    Parámetros de las llamadas a B.
+
+    - `budget`: segundos totales por defecto (el cliente puede pedir menos)
+    - `attempt_timeout`: tope de cada intento
+    - `attempts`: intentos en total; `backoff_base` / `backoff_cap` del jitter
+    - `hedge`: enviar una segunda copia a otra réplica pasado el p95
+    - `breaker_failures` / `breaker_reset`: umbral y duración del circuito abierto
+    - `health_interval` / `health_timeout` / `health_failures`: chequeos de
+      salud de las réplicas (intervalo 0 = sin chequeos)
+    """
+
+    def __init__(
+        self,
+        budget: float = DEFAULT_BUDGET,
+        attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT,
+        attempts: int = DEFAULT_ATTEMPTS,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_cap: float = DEFAULT_BACKOFF_CAP,
+        hedge: bool = False,
+        breaker_failures: int = DEFAULT_BREAKER_FAILURES,
+        breaker_reset: float = DEFAULT_BREAKER_RESET,
+        health_interval: float = DEFAULT_HEALTH_INTERVAL,
+        health_timeout: float = DEFAULT_HEALTH_TIMEOUT,
+        health_failures: int = DEFAULT_HEALTH_FAILURES,
+    ):
+        if attempts < 1:
+            raise ValueError("attempts must be >= 1")
+        if budget <= 0 or attempt_timeout <= 0:
+            raise ValueError("budget and attempt timeout must be > 0")
+        self.budget = budget
+        self.attempt_timeout = attempt_timeout
+        self.attempts = attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge = hedge
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.health_failures = max(1, health_failures)
+
+    @classmethod
+    def from_env(cls) -> "ResilienceProfile":
+        """
+        Perfil a partir de PROC_BUDGET, PROC_ATTEMPT_TIMEOUT, PROC_ATTEMPTS, PROC_HEDGE,
+        PROC_BREAKER_FAILURES, PROC_BREAKER_RESET y PROC_HEALTH_INTERVAL.
+        """
+        return cls(
+            budget=float(os.environ.get("PROC_BUDGET", str(DEFAULT_BUDGET))),
+            attempt_timeout=float(os.environ.get("PROC_ATTEMPT_TIMEOUT", str(DEFAULT_ATTEMPT_TIMEOUT))),
+            attempts=int(os.environ.get("PROC_ATTEMPTS", str(DEFAULT_ATTEMPTS))),
+            hedge=os.environ.get("PROC_HEDGE", "").lower() in ("1", "true", "yes"),
+            breaker_failures=int(os.environ.get("PROC_BREAKER_FAILURES", str(DEFAULT_BREAKER_FAILURES))),
+            breaker_reset=float(os.environ.get("PROC_BREAKER_RESET", str(DEFAULT_BREAKER_RESET))),
+            health_interval=float(os.environ.get("PROC_HEALTH_INTERVAL", str(DEFAULT_HEALTH_INTERVAL))),
+        )
+
+    def backoff(self, attempt: int, rng: Callable[[], float] = random.random) -> float:
+        """Espera antes del reintento número `attempt` (0 = el primero): jitter completo."""
+        return rng() * min(self.backoff_cap, self.backoff_base * (2 ** attempt))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget,
+            "attempt_timeout": self.attempt_timeout,
+            "attempts": self.attempts,
+            "hedge": self.hedge,
+            "breaker_failures": self.breaker_failures,
+            "breaker_reset": self.breaker_reset,
+            "health_interval": self.health_interval,
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuito cerrado -> abierto (tras `failures` fallas seguidas) -> semiabierto
+    (pasados `reset_timeout` segundos, una sola request de prueba) -> cerrado si
+    la prueba sale bien, abierto otra vez si falla.
+    """
+
+    def __init__(self, failures: int = DEFAULT_BREAKER_FAILURES, reset_timeout: float = DEFAULT_BREAKER_RESET,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened = 0  # veces que se abrió el circuito
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """True si se puede enviar una request (en semiabierto, sólo la de prueba)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if self.clock() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def available(self) -> bool:
+        """Como allow, pero sin reservar la request de prueba."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return self.clock() - self._opened_at >= self.reset_timeout
+        return not self._probing
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive += 1
+        self._probing = False
+        if self.state == "half_open" or self.consecutive >= self.failures:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self._opened_at = self.clock()
+
+    def release(self) -> None:
+        """La request terminó sin veredicto (p. ej. cancelada por hedging)."""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive, "opened": self.opened}
+
+
+class LatencyTracker:
+    """Últimas `window` latencias exitosas (segundos) para estimar percentiles."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _Backend:
+    __slots__ = (
+        "name", "pool", "breaker", "outstanding", "reported", "capacity", "renderers",
+        "healthy", "check_failures", "removed", "readded",
+    )
+
+    def __init__(self, name: str, pool, breaker: CircuitBreaker):
+        self.name = name
+        self.pool = pool
+        self.breaker = breaker
+        self.outstanding = 0  # requests de este A en curso
+        self.reported = 0  # tareas en curso según el último chequeo de salud (de todos los A)
+        self.capacity: Optional[int] = None  # procesos de B según el chequeo
+        self.renderers: Dict[str, Any] = {}  # tiempos por renderizador según el chequeo
+        self.healthy = True
+        self.check_failures = 0
+        self.removed = 0
+        self.readded = 0
+
+    def load(self) -> float:
+        """Carga estimada: tareas en curso por proceso de B."""
+        return max(self.outstanding, self.reported) / (self.capacity or 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.breaker.stats(),
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "reported_in_flight": self.reported,
+            "capacity": self.capacity,
+            "renderers": self.renderers,
+            "removed": self.removed,
+            "readded": self.readded,
+        }
+
+
+class ResilientProcessor:
+    """
+    Misma interfaz que ProcessorPool (request, request_stream, close), sobre
+    una o más réplicas de B, con reparto por carga, chequeos de salud,
+    presupuesto, reintentos, hedging y circuit breaker.
+
+    `replicas` son pares (host, port); `pool_factory(host, port)` crea el pool
+    de conexiones de cada una (normalmente un ProcessorPool).
+
+    `budget` en request / request_stream son los segundos que le quedan al
+    cliente; si no se pasa se usa el del perfil. Los chequeos de salud corren
+    desde `start_health_checks()` (dentro del event loop) hasta `close()`.
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[Tuple[str, int]],
+        pool_factory: Callable[[str, int], Any],
+        profile: Optional[ResilienceProfile] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        if not replicas:
+            raise ValueError("at least one processing server is required")
+        self.profile = profile or ResilienceProfile()
+        self.clock = clock
+        self.rng = rng
+        self.backends = [
+            _Backend(f"{host}:{port}", pool_factory(host, port),
+                     CircuitBreaker(self.profile.breaker_failures, self.profile.breaker_reset, clock))
+            for host, port in replicas
+        ]
+        self.latency = LatencyTracker()
+        self.counters = {"requests": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "fast_failures": 0, "failures": 0}
+        self._turn = 0  # desempate por turnos entre réplicas igual de cargadas
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _candidates(self, tried: Set[str] = frozenset()) -> List[_Backend]:
+        """
+        Réplicas sanas con el circuito cerrado (o listas para la prueba), de
+        menor a mayor carga; las que ya fallaron en esta request van al final.
+        """
+        n = len(self.backends)
+        ranked = [
+            ((b.name in tried, b.load(), (i - self._turn) % n), b)
+            for i, b in enumerate(self.backends)
+            if b.healthy and b.breaker.available()
+        ]
+        self._turn = (self._turn + 1) % n
+        return [b for _, b in sorted(ranked, key=lambda item: item[0])]
+
+    # --- Chequeos de salud -------------------------------------------------------
+    def start_health_checks(self) -> None:
+        if self.profile.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def _health_loop(self) -> None:
+        # Al arrancar todas las réplicas se dan por sanas; el primer chequeo llega tras un intervalo
+        while True:
+            await asyncio.sleep(self.profile.health_interval)
+            await self.check_health()
+
+    async def check_health(self) -> None:
+        """Consulta a todas las réplicas y actualiza su carga y si participan del reparto."""
+        await asyncio.gather(*(self._check(b) for b in self.backends))
+
+    async def _check(self, backend: _Backend) -> None:
+        try:
+            reply = await backend.pool.request(HEALTH_REQUEST, timeout=self.profile.health_timeout)
+        except Exception:
+            backend.check_failures += 1
+            if backend.healthy and backend.check_failures >= self.profile.health_failures:
+                backend.healthy = False
+                backend.removed += 1
+            return
+        backend.check_failures = 0
+        if isinstance(reply, dict) and reply.get("status") == "ok":
+            backend.reported = int(reply.get("in_flight") or 0)
+            backend.capacity = reply.get("capacity") or None
+            backend.renderers = reply.get("renderers") or {}
+        if not backend.healthy:
+            # Volvió a responder: entra de nuevo al reparto con el circuito cerrado
+            backend.healthy = True
+            backend.readded += 1
+            backend.breaker.record_success()
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 de las latencias recientes, o None si todavía no hay muestras suficientes."""
+        if len(self.latency) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency.percentile(0.95)
+
+    def _timed_out(self, backend: _Backend, timeout: float) -> None:
+        """
+        Un timeout sólo cuenta como fallo de la réplica si el intento tuvo el
+        tope completo (attempt_timeout). Si lo acortó el presupuesto del
+        cliente (?budget=, o lo que quedó tras una descarga lenta) no dice nada
+        de B: de lo contrario cualquier cliente podría abrir el circuito.
+        """
+        if timeout >= self.profile.attempt_timeout:
+            backend.breaker.record_failure()
+        else:
+            backend.breaker.release()
+
+    async def _call(self, backend: _Backend, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        start = self.clock()
+        backend.outstanding += 1
+        try:
+            result = await backend.pool.request(payload, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._timed_out(backend, timeout)
+            raise
+        except TRANSPORT_ERRORS:
+            backend.breaker.record_failure()
+            raise
+        except BaseException:
+            backend.breaker.release()
+            raise
+        finally:
+            backend.outstanding -= 1
+        backend.breaker.record_success()
+        self.latency.add(self.clock() - start)
+        return result
+
+    async def _attempt(self, candidates: List[_Backend], payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        primary = candidates[0]
+        if not primary.breaker.allow():
+            raise CircuitOpenError(f"circuit open for {primary.name}")
+        delay = self.hedge_delay() if self.profile.hedge and len(candidates) > 1 else None
+        if delay is None or delay >= timeout:
+            return await self._call(primary, payload, timeout)
+
+        first = asyncio.ensure_future(self._call(primary, payload, timeout))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and candidates[1].breaker.allow():
+                # Respuesta más lenta que el p95: segunda copia a otra réplica
+                self.counters["hedged"] += 1
+                tasks.add(asyncio.ensure_future(self._call(candidates[1], payload, timeout - delay)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def request(self, payload: Dict[str, Any], budget: Optional[float] = None) -> Dict[str, Any]:
+        """Envía `payload` a B dentro de `budget` segundos; lanza el último error si no se logra."""
+        self.counters["requests"] += 1
+        deadline = self.clock() + (budget if budget is not None else self.profile.budget)
+        last_error: Optional[BaseException] = None
+        tried: Set[str] = set()
+        for attempt in range(self.profile.attempts):
+            remaining = deadline - self.clock()
+            if remaining < MIN_ATTEMPT_TIME:
+                break
+            candidates = self._candidates(tried)
+            if not candidates:
+                if last_error is not None:
+                    break  # los intentos de esta request abrieron el último circuito
+                self.counters["fast_failures"] += 1
+                raise CircuitOpenError("processing server unavailable (circuit open)")
+            if attempt:
+                self.counters["retries"] += 1
+            tried.add(candidates[0].name)
+            try:
+                return await self._attempt(candidates, payload, min(self.profile.attempt_timeout, remaining))
+            except CircuitOpenError as e:
+                last_error = e
+                continue
+            except TRANSPORT_ERRORS as e:
+                last_error = e
+            if attempt + 1 < self.profile.attempts:
+                pause = self.profile.backoff(attempt, self.rng)
+                if self.clock() + pause + MIN_ATTEMPT_TIME >= deadline:
+                    break
+                await asyncio.sleep(pause)
+        self.counters["failures"] += 1
+        raise last_error or asyncio.TimeoutError("processing budget exhausted")
+
+    async def request_stream(self, payload: Dict[str, Any], budget: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Eventos parciales de B dentro de `budget` segundos. Sin reintentos ni
+        hedging (los eventos ya enviados no se pueden repetir), pero con el
+        circuit breaker: si no hay réplica disponible falla de inmediato.
+        """
+        self.counters["requests"] += 1
+        timeout = budget if budget is not None else self.profile.budget
+        if timeout < MIN_ATTEMPT_TIME:
+            self.counters["failures"] += 1
+            raise asyncio.TimeoutError("processing budget exhausted")
+        backend = next((b for b in self._candidates() if b.breaker.allow()), None)
+        if backend is None:
+            self.counters["fast_failures"] += 1
+            raise CircuitOpenError("processing server unavailable (circuit open)")
+        started = False
+        backend.outstanding += 1
+        try:
+            async for event in backend.pool.request_stream(payload, timeout=timeout):
+                if not started:
+                    # B respondió: la réplica está sana aunque el stream siga
+                    started = True
+                    backend.breaker.record_success()
+                yield event
+        except asyncio.TimeoutError:
+            if not started:
+                self._timed_out(backend, timeout)
+            self.counters["failures"] += 1
+            raise
+        except TRANSPORT_ERRORS:
+            if not started:
+                backend.breaker.record_failure()
+            self.counters["failures"] += 1
+            raise
+        except BaseException:
+            backend.breaker.release()
+            raise
+        finally:
+            backend.outstanding -= 1
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for backend in self.backends:
+            await backend.pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            **self.profile.as_dict(),
+            **self.counters,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "backends": {b.name: b.stats() for b in self.backends},
+        }
+
+
+def parse_replica(value: str) -> Tuple[str, int]:
+    """"host:port" (o "[::1]:port") -> (host, port). Lanza ValueError si no es válida."""
+    host, sep, port = value.strip().rpartition(":")
+    if not sep or not host or not port.isdigit():
+        raise ValueError(f"invalid processing server address: {value}")
+    return host.strip("[]"), int(port)
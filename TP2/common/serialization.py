@@ -6,10 +6,26 @@ Maneja la serialización y deserialización de datos entre el Servidor A y el Se
 Funciones principales:
 - serialize: Convierte datos (dict) a JSON.
 - deserialize: Convierte JSON a datos (dict).
+
+Codecs enchufables (usados por el protocolo binario de common/protocol.py):
+- JsonCodec: siempre disponible; los bytes viajan como base64 (fallback).
+- MsgpackCodec / CborCodec: compactos, sólo si `msgpack` / `cbor2` están instalados.
+- register_codec / get_codec / available_codecs: registro por nombre.
 """
 
+import base64
 import json
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
 
 def serialize(data):
     """
@@ -46,4 +62,78 @@ def deserialize(json_data):
     try:
         return json.loads(json_data)
     except json.JSONDecodeError as e:
-        raise ValueError(f"Error al deserializar los datos: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Error al deserializar los datos: {str(e)}")
+
+
+def json_default(obj):
+    """Hook `default` de json.dumps: los bytes se codifican en base64 (ASCII)."""
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(obj)).decode("ascii")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    """Codec JSON UTF-8. Los bytes se convierten a base64, como en el protocolo original."""
+
+    name = "json"
+
+    def encode(self, data):
+        return json.dumps(data, default=json_default).encode("utf-8")
+
+    def decode(self, raw):
+        return json.loads(bytes(raw).decode("utf-8"))
+
+
+class MsgpackCodec:
+    """Codec MessagePack (requiere el paquete `msgpack`)."""
+
+    name = "msgpack"
+
+    def encode(self, data):
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw):
+        return msgpack.unpackb(raw, raw=False)
+
+
+class CborCodec:
+    """Codec CBOR (requiere el paquete `cbor2`)."""
+
+    name = "cbor"
+
+    def encode(self, data):
+        return cbor2.dumps(data)
+
+    def decode(self, raw):
+        return cbor2.loads(raw)
+
+
+# Registro en orden de preferencia: el primero disponible en ambos extremos gana
+_CODECS = {}
+
+
+def register_codec(codec):
+    """Registra (o reemplaza) un codec; debe exponer `name`, `encode` y `decode`."""
+    _CODECS[codec.name] = codec
+
+
+def get_codec(name):
+    """Devuelve el codec registrado con ese nombre o lanza ValueError."""
+    try:
+        return _CODECS[name]
+    except KeyError:
+        raise ValueError(f"Codec desconocido: {name}")
+
+
+def available_codecs():
+    """Nombres de los codecs registrados, del preferido al fallback JSON."""
+    return list(_CODECS)
+
+
+if msgpack is not None:
+    register_codec(MsgpackCodec())
+if cbor2 is not None:
+    register_codec(CborCodec())
+register_codec(JsonCodec())
+
+JSON_CODEC = get_codec("json")
@@ -0,0 +1,262 @@
+"""
+Módulo: browser_pool.py
+------------------------
+Pool de navegadores headless reutilizables para screenshots y métricas.
+
+Arrancar Chrome (y resolver el driver con webdriver-manager) domina la
+latencia de la Parte B, así que en lugar de un navegador por request se
+mantienen instancias "calientes" que se prestan con `borrow()`:
+
+- se crean de forma perezosa hasta `size` instancias por proceso;
+- antes de prestar una instancia ociosa se verifica que responda (health check);
+  si no responde se descarta y se crea otra;
+- al devolverla se recicla (quit + nueva en el próximo préstamo) si ya sirvió
+  `max_pages` páginas o si su memoria supera `max_memory_mb`.
+
+El driver se construye con una `factory` inyectable, por lo que el pool puede
+probarse con un driver de mentira cuando no hay navegador instalado.
+Cada proceso usa su propio pool compartido (get_browser_pool), del que toman
+prestado tanto screenshot.py como performance.py.
+"""
+
+import atexit
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Selenium + webdriver-manager son opcionales: sin ellos no hay factory por defecto.
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from webdriver_manager.chrome import ChromeDriverManager
+    SELENIUM_AVAILABLE = True
+except Exception:
+    SELENIUM_AVAILABLE = False
+
+DEFAULT_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "1"))
+DEFAULT_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", "50"))
+DEFAULT_MAX_MEMORY_MB = float(os.environ.get("BROWSER_MAX_MEMORY_MB", "512"))
+DEFAULT_ACQUIRE_TIMEOUT = 30
+
+
+@functools.lru_cache(maxsize=1)
+def _chromedriver_path():
+    # webdriver-manager consulta la red/caché: se resuelve una sola vez por proceso
+    return ChromeDriverManager().install()
+
+
+def make_chrome_driver(page_load_timeout=30):
+    """Crea un Chrome headless con las opciones que usaba capture_screenshot_selenium."""
+    if not SELENIUM_AVAILABLE:
+        raise RuntimeError("selenium no está disponible")
+    opts = ChromeOptions()
+    try:
+        opts.add_argument("--headless=new")
+    except Exception:
+        opts.add_argument("--headless")
+    opts.add_argument("--no-sandbox")
+    opts.add_argument("--disable-dev-shm-usage")
+    opts.add_argument("--disable-gpu")
+    opts.add_argument("--window-size=1280,1024")
+    service = ChromeService(_chromedriver_path())
+    driver = webdriver.Chrome(service=service, options=opts)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+def default_health_check(driver):
+    """El navegador responde si puede ejecutar un script trivial."""
+    return driver.execute_script("return 1") == 1
+
+
+def default_memory_probe(driver):
+    """Memoria (MB) del heap JS de la página actual, o None si no se puede medir."""
+    try:
+        used = driver.execute_script(
+            "return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : null"
+        )
+    except Exception:
+        return None
+    return used / (1024 * 1024) if used else None
+
+
+class PooledBrowser:
+    """Driver prestado por el pool más sus contadores de uso."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class BrowserPool:
+    """Pool thread-safe de drivers de Selenium (o compatibles)."""
+
+    def __init__(
+        self,
+        factory=make_chrome_driver,
+        size=DEFAULT_POOL_SIZE,
+        max_pages=DEFAULT_MAX_PAGES,
+        max_memory_mb=DEFAULT_MAX_MEMORY_MB,
+        health_check=default_health_check,
+        memory_probe=default_memory_probe,
+        acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT,
+    ):
+        if size < 1:
+            raise ValueError("browser pool size must be >= 1")
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.health_check = health_check
+        self.memory_probe = memory_probe
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._total = 0  # instancias vivas (ociosas + prestadas) o en creación
+        self._cond = threading.Condition()
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "unhealthy": 0, "borrowed": 0}
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("browser pool closed")
+                if self._idle:
+                    browser = self._idle.pop()
+                    break
+                if self._total < self.size:
+                    # Reservamos el lugar y creamos el driver fuera del lock
+                    self._total += 1
+                    browser = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("no hay navegadores libres en el pool")
+                self._cond.wait(remaining)
+
+        if browser is not None:
+            if self._is_healthy(browser):
+                return browser
+            self.stats["unhealthy"] += 1
+            self._quit(browser)
+        try:
+            browser = PooledBrowser(self.factory())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        self.stats["created"] += 1
+        return browser
+
+    def _is_healthy(self, browser):
+        try:
+            return bool(self.health_check(browser.driver))
+        except Exception:
+            return False
+
+    def _should_recycle(self, browser):
+        if self.max_pages and browser.pages >= self.max_pages:
+            return True
+        if self.max_memory_mb and self.memory_probe is not None:
+            used = self.memory_probe(browser.driver)
+            if used is not None and used > self.max_memory_mb:
+                return True
+        return False
+
+    def _release(self, browser):
+        browser.pages += 1
+        recycle = self._should_recycle(browser)
+        with self._cond:
+            keep = not recycle and not self._closed
+            if keep:
+                self._idle.append(browser)
+            else:
+                self._total -= 1
+                if recycle:
+                    self.stats["recycled"] += 1
+            self._cond.notify()
+        if not keep:
+            self._quit(browser)
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception:
+            pass
+
+    @contextmanager
+    def borrow(self, timeout=None):
+        """Presta un driver; se devuelve (o recicla) automáticamente al salir del bloque."""
+        browser = self._acquire(self.acquire_timeout if timeout is None else timeout)
+        self.stats["borrowed"] += 1
+        try:
+            yield browser.driver
+        finally:
+            self._release(browser)
+
+    def warm(self):
+        """Crea de antemano las instancias que falten hasta `size`."""
+        browsers = []
+        try:
+            while True:
+                with self._cond:
+                    if self._total >= self.size:
+                        break
+                browsers.append(self._acquire(self.acquire_timeout))
+        finally:
+            with self._cond:
+                closed = self._closed
+                if closed:
+                    self._total -= len(browsers)
+                else:
+                    self._idle.extend(browsers)
+                self._cond.notify_all()
+            if closed:
+                for browser in browsers:
+                    self._quit(browser)
+
+    def close(self):
+        """Cierra las instancias ociosas; las prestadas se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for browser in idle:
+            self._quit(browser)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Pool compartido del proceso actual (se crea en el primer uso)."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = BrowserPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def configure_browser_pool(size=DEFAULT_POOL_SIZE, max_pages=DEFAULT_MAX_PAGES, max_memory_mb=DEFAULT_MAX_MEMORY_MB):
+    """Initializer de procesos: crea el pool compartido con la configuración dada."""
+    set_browser_pool(BrowserPool(size=size, max_pages=max_pages, max_memory_mb=max_memory_mb))
+
+
+def set_browser_pool(pool):
+    """Reemplaza el pool compartido del proceso (p. ej. con otro tamaño o un driver de prueba)."""
+    global _default_pool
+    with _default_pool_lock:
+        previous, _default_pool = _default_pool, pool
+    if pool is not None:
+        atexit.register(pool.close)
+    if previous is not None and previous is not pool:
+        previous.close()
@@ -1,14 +1,15 @@
 """
 Módulo: image_processor.py
 ---------------------------
-Descarga y procesa imágenes, generando thumbnails utilizando Pillow.
+Descarga y procesa imágenes, generando thumbnails con el motor de
+processor/thumbnails.py.
 """
 
 import requests
-from PIL import Image
-from io import BytesIO
 import base64
 
+from processor.thumbnails import make_thumbnails
+
 
 def process_images(request):
     """
@@ -24,21 +25,25 @@ def process_images(request):
     if not image_urls or not isinstance(image_urls, list):
         return {"error": "No se proporcionó una lista válida de URLs de imágenes"}
 
-    thumbnails = []
+    images = {}
+    errors = {}
     for url in image_urls:
         try:
             # Descargar imagen
             response = requests.get(url, timeout=10)
             response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
+            images[url] = response.content
+        except Exception as e:
+            errors[url] = str(e)
 
-            # Crear thumbnail
-            img.thumbnail((100, 100))
-            buffer = BytesIO()
-            img.save(buffer, format="PNG")
-            thumbnail_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    # Crear todos los thumbnails en un lote
+    thumbs = dict(zip(images, make_thumbnails(list(images.values()))))
+    thumbnails = []
+    for url in image_urls:
+        if thumbs.get(url) is not None:
+            thumbnail_base64 = base64.b64encode(thumbs[url]).decode("utf-8")
             thumbnails.append({"url": url, "thumbnail": thumbnail_base64})
-        except Exception as e:
-            thumbnails.append({"url": url, "error": str(e)})
+        else:
+            thumbnails.append({"url": url, "error": errors.get(url, "invalid image")})
 
     return {"thumbnails": thumbnails}
\ No newline at end of file
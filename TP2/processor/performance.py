@@ -1,27 +1,126 @@
 """
 Módulo: performance.py
 -----------------------
-Analiza el rendimiento de una página web utilizando Selenium y DevTools Protocol (CDP).
+Métricas de rendimiento de una página medidas en el navegador, con las APIs
+Navigation Timing y Resource Timing (window.performance).
 
-Extrae:
-- Tiempo de carga (load time).
-- Tamaño total de recursos descargados.
-- Número de solicitudes HTTP realizadas.
+Con la misma carga de página que toma el screenshot (un navegador "caliente"
+del pool, ver browser_pool.py) se obtiene:
+- TTFB, DOMContentLoaded y load (ms desde el inicio de la navegación);
+- bytes transferidos en total (documento + recursos);
+- cantidad de requests, en total y por tipo (img, script, css, fetch...);
+- los recursos más pesados.
+
+Resource Timing informa transferSize = 0 para recursos en caché y para los de
+otro origen sin Timing-Allow-Origin; en esos casos se usa encodedBodySize si
+está disponible (si no, cuentan como request pero no suman bytes). El buffer
+del navegador guarda por defecto hasta 250 recursos.
+
+FakeBrowserDriver imita la interfaz de Selenium que usan el pool, el
+screenshot y este módulo, para probarlos sin Chrome.
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from time import time
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
+from processor.browser_pool import get_browser_pool
+
+LARGEST_RESOURCES = 5
+LOAD_EVENT_WAIT = 2.0  # segundos máximos esperando que termine el evento load
+
+# Devuelve la entrada de navegación y los recursos como objetos planos (serializables por WebDriver)
+TIMING_SCRIPT = """
+var nav = performance.getEntriesByType('navigation')[0];
+if (!nav && performance.timing) {
+    var t = performance.timing, s = t.navigationStart;
+    nav = {responseStart: t.responseStart - s, domContentLoadedEventEnd: t.domContentLoadedEventEnd ? t.domContentLoadedEventEnd - s : 0,
+           loadEventEnd: t.loadEventEnd ? t.loadEventEnd - s : 0, transferSize: 0, encodedBodySize: 0, name: location.href};
+}
+var res = performance.getEntriesByType('resource').map(function (r) {
+    return {name: r.name, initiatorType: r.initiatorType, transferSize: r.transferSize || 0,
+            encodedBodySize: r.encodedBodySize || 0, duration: r.duration};
+});
+return {navigation: nav ? {name: nav.name, responseStart: nav.responseStart,
+                           domContentLoadedEventEnd: nav.domContentLoadedEventEnd, loadEventEnd: nav.loadEventEnd,
+                           transferSize: nav.transferSize || 0, encodedBodySize: nav.encodedBodySize || 0} : null,
+        resources: res};
+"""
+
+
+def collect_timings(driver, wait: float = LOAD_EVENT_WAIT) -> Dict[str, Any]:
+    """
+    Lee Navigation/Resource Timing de la página cargada en `driver`. Si el
+    evento load todavía no terminó (loadEventEnd = 0) reintenta hasta `wait` s.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        raw = driver.execute_script(TIMING_SCRIPT) or {}
+        nav = raw.get("navigation") or {}
+        if nav.get("loadEventEnd") or time.monotonic() >= deadline:
+            return raw
+        time.sleep(0.05)
+
+
+def _resource_bytes(entry: Dict[str, Any]) -> int:
+    return int(entry.get("transferSize") or entry.get("encodedBodySize") or 0)
+
+
+def summarize_timings(raw: Dict[str, Any], top: int = LARGEST_RESOURCES) -> Dict[str, Any]:
+    """Resume los datos de collect_timings en las métricas de processing_data["performance"]."""
+    nav = raw.get("navigation") or {}
+    resources: List[Dict[str, Any]] = list(raw.get("resources") or [])
+    by_type: Dict[str, int] = {"document": 1}
+    for entry in resources:
+        kind = entry.get("initiatorType") or "other"
+        by_type[kind] = by_type.get(kind, 0) + 1
+    total_bytes = _resource_bytes(nav) + sum(_resource_bytes(r) for r in resources)
+    largest = sorted(resources, key=_resource_bytes, reverse=True)[:top]
+    return {
+        "ttfb_ms": round(nav.get("responseStart") or 0, 1),
+        "dom_content_loaded_ms": round(nav.get("domContentLoadedEventEnd") or 0, 1),
+        "load_time_ms": round(nav.get("loadEventEnd") or 0, 1),
+        "transfer_bytes": total_bytes,
+        "total_size_kb": round(total_bytes / 1024, 1),
+        "num_requests": 1 + len(resources),
+        "requests_by_type": by_type,
+        "largest_resources": [
+            {
+                "url": r.get("name"),
+                "type": r.get("initiatorType") or "other",
+                "bytes": _resource_bytes(r),
+                "duration_ms": round(r.get("duration") or 0, 1),
+            }
+            for r in largest
+            if _resource_bytes(r) > 0
+        ],
+        "source": "browser",
+    }
+
+
+def load_and_measure(
+    driver, url: str, screenshot: bool = True, performance: bool = True, timeout_s: Optional[float] = None
+) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+    """
+    Carga `url` una sola vez y devuelve (PNG del screenshot, métricas) según
+    lo pedido; lo que no se pide queda en None.
+    """
+    if timeout_s is not None:
+        driver.set_page_load_timeout(timeout_s)
+    driver.get(url)
+    metrics = summarize_timings(collect_timings(driver)) if performance else None
+    png = driver.get_screenshot_as_png() if screenshot else None
+    return png, metrics
+
 
-def analyze_performance(request):
+def analyze_performance(request, pool=None):
     """
     Realiza un análisis de rendimiento real de una página web.
 
     Args:
         request (dict): Contiene la URL objetivo.
+        pool (BrowserPool, opcional): Pool del que tomar el navegador
+            (por defecto, el compartido del proceso).
 
     Returns:
         dict: Métricas de rendimiento obtenidas o mensaje de error.
@@ -30,53 +129,69 @@ def analyze_performance(request):
     if not url:
         return {"error": "No se proporcionó una URL para analizar el rendimiento"}
 
-    options = Options()
-    options.headless = True  # Ejecutar en modo headless (sin GUI)
-    options.add_argument("--remote-debugging-port=9222")  # Necesario para habilitar CDP
-
-    driver = webdriver.Chrome(service=Service(), options=options)
-    driver.set_page_load_timeout(30)  # Timeout máximo para cargar la página
-
+    pool = pool or get_browser_pool()
     try:
-        # Habilitamos el Performance Logging usando CDP (Chrome DevTools Protocol)
-        driver.execute_cdp_cmd("Performance.enable", {})
-
-        # Medir tiempo de carga
-        start_time = time()
-        driver.get(url)
-        load_time_ms = (time() - start_time) * 1000  # Convertimos a milisegundos
-
-        # Obtener eventos de rendimiento desde el navegador
-        performance_logs = driver.execute_cdp_cmd("Performance.getMetrics", {})
-        network_logs = driver.get_log("performance")  # Otra forma de capturar logs brutos
-
-        # Calcular tamaño total de recursos descargados (network traffic)
-        total_size_kb = 0
-        num_requests = 0
-        for log in network_logs:
-            try:
-                # Filtrar eventos de "Network.responseReceived"
-                message = log["message"]
-                if "Network.responseReceived" in message:
-                    num_requests += 1  # Contamos cada solicitud HTTP
-                if "Network.loadingFinished" in message:
-                    size_info = log["params"]["encodedDataLength"]
-                    total_size_kb += int(size_info) / 1024  # Convertir bytes -> KB
-            except KeyError:
-                continue
-
-        driver.quit()
-
-        # Retornar métricas completas
-        return {
-            "performance": {
-                "url": url,
-                "domain": urlparse(url).netloc,  # Dominios que se consultaron
-                "load_time_ms": round(load_time_ms, 2),
-                "total_size_kb": round(total_size_kb, 2),
-                "num_requests": num_requests,
-            }
-        }
+        with pool.borrow() as driver:
+            _, metrics = load_and_measure(driver, url, screenshot=False)
     except Exception as e:
-        driver.quit()
-        return {"error": f"Ocurrió un error al analizar la URL: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Ocurrió un error al analizar la URL: {str(e)}"}
+    return {"performance": {"url": url, "domain": urlparse(url).netloc, **metrics}}
+
+
+class FakeBrowserDriver:
+    """
+    Driver de mentira para tests: cada `get` "carga" la página con los tiempos
+    y recursos de `pages[url]` (o los de `default`), sin red ni navegador.
+
+    Una página es {"navigation": {...}, "resources": [...]} con el formato de
+    TIMING_SCRIPT; `loads` cuenta las cargas para verificar que sea una sola.
+    """
+
+    DEFAULT_PAGE = {
+        "navigation": {"responseStart": 80.0, "domContentLoadedEventEnd": 300.0, "loadEventEnd": 450.0,
+                       "transferSize": 20480, "encodedBodySize": 20000},
+        "resources": [
+            {"name": "https://cdn.example/app.js", "initiatorType": "script", "transferSize": 51200,
+             "encodedBodySize": 51000, "duration": 120.0},
+            {"name": "https://cdn.example/site.css", "initiatorType": "link", "transferSize": 10240,
+             "encodedBodySize": 10000, "duration": 40.0},
+            {"name": "https://cdn.example/hero.jpg", "initiatorType": "img", "transferSize": 204800,
+             "encodedBodySize": 204000, "duration": 210.0},
+        ],
+    }
+
+    def __init__(self, pages=None, default=None, screenshot=b"\x89PNG-fake", memory_mb=10):
+        self.pages = dict(pages or {})
+        self.default = default if default is not None else self.DEFAULT_PAGE
+        self.screenshot = screenshot
+        self.memory_mb = memory_mb
+        self.alive = True
+        self.current = None
+        self.loads = 0
+        self.page_load_timeout = None
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def get(self, url):
+        if not self.alive:
+            raise RuntimeError("browser crashed")
+        self.current = url
+        self.loads += 1
+
+    def get_screenshot_as_png(self):
+        return self.screenshot
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("browser crashed")
+        if "getEntriesByType" in script:
+            page = self.pages.get(self.current, self.default)
+            return {"navigation": dict(page["navigation"], name=self.current),
+                    "resources": [dict(r) for r in page["resources"]]}
+        if "usedJSHeapSize" in script:
+            return self.memory_mb * 1024 * 1024
+        return 1
+
+    def quit(self):
+        self.alive = False
@@ -0,0 +1,544 @@
+"""
+Módulo: pipeline.py
+-------------------
+Etapas del procesamiento de la Parte B, separadas para poder planificarlas
+de forma independiente.
+
+Etapas de I/O (pool de threads, el thread sólo espera a la red/al navegador):
+- fetch_page: descarga la página, mide tiempo/tamaño y busca <img>. Se omite
+  si el Servidor A ya reenvió la página (payload["page"]) salvo que se pida
+  una medición nueva con payload["fresh_performance"]. Las descargas
+  repetidas son condicionales (ETag / Last-Modified): ante un 304 se reutilizan
+  el tamaño y las imágenes de la descarga anterior.
+- capture_screenshot: captura con Selenium (el navegador es otro proceso),
+  usando un navegador ya iniciado del pool (processor/browser_pool.py).
+- capture_page: si además se pide "performance", la misma carga de página
+  del screenshot mide Navigation/Resource Timing en el navegador
+  (processor/performance.py); la medición con requests de fetch_page queda
+  como respaldo cuando no hay navegador.
+- fetch_image: descarga una imagen (hasta IMAGE_MAX_BYTES), cortándola al
+  vencer el plazo de la página.
+- fetch_images: descarga las imágenes principales en paralelo, con un plazo
+  total compartido (las que no llegan a tiempo se descartan).
+
+Las descargas de un proceso reutilizan sesiones HTTP con keep-alive, creadas
+una vez por el initializer del pool (configure_fetch): la de la página, con
+reintentos (get_http_session), y la de las imágenes, sin reintentos
+(get_image_session), para que una imagen lenta no exceda el plazo reintentando.
+
+Etapas de CPU (pool de procesos):
+- page_from_forwarded: descomprime el HTML reenviado por A y busca <img>.
+- render_fallback: screenshot sin navegador (wireframe dibujado a partir del
+  scraping_data o placeholder precodificado, ver processor/renderers.py).
+- make_thumbnails: decodifica, reduce y codifica los thumbnails de todas las
+  imágenes de la página en una sola llamada (processor/thumbnails.py).
+
+payload["renderer"] (opcional) elige cómo se obtiene el screenshot ("auto",
+"browser", "wireframe" o "placeholder"); la respuesta informa en "render" qué
+renderizador se usó y cuánto tardó.
+
+payload["operations"] (opcional) limita qué partes se calculan: sin
+"screenshot" no se usa Selenium, sin "thumbnails" no se descargan imágenes y
+si no se pide ni "thumbnails" ni "performance" no hace falta la página.
+
+run_pipeline combina las etapas en el event loop: el screenshot corre en
+paralelo con la descarga de la página y cada imagen avanza por su cuenta
+(descarga -> thumbnail), de modo que la latencia total la marca la etapa más
+lenta y no la suma de todas. Las imágenes se descargan en paralelo y sus
+thumbnails se generan en un único lote en el pool de procesos.
+"""
+
+import asyncio
+import base64
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+
+from common.cache import ResponseCache, conditional_headers, normalize_url, response_validators
+from common.image_ranking import MAX_CANDIDATES, OG_IMAGE_PROPERTIES, rank_image_sources
+from common.protocol import PROCESSING_OPERATIONS
+from processor.browser_pool import SELENIUM_AVAILABLE, get_browser_pool
+from processor.performance import load_and_measure
+from processor.renderers import fallback_renderer, render_fallback, resolve_renderer
+from processor.thumbnails import make_thumbnail, make_thumbnails  # noqa: F401  (make_thumbnail se re-exporta)
+
+MAX_IMAGES = 3          # imágenes principales por página (default de --max-images)
+PAGE_TIMEOUT = 30
+IMAGE_TIMEOUT = 10     # segundos máximos por imagen
+IMAGES_DEADLINE = 12   # segundos para todas las imágenes de una página (default de --images-deadline)
+HTTP_POOL_SIZE = 32    # conexiones keep-alive por host en la sesión del proceso
+IMAGE_MAX_BYTES = 20 * 1024 * 1024  # imágenes más pesadas ni se descargan completas
+IMAGE_CHUNK = 64 * 1024  # entre bloques se controla el plazo de las imágenes
+VALIDATORS_TTL = 7 * 24 * 3600
+
+# Validadores (ETag / Last-Modified) de las páginas descargadas por este proceso,
+# con el tamaño y las imágenes encontradas, para revalidar con un GET condicional.
+_page_validators = ResponseCache({"page": VALIDATORS_TTL}, max_entries=4096, max_bytes=32 * 1024 * 1024)
+
+# Configuración y clientes HTTP del proceso (los crea configure_fetch o el primer uso)
+_max_images = MAX_IMAGES
+_images_deadline = IMAGES_DEADLINE
+_http_pool_size = HTTP_POOL_SIZE
+_http_session = None
+_image_session = None
+_http_lock = threading.Lock()
+
+
+# Helper: crear una sesión requests con reintentos
+def make_retry_session(total_retries=3, backoff_factor=0.5, status_forcelist=(500,502,503,504), pool_size=10):
+    session = requests.Session()
+    retry = Retry(
+        total=total_retries,
+        read=total_retries,
+        connect=total_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(['GET', 'POST'])
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_fetch(max_images=MAX_IMAGES, images_deadline=IMAGES_DEADLINE, pool_size=HTTP_POOL_SIZE):
+    """
+    Fija cuántas imágenes principales se procesan y el plazo total para
+    descargarlas, y crea la sesión HTTP del proceso (pensado como initializer
+    del pool: cada worker abre sus conexiones una vez y las reutiliza).
+    """
+    global _max_images, _images_deadline, _http_pool_size
+    _max_images = max_images
+    _images_deadline = images_deadline
+    _http_pool_size = pool_size
+    get_http_session()
+    get_image_session()
+
+
+def make_image_session(pool_size=10):
+    """Sesión para imágenes: keep-alive sin reintentos (el plazo de la página manda)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_http_session():
+    """Sesión requests (con reintentos y keep-alive) compartida por todas las tareas del proceso."""
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                _http_session = make_retry_session(total_retries=3, backoff_factor=0.5, pool_size=_http_pool_size)
+    return _http_session
+
+
+def get_image_session():
+    """Sesión sin reintentos para las imágenes, compartida por todas las tareas del proceso."""
+    global _image_session
+    if _image_session is None:
+        with _http_lock:
+            if _image_session is None:
+                _image_session = make_image_session(pool_size=_http_pool_size)
+    return _image_session
+
+
+# Helper: captura con Selenium (devuelve bytes PNG)
+def capture_screenshot_selenium(url, timeout_s=30):
+    """Devuelve bytes PNG usando un Chrome headless prestado por el pool del proceso."""
+    with get_browser_pool().borrow() as driver:
+        png, _ = load_and_measure(driver, url, performance=False, timeout_s=timeout_s)
+        return png
+
+
+def capture_page(url, screenshot=True, performance=True):
+    """
+    Una sola carga de `url` en un navegador del pool: (PNG, métricas del
+    navegador), con None en lo que no se pidió o si Selenium no está o falla.
+    """
+    if not SELENIUM_AVAILABLE:
+        return None, None
+    try:
+        with get_browser_pool().borrow() as driver:
+            return load_and_measure(driver, url, screenshot, performance, timeout_s=PAGE_TIMEOUT)
+    except Exception:
+        return None, None
+
+
+def capture_browser(url, operations, renderer="browser"):
+    """
+    Etapa del navegador: (PNG o None, métricas o None). Con "performance"
+    pedido y Selenium disponible, screenshot y métricas salen de la misma carga;
+    el screenshot sólo se toma si el renderizador elegido es "browser".
+    """
+    shot = "screenshot" in operations and renderer == "browser"
+    if "performance" in operations and SELENIUM_AVAILABLE:
+        return capture_page(url, shot, True)
+    if shot:
+        return capture_screenshot(url), None
+    return None, None
+
+
+def timed_capture_browser(url, operations, renderer="browser"):
+    """capture_browser midiendo el tiempo: (PNG, métricas, ms)."""
+    start = time.perf_counter()
+    png, metrics = capture_browser(url, operations, renderer)
+    return png, metrics, round((time.perf_counter() - start) * 1000, 2)
+
+
+def screenshot_renderer(payload):
+    """Renderizador concreto del screenshot para el payload (ValueError si es inválido)."""
+    return resolve_renderer(payload.get("renderer"), SELENIUM_AVAILABLE)
+
+
+def render_info(renderer, name, ms, ok=True):
+    """
+    Entrada "render" de la respuesta: renderizador usado, ms, "fallback_from"
+    si el navegador falló y "failed" si el renderizador falló y salió el
+    placeholder. B la suma a sus estadísticas (RenderTimings).
+    """
+    info = {"renderer": name, "ms": ms}
+    if name != renderer:
+        info["fallback_from"] = renderer
+    if not ok:
+        info["failed"] = True
+    return info
+
+
+def render_page(url, payload, operations, renderer):
+    """
+    Versión secuencial de _browser_stage (front end threaded):
+    (PNG o None, métricas del navegador o None, info de render o None).
+    """
+    png, metrics, render = None, None, None
+    if renderer == "browser" or ("performance" in operations and SELENIUM_AVAILABLE):
+        png, metrics, ms = timed_capture_browser(url, operations, renderer)
+        if png is not None:
+            render = render_info(renderer, "browser", ms)
+    if "screenshot" in operations and png is None:
+        name = fallback_renderer() if renderer == "browser" else renderer
+        png, ms, ok = render_fallback(name, url, payload.get("scraping_data"))
+        render = render_info(renderer, name, ms, ok)
+    return png, metrics, render
+
+
+def fetch_page(url, session, conditional=True):
+    """
+    Descarga la página y devuelve métricas básicas y las primeras <img> encontradas.
+
+    Con `conditional` la descarga envía If-None-Match / If-Modified-Since si ya
+    se vio la página; ante un 304 se reutilizan el tamaño y las imágenes
+    guardadas (load_time_ms mide la revalidación).
+    """
+    key = normalize_url(url)
+    previous = _page_validators.get("page", key) if conditional else None
+    start = time.time()
+    resp = session.get(url, timeout=PAGE_TIMEOUT, stream=True, headers=conditional_headers(previous))
+    content = resp.content
+    load_time_ms = int((time.time() - start) * 1000)
+    if resp.status_code == 304 and previous is not None:
+        return {
+            "load_time_ms": load_time_ms,
+            "total_size_kb": previous["total_size_kb"],
+            "image_sources": previous["image_sources"],
+            "source": "processor",
+        }
+    page = {
+        "load_time_ms": load_time_ms,
+        "total_size_kb": max(1, len(content) // 1024),
+        "image_sources": find_image_sources(content),
+        "source": "processor",
+    }
+    validators = response_validators(resp.headers)
+    if validators:
+        _page_validators.set("page", key, {
+            **validators,
+            "total_size_kb": page["total_size_kb"],
+            "image_sources": page["image_sources"],
+        })
+    return page
+
+
+def page_from_forwarded(page):
+    """
+    Métricas e imágenes a partir de la descarga que ya hizo el Servidor A.
+
+    `page` trae las mediciones de A (fetch_ms, size_bytes) y, o bien el cuerpo
+    comprimido con zlib (html_zlib: bytes crudos en el protocolo binario,
+    base64 en el modo JSON), o bien la lista image_urls ya extraída por A,
+    ordenada como find_image_sources: se toman las primeras --max-images.
+    """
+    if page.get("image_urls") is not None:
+        srcs = list(page["image_urls"])[:_max_images]
+    elif page.get("html_zlib"):
+        compressed = page["html_zlib"]
+        if isinstance(compressed, str):
+            compressed = base64.b64decode(compressed)
+        srcs = find_image_sources(zlib.decompress(compressed))
+    else:
+        srcs = []
+    return {
+        "load_time_ms": int(page.get("fetch_ms", 0)),
+        "total_size_kb": max(1, int(page.get("size_bytes", 0)) // 1024),
+        "image_sources": srcs,
+        "source": "scraper",
+    }
+
+
+def requested_operations(payload):
+    """Operaciones pedidas en payload["operations"] (todas si no se indica), en orden canónico."""
+    operations = payload.get("operations")
+    if operations is None:
+        return PROCESSING_OPERATIONS
+    return tuple(op for op in PROCESSING_OPERATIONS if op in operations)
+
+
+def needs_page(operations):
+    """La página (descargada o reenviada) sólo hace falta para thumbnails y performance."""
+    return "thumbnails" in operations or "performance" in operations
+
+
+def needs_fetch(payload):
+    """B descarga la página sólo si A no la reenvió o si se pide una medición nueva."""
+    return not payload.get("page") or bool(payload.get("fresh_performance"))
+
+
+def page_base_url(payload):
+    """URL contra la que resolver las imágenes (la final tras redirecciones, si A la informó)."""
+    return (payload.get("page") or {}).get("final_url") or payload.get("url")
+
+
+def find_image_sources(content, limit=None):
+    """
+    Devuelve hasta `limit` imágenes principales (src sin resolver), en el
+    orden de common/image_ranking.py (og:image, luego por tamaño declarado),
+    el mismo con que la Parte A elige las que reenvía.
+    """
+    limit = _max_images if limit is None else limit
+    soup = BeautifulSoup(content, "lxml")
+    og = [
+        m.get("content", "").strip()
+        for m in soup.find_all("meta", property=True)
+        if m["property"].lower() in OG_IMAGE_PROPERTIES
+    ]
+    candidates = [
+        (tag["src"].strip(), tag.get("width"), tag.get("height"))
+        for tag in soup.find_all("img", src=True, limit=MAX_CANDIDATES)
+    ]
+    return rank_image_sources(candidates, og, limit)
+
+
+def resolve_image_url(page_url, src):
+    """Resuelve src relativos ('/x.png', '//cdn/x.png', 'x.png') contra la URL de la página."""
+    return urljoin(page_url, src)
+
+
+def capture_screenshot(url):
+    """Bytes PNG del screenshot con Selenium, o None si no está disponible o falla."""
+    if not SELENIUM_AVAILABLE:
+        return None
+    try:
+        return capture_screenshot_selenium(url, timeout_s=PAGE_TIMEOUT)
+    except Exception:
+        return None
+
+
+def fetch_image(src, session, timeout=IMAGE_TIMEOUT, deadline=None):
+    """
+    Descarga una imagen (bytes). `deadline` (instante de time.monotonic) acota
+    la descarga completa: el timeout de conexión/lectura es el tiempo que queda
+    y la lectura se corta entre bloques apenas vence, así el thread se libera
+    aunque el servidor siga enviando de a poco.
+    """
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise TimeoutError("images deadline exceeded")
+    chunks, size = [], 0
+    with session.get(src, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(IMAGE_CHUNK):
+            size += len(chunk)
+            if size > IMAGE_MAX_BYTES:
+                raise ValueError(f"image too large: more than {IMAGE_MAX_BYTES} bytes")
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("images deadline exceeded")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def fetch_images(srcs, session, deadline=None):
+    """
+    Descarga las imágenes en paralelo con un plazo total de `deadline` segundos
+    y devuelve las que llegaron, en el orden de `srcs` (versión con threads de
+    _thumbnails_stage, para el front end threaded).
+
+    Los threads son de esta llamada: una descarga que no terminó a tiempo
+    sigue hasta su propio corte (fetch_image con el mismo plazo) sin ocupar
+    lugar en las descargas de la tarea siguiente.
+    """
+    deadline = _images_deadline if deadline is None else deadline
+    if not srcs:
+        return []
+    deadline_at = time.monotonic() + deadline
+    executor = ThreadPoolExecutor(max_workers=len(srcs), thread_name_prefix="img")
+    try:
+        futures = [executor.submit(fetch_image, src, session, IMAGE_TIMEOUT, deadline_at) for src in srcs]
+        wait(futures, timeout=deadline)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [f.result() for f in futures if f.done() and not f.cancelled() and f.exception() is None]
+
+
+def build_result(screenshot_bytes, page, thumbnails, operations=PROCESSING_OPERATIONS, browser_metrics=None,
+                 render=None):
+    """
+    Arma la respuesta con el mismo formato que devolvía process_task, sólo con
+    las partes de `operations`.
+
+    Screenshot (PNG) y thumbnails (en el formato del perfil de thumbnails,
+    WebP por defecto) quedan como bytes: el protocolo binario los
+    envía como blobs crudos y el modo JSON los codifica en base64 al serializar.
+    Con `browser_metrics` (capture_page) el rendimiento es el medido en el
+    navegador; `render` (render_info) se agrega como "render" si hubo screenshot.
+    """
+    processing_data = {}
+    if "screenshot" in operations:
+        processing_data["screenshot"] = screenshot_bytes
+    if "performance" in operations:
+        processing_data["performance"] = build_performance(page, thumbnails, browser_metrics)
+    if "thumbnails" in operations:
+        processing_data["thumbnails"] = thumbnails
+    result = {"status": "success", "processing_data": processing_data}
+    if render is not None and "screenshot" in operations:
+        result["render"] = render
+    return result
+
+
+def build_performance(page, thumbnails, browser_metrics=None):
+    """Métricas del navegador si las hay; si no, la estimación de fetch_page (documento + imágenes)."""
+    if browser_metrics:
+        return browser_metrics
+    return {
+        "load_time_ms": page["load_time_ms"],
+        "total_size_kb": page["total_size_kb"],
+        "num_requests": 1 + len(thumbnails),
+        "source": page.get("source", "processor"),
+    }
+
+
+async def _browser_stage(url, payload, operations, renderer, loop, cpu_executor, io_executor, emit=None):
+    """
+    Screenshot y métricas del navegador: (PNG, métricas, info de render). El
+    wireframe se dibuja en el pool de procesos; el placeholder ya está
+    codificado y se devuelve sin salir del event loop.
+    """
+    png, metrics, render = None, None, None
+    if renderer == "browser" or ("performance" in operations and SELENIUM_AVAILABLE):
+        png, metrics, ms = await loop.run_in_executor(io_executor, timed_capture_browser, url, operations, renderer)
+        if png is not None:
+            render = render_info(renderer, "browser", ms)
+    if "screenshot" in operations:
+        if png is None:
+            name = fallback_renderer() if renderer == "browser" else renderer
+            args = (name, url, payload.get("scraping_data"))
+            if name == "placeholder":
+                png, ms, ok = render_fallback(*args)
+            else:
+                png, ms, ok = await loop.run_in_executor(cpu_executor, render_fallback, *args)
+            render = render_info(renderer, name, ms, ok)
+        if emit is not None:
+            await emit("screenshot", png)
+    return png, metrics, render
+
+
+async def _thumbnails_stage(srcs, loop, session, cpu_executor, io_executor):
+    """
+    Descarga las imágenes en paralelo dentro del plazo total y genera sus
+    thumbnails en un solo viaje al pool. Las descargas que fallan o no
+    terminan a tiempo se ignoran.
+    """
+    images = []
+    if srcs:
+        # Cada descarga se corta sola al vencer el plazo: no queda ocupando un thread de I/O
+        deadline_at = time.monotonic() + _images_deadline
+        downloads = [
+            asyncio.ensure_future(
+                loop.run_in_executor(io_executor, fetch_image, src, session, IMAGE_TIMEOUT, deadline_at))
+            for src in srcs
+        ]
+        await asyncio.wait(downloads, timeout=_images_deadline)
+        for task in downloads:
+            if task.done() and task.exception() is None:
+                images.append(task.result())
+            else:
+                task.cancel()
+    images = [data for data in images if data]
+    if not images:
+        return []
+    thumbs = await loop.run_in_executor(cpu_executor, make_thumbnails, images)
+    return [t for t in thumbs if t is not None]
+
+
+async def run_pipeline(payload, cpu_executor, io_executor, emit=None):
+    """
+    Ejecuta las etapas de forma concurrente y devuelve el mismo dict que process_task.
+
+    - cpu_executor: ProcessPoolExecutor para placeholder y thumbnails.
+    - io_executor: ThreadPoolExecutor para descargas y Selenium.
+    - emit: coroutine opcional emit(parte, datos), llamada apenas termina cada
+      parte ("screenshot", "thumbnails", "performance") para el modo streaming.
+    """
+    url = payload.get("url")
+    operations = requested_operations(payload)
+    loop = asyncio.get_running_loop()
+    session = get_http_session()
+    browser_task = None
+    # Con Selenium, "performance" sale del navegador y espera a esa etapa
+    browser_performance = "performance" in operations and SELENIUM_AVAILABLE
+    try:
+        renderer = screenshot_renderer(payload)
+    except ValueError as e:
+        return {"status": "failed", "error": str(e)}
+    if "screenshot" in operations or browser_performance:
+        browser_task = asyncio.ensure_future(
+            _browser_stage(url, payload, operations, renderer, loop, cpu_executor, io_executor, emit))
+    try:
+        page = None
+        thumbnails = []
+        if needs_page(operations):
+            if needs_fetch(payload):
+                conditional = not payload.get("fresh_performance")
+                page = await loop.run_in_executor(io_executor, fetch_page, url, session, conditional)
+            else:
+                page = await loop.run_in_executor(cpu_executor, page_from_forwarded, payload["page"])
+        if "thumbnails" in operations:
+            base_url = page_base_url(payload)
+            srcs = [resolve_image_url(base_url, src) for src in page["image_sources"]]
+            thumbnails = await _thumbnails_stage(srcs, loop, get_image_session(), cpu_executor, io_executor)
+            if emit is not None:
+                await emit("thumbnails", thumbnails)
+        screenshot_bytes, browser_metrics, render = None, None, None
+        if "performance" in operations:
+            if browser_performance:
+                screenshot_bytes, browser_metrics, render = await browser_task
+            if emit is not None:
+                await emit("performance", build_performance(page, thumbnails, browser_metrics))
+        if browser_task is not None:
+            screenshot_bytes, browser_metrics, render = await browser_task
+        return build_result(screenshot_bytes, page, thumbnails, operations, browser_metrics, render)
+    except Exception as e:
+        return {"status": "failed", "error": str(e)}
+    finally:
+        # También si cancelan la tarea (timeout de B): la etapa del navegador
+        # no debe seguir ocupando un navegador ni emitir en un stream ya respondido
+        if browser_task is not None and not browser_task.done():
+            browser_task.cancel()
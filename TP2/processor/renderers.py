@@ -0,0 +1,239 @@
+"""
+Módulo: renderers.py
+--------------------
+Renderizadores del screenshot de la Parte B, elegibles por request
+(payload["renderer"], ver SCREENSHOT_RENDERERS en common/protocol.py):
+
+- "browser": Chrome headless del pool (lo ejecuta pipeline.capture_browser).
+- "wireframe": esquema de la página dibujado con Pillow a partir del
+  scraping_data que A ya extrajo (título, descripción, encabezados, imágenes
+  y enlaces). No usa red ni navegador.
+- "placeholder": PNG fijo, dibujado y pasado a base64 una sola vez por proceso.
+- "auto": el navegador si Selenium está disponible y, si no (o si falla), el
+  renderizador de respaldo del proceso (configure_renderers).
+
+Los renderizadores sin navegador se registran con register_renderer(nombre,
+función(url, scraping_data) -> bytes PNG). Cada render se mide: render_fallback
+devuelve los ms junto con el PNG y cada respuesta los informa en "render".
+RenderTimings los acumula por renderizador a partir de esas entradas; lo usa el
+servidor B en su proceso principal (así suma los de todos los workers) y lo
+devuelve en el chequeo de salud.
+"""
+
+import base64
+import functools
+import io
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from common.protocol import SCREENSHOT_RENDERERS
+
+DEFAULT_RENDERER = "auto"
+DEFAULT_FALLBACK = "wireframe"
+CANVAS = (1024, 768)
+MAX_IMAGE_BOXES = 9
+MAX_LINK_CHIPS = 48
+MAX_HEADING_BLOCKS = 6
+
+RenderFn = Callable[[str, Optional[Dict[str, Any]]], bytes]
+
+
+class RenderTimings:
+    """
+    Renders, fallos y tiempos (ms) acumulados por renderizador (thread-safe).
+    `count` son los screenshots que produjo cada uno; `failures`, las veces
+    que falló y el screenshot salió de otro.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_renderer: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        return self._by_renderer.setdefault(name, {"count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def record(self, render: Optional[Dict[str, Any]]) -> None:
+        """Suma la entrada "render" de una respuesta (ver pipeline.render_info); ignora None."""
+        if not render:
+            return
+        ms = float(render.get("ms") or 0.0)
+        with self._lock:
+            entry = self._entry(render["renderer"])
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            if render.get("failed"):
+                entry["failures"] += 1
+            if render.get("fallback_from"):
+                self._entry(render["fallback_from"])["failures"] += 1
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**entry, "total_ms": round(entry["total_ms"], 2),
+                       "avg_ms": round(entry["total_ms"] / entry["count"], 2) if entry["count"] else 0.0}
+                for name, entry in self._by_renderer.items()
+            }
+
+
+_renderers: Dict[str, RenderFn] = {}
+_default = DEFAULT_RENDERER
+_fallback = DEFAULT_FALLBACK
+
+
+def register_renderer(name: str, fn: RenderFn) -> None:
+    """Agrega (o reemplaza) un renderizador sin navegador."""
+    _renderers[name] = fn
+
+
+def configure_renderers(default: str = DEFAULT_RENDERER, fallback: str = DEFAULT_FALLBACK) -> None:
+    """Renderizador por defecto y de respaldo del proceso (initializer del pool y main)."""
+    global _default, _fallback
+    if default not in SCREENSHOT_RENDERERS:
+        raise ValueError(f"invalid renderer: {default}")
+    if fallback not in _renderers:
+        raise ValueError(f"invalid fallback renderer: {fallback}")
+    _default, _fallback = default, fallback
+    placeholder_b64()  # se codifica ahora y no en la primera request
+
+
+def fallback_renderer() -> str:
+    return _fallback
+
+
+def resolve_renderer(requested: Optional[str], browser_available: bool) -> str:
+    """Renderizador concreto para una request: "browser" o uno registrado."""
+    name = requested or _default
+    if name not in SCREENSHOT_RENDERERS and name not in _renderers:
+        raise ValueError(f"invalid renderer: {name}")
+    if name == "auto":
+        return "browser" if browser_available else _fallback
+    if name == "browser" and not browser_available:
+        return _fallback
+    return name
+
+
+def render_fallback(
+    name: str, url: str, scraping_data: Optional[Dict[str, Any]] = None
+) -> Tuple[bytes, float, bool]:
+    """
+    Ejecuta el renderizador `name` y devuelve (PNG, ms, ok). Si falla se usa
+    el placeholder, que no puede fallar, y ok es False.
+    """
+    start = time.perf_counter()
+    try:
+        png = _renderers[name](url, scraping_data)
+        ok = True
+    except Exception:
+        png, ok = placeholder_png(), False
+    return png, round((time.perf_counter() - start) * 1000, 2), ok
+
+
+@functools.lru_cache(maxsize=1)
+def placeholder_png() -> bytes:
+    """Marcador de posición genérico: se dibuja y codifica una vez por proceso."""
+    img = Image.new("RGB", CANVAS, color=(255, 255, 255))
+    d = ImageDraw.Draw(img)
+    d.text((10, 10), "Captura no disponible", fill=(0, 0, 0), font=_font())
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@functools.lru_cache(maxsize=1)
+def placeholder_b64() -> str:
+    """El placeholder en base64, para las respuestas JSON (también se calcula una vez)."""
+    return base64.b64encode(placeholder_png()).decode("ascii")
+
+
+def is_placeholder(png: Any) -> bool:
+    """True si `png` es el placeholder, aunque sea una copia (la que vuelve del pool de procesos)."""
+    placeholder = placeholder_png()
+    return png is placeholder or (isinstance(png, bytes) and len(png) == len(placeholder) and png == placeholder)
+
+
+@functools.lru_cache(maxsize=1)
+def _font():
+    return ImageFont.load_default()
+
+
+def _truncate(text: str, limit: int) -> str:
+    """Texto en una línea, sin acentos (la fuente por defecto sólo trae ASCII) y recortado."""
+    text = " ".join(str(text).split())
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def render_wireframe(url: str, scraping_data: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Esquema de la página: barra con el título, descripción, bloques de
+    encabezados y texto (según structure), grilla de imágenes (images_count) y
+    bloques de enlaces internos/externos (link_counts). Los datos que falten
+    (p. ej. con ?fields=) simplemente no se dibujan.
+    """
+    data = scraping_data or {}
+    width, height = CANVAS
+    img = Image.new("RGB", CANVAS, color=(250, 250, 250))
+    d = ImageDraw.Draw(img)
+    font = _font()
+
+    d.rectangle((0, 0, width, 56), fill=(52, 58, 64))
+    d.text((24, 12), _truncate(data.get("title") or url, 110), fill=(255, 255, 255), font=font)
+    d.text((24, 32), _truncate(url, 140), fill=(173, 181, 189), font=font)
+    y = 72
+    description = (data.get("meta_tags") or {}).get("description")
+    if description:
+        d.text((24, y), _truncate(description, 150), fill=(73, 80, 87), font=font)
+        y += 24
+
+    # Columna principal: un bloque por encabezado (h1 más alto y oscuro que h3)
+    structure = data.get("structure") or {}
+    styles = {"h1": (26, (73, 80, 87), 560), "h2": (20, (108, 117, 125), 480), "h3": (16, (134, 142, 150), 400)}
+    blocks = [level for level in ("h1", "h2", "h3") for _ in range(int(structure.get(level) or 0))]
+    bottom = height - 180
+    for level in blocks[:MAX_HEADING_BLOCKS]:
+        bar, color, bar_width = styles[level]
+        if y + bar + 40 > bottom:
+            break
+        d.rectangle((24, y, 24 + bar_width, y + bar), fill=color)
+        y += bar + 8
+        for line in range(3):
+            d.rectangle((24, y, 24 + 640 - line * 90, y + 6), fill=(222, 226, 230))
+            y += 12
+        y += 10
+
+    # Columna derecha: grilla de imágenes
+    boxes = min(int(data.get("images_count") or 0), MAX_IMAGE_BOXES)
+    for i in range(boxes):
+        x0 = 712 + (i % 3) * 100
+        y0 = 72 + (i // 3) * 80
+        d.rectangle((x0, y0, x0 + 88, y0 + 68), outline=(173, 181, 189), fill=(233, 236, 239))
+        d.line((x0, y0, x0 + 88, y0 + 68), fill=(173, 181, 189))
+        d.line((x0, y0 + 68, x0 + 88, y0), fill=(173, 181, 189))
+
+    # Pie: bloques de enlaces (internos en azul, externos en verde)
+    counts = data.get("link_counts") or {}
+    internal, external = int(counts.get("internal") or 0), int(counts.get("external") or 0)
+    if not counts and data.get("links"):
+        internal = len(data["links"])
+    chips = [(13, 110, 253)] * internal + [(25, 135, 84)] * external
+    for i, color in enumerate(chips[:MAX_LINK_CHIPS]):
+        x0 = 24 + (i % 12) * 82
+        y0 = height - 160 + (i // 12) * 22
+        d.rectangle((x0, y0, x0 + 70, y0 + 12), fill=color)
+    summary = (f"Wireframe (sin navegador): {len(blocks)} encabezados, "
+               f"{int(data.get('images_count') or 0)} imágenes, {internal + external} enlaces")
+    d.text((24, height - 24), _truncate(summary, 150), fill=(108, 117, 125), font=font)
+
+    buf = io.BytesIO()
+    # Formas planas: compresión rápida, el tamaño casi no cambia
+    img.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+register_renderer("placeholder", lambda url, scraping_data=None: placeholder_png())
+register_renderer("wireframe", render_wireframe)
@@ -3,21 +3,23 @@ Módulo: screenshot.py
 ----------------------
 Genera capturas de pantalla de páginas web utilizando Selenium en modo headless.
 
-Ahora utiliza `webdriver_manager` para gestionar dinámicamente ChromeDriver.
+El navegador se toma prestado del pool del proceso (browser_pool.py): no se
+inicia un Chrome nuevo por captura ni se vuelve a resolver ChromeDriver.
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager  # Maneja ChromeDriver automáticamente
 import base64
 
+from processor.browser_pool import get_browser_pool
 
-def generate_screenshot(request):
+
+def generate_screenshot(request, pool=None):
     """
     Captura un screenshot de la URL proporcionada.
 
     Args:
         request (dict): Contiene la URL objetivo.
+        pool (BrowserPool, opcional): Pool del que tomar el navegador
+            (por defecto, el compartido del proceso).
 
     Returns:
         dict: Captura en Base64 o un mensaje de error.
@@ -26,20 +28,15 @@ def generate_screenshot(request):
     if not url:
         return {"error": "No se proporcionó una URL para capturar el screenshot"}
 
-    # Configuración de Selenium con Chrome
-    options = Options()
-    options.headless = True
+    pool = pool or get_browser_pool()
     try:
-        # Manejo de ChromeDriver automáticamente usando webdriver_manager
-        driver = webdriver.Chrome(executable_path=ChromeDriverManager().install(), options=options)
-
-        # Abrir URL y capturar pantalla
-        driver.get(url)
-        screenshot_png = driver.get_screenshot_as_png()
-        driver.quit()
+        # Abrir URL y capturar pantalla con un navegador ya iniciado
+        with pool.borrow() as driver:
+            driver.get(url)
+            screenshot_png = driver.get_screenshot_as_png()
 
         # Codificar captura en Base64
         screenshot_base64 = base64.b64encode(screenshot_png).decode("utf-8")
         return {"screenshot": screenshot_base64}
     except Exception as e:
-        return {"error": f"Fallo al capturar screenshot: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Fallo al capturar screenshot: {str(e)}"}
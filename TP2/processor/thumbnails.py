@@ -0,0 +1,209 @@
+"""
+Módulo: thumbnails.py
+---------------------
+Motor de thumbnails de la Parte B.
+
+- Decodificación reducida: en JPEG se usa el modo draft de Pillow, que
+  decodifica directamente a 1/2, 1/4 u 1/8 de la resolución (escalado DCT),
+  así que una foto enorme nunca se decodifica completa. En el resto de los
+  formatos `thumbnail` reduce primero con `Image.reduce` (promedio por
+  bloques) y recién al final aplica el filtro de remuestreo.
+- Formato de salida configurable (WebP, JPEG o PNG) y calidad.
+- Límite de píxeles decodificados contra bombas de descompresión: la imagen se
+  rechaza antes de decodificarla si aun reducida supera `max_pixels`.
+- Lotes: make_thumbnails procesa varias imágenes en una sola llamada al pool
+  de procesos, amortizando el ida y vuelta (pickle + IPC) por imagen.
+- Caché por contenido: los thumbnails se guardan en un BlobStore con clave
+  SHA-256(imagen de origen + tamaño/formato/calidad), así los logos, sprites e
+  imágenes que se repiten entre páginas no se vuelven a decodificar. Con
+  `cache_dir` los procesos del pool comparten los resultados por disco.
+
+El perfil de cada proceso se fija con configure_thumbnails (initializer del
+pool); sin configurar se usa ThumbnailProfile.from_env().
+"""
+
+import hashlib
+import io
+import os
+from typing import Dict, List, Optional, Sequence
+
+from PIL import Image, features
+
+from common.blob_store import BlobStore
+
+DEFAULT_SIZE = 128
+DEFAULT_QUALITY = 80
+DEFAULT_MAX_PIXELS = 40_000_000  # ~ 160 MB en RGBA
+DEFAULT_CACHE_MB = 32
+FORMATS = ("webp", "jpeg", "png")
+DEFAULT_FORMAT = "webp" if features.check("webp") else "jpeg"
+ALPHA_FORMATS = ("webp", "png")
+REDUCING_GAP = 2
+PALETTE_MODES = ("P", "PA", "1")  # modos que Pillow no remuestrea con LANCZOS
+
+
+class ThumbnailError(ValueError):
+    """La imagen no se puede reducir (demasiado grande o formato inválido)."""
+
+
+class ThumbnailProfile:
+    """
+    Perfil del motor de thumbnails.
+
+    - `size`: lado máximo del thumbnail en píxeles (se conserva la proporción)
+    - `format`: "webp", "jpeg" o "png"
+    - `quality`: calidad de WebP/JPEG (1-95); en PNG no se usa
+    - `max_pixels`: píxeles máximos a decodificar (tras la reducción de draft)
+    - `cache_mb` / `cache_dir`: caché de thumbnails por contenido, en memoria
+      de cada proceso (0 = sin caché) y en un directorio compartido opcional
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_SIZE,
+        format: str = DEFAULT_FORMAT,
+        quality: int = DEFAULT_QUALITY,
+        max_pixels: int = DEFAULT_MAX_PIXELS,
+        cache_mb: int = DEFAULT_CACHE_MB,
+        cache_dir: Optional[str] = None,
+    ):
+        format = format.lower()
+        if format not in FORMATS:
+            raise ValueError(f"invalid thumbnail format: {format}")
+        if format == "webp" and not features.check("webp"):
+            raise ValueError("thumbnail format webp requires Pillow built with WebP support")
+        if size < 1 or not 1 <= quality <= 95:
+            raise ValueError("invalid thumbnail size or quality")
+        self.size = size
+        self.format = format
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.cache_mb = cache_mb
+        self.cache_dir = cache_dir or None
+
+    @classmethod
+    def from_env(cls) -> "ThumbnailProfile":
+        """
+        Perfil a partir de THUMB_SIZE, THUMB_FORMAT, THUMB_QUALITY, THUMB_MAX_PIXELS,
+        THUMB_CACHE_MB y THUMB_CACHE_DIR.
+        """
+        return cls(
+            size=int(os.environ.get("THUMB_SIZE", str(DEFAULT_SIZE))),
+            format=os.environ.get("THUMB_FORMAT", DEFAULT_FORMAT),
+            quality=int(os.environ.get("THUMB_QUALITY", str(DEFAULT_QUALITY))),
+            max_pixels=int(os.environ.get("THUMB_MAX_PIXELS", str(DEFAULT_MAX_PIXELS))),
+            cache_mb=int(os.environ.get("THUMB_CACHE_MB", str(DEFAULT_CACHE_MB))),
+            cache_dir=os.environ.get("THUMB_CACHE_DIR") or None,
+        )
+
+    @property
+    def caching(self) -> bool:
+        return self.cache_mb > 0 or self.cache_dir is not None
+
+    def cache_key(self, data: bytes) -> str:
+        """Clave de la caché: SHA-256 de la imagen de origen y de los parámetros de salida."""
+        digest = hashlib.sha256(data)
+        digest.update(f"|{self.size}|{self.format}|{self.quality}".encode())
+        return digest.hexdigest()
+
+    def save_options(self) -> Dict[str, object]:
+        if self.format == "webp":
+            return {"format": "WEBP", "quality": self.quality, "method": 4}
+        if self.format == "jpeg":
+            return {"format": "JPEG", "quality": self.quality}
+        # PNG sin optimize: el thumbnail ya es chico y optimize multiplica el tiempo de encode
+        return {"format": "PNG", "compress_level": 6}
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "format": self.format,
+            "quality": self.quality,
+            "max_pixels": self.max_pixels,
+            "cache_mb": self.cache_mb,
+            "cache_dir": self.cache_dir,
+        }
+
+
+_profile: Optional[ThumbnailProfile] = None
+_store: Optional[BlobStore] = None
+
+
+def configure_thumbnails(profile: Optional[ThumbnailProfile]) -> None:
+    """Fija el perfil de este proceso (pensado como initializer del pool); None vuelve al de entorno."""
+    global _profile, _store
+    _profile = profile
+    _store = None
+
+
+def get_thumbnail_profile() -> ThumbnailProfile:
+    global _profile
+    if _profile is None:
+        _profile = ThumbnailProfile.from_env()
+    return _profile
+
+
+def get_thumbnail_store() -> Optional[BlobStore]:
+    """Caché de thumbnails del proceso según el perfil (None si está deshabilitada)."""
+    global _store
+    profile = get_thumbnail_profile()
+    if _store is None and profile.caching:
+        _store = BlobStore(max_bytes=profile.cache_mb * 1024 * 1024, directory=profile.cache_dir)
+    return _store
+
+
+def make_thumbnail(data: bytes, profile: Optional[ThumbnailProfile] = None) -> bytes:
+    """Decodifica `data` a resolución reducida y devuelve el thumbnail codificado."""
+    profile = profile or get_thumbnail_profile()
+    target = (profile.size, profile.size)
+    try:
+        img = Image.open(io.BytesIO(data))
+    except Exception as e:
+        raise ThumbnailError(f"invalid image: {e}") from e
+    # Image.open sólo lee la cabecera: hasta acá no se decodificó nada
+    if img.format == "JPEG":
+        # Al menos el doble del destino, como el reducing_gap de thumbnail, para no perder nitidez
+        img.draft("RGB", (profile.size * REDUCING_GAP, profile.size * REDUCING_GAP))
+    width, height = img.size
+    if width * height > profile.max_pixels:
+        raise ThumbnailError(f"image too large: {width}x{height} pixels")
+    keep_alpha = profile.format in ALPHA_FORMATS and (
+        img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    )
+    mode = "RGBA" if keep_alpha else "RGB"
+    if img.mode in PALETTE_MODES:
+        # Con paleta o 1 bit Pillow remuestrea con NEAREST: se convierte antes
+        img = img.convert(mode)
+    # Se reduce primero y se convierte la imagen chica (sin copia a resolución completa)
+    img.thumbnail(target, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+    if img.mode != mode:
+        img = img.convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, **profile.save_options())
+    return buf.getvalue()
+
+
+def make_thumbnails(images: Sequence[Optional[bytes]], profile: Optional[ThumbnailProfile] = None) -> List[Optional[bytes]]:
+    """
+    Lote de thumbnails en una sola llamada; None en lugar de las imágenes que
+    fallan. Con el perfil del proceso se usa su caché por contenido.
+    """
+    store = get_thumbnail_store() if profile is None else None
+    profile = profile or get_thumbnail_profile()
+    thumbs = []
+    for data in images:
+        if not data:
+            thumbs.append(None)
+            continue
+        key = profile.cache_key(data) if store is not None else None
+        thumb = store.get(key) if key is not None else None
+        if thumb is None:
+            try:
+                thumb = make_thumbnail(data, profile)
+            except Exception:
+                thumbs.append(None)
+                continue
+            if key is not None:
+                store.put(thumb, key)
+        thumbs.append(thumb)
+    return thumbs
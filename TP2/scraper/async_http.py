@@ -2,53 +2,192 @@
 Helpers para uso de aiohttp ClientSession en el scraper.
 
 Contiene:
-- make_session: crea una ClientSession con un TCPConnector configurado (limits, ssl)
-- fetch_text: wrapper para obtener texto de una URL con manejo básico de errores/timeouts
+- ConnectorProfile: configuración única del TCPConnector (límites, keep-alive,
+  caché de DNS, happy eyeballs y resolver), leída del entorno o de la CLI
+- ConnectionPoolStats: uso del pool de conexiones (en uso, adquisiciones en
+  cola, conexiones nuevas vs reutilizadas, aciertos de la caché de DNS),
+  medido con un TraceConfig
+- make_session: crea una ClientSession con el connector del perfil
 
-La idea es encapsular la configuración del pool de conexiones y la política
-de timeouts en un único lugar, para reusar y cambiar parámetros fácilmente.
+La idea es encapsular la configuración del pool de conexiones en un único
+lugar, para reusar y cambiar parámetros fácilmente. La descarga en sí (timeouts,
+tope de tamaño, mapeo de errores) está en scraper.engine.scrape_worker.
 """
-from typing import Tuple, Optional
+import os
+import time
+from typing import Any, Dict, Optional
 import aiohttp
-import asyncio
+
+try:
+    import aiodns  # noqa: F401  (opcional: resolver DNS asíncrono basado en c-ares)
+    AIODNS_AVAILABLE = True
+except ImportError:
+    AIODNS_AVAILABLE = False
 
 # Valores por defecto
 DEFAULT_LIMIT = 100          # max conexiones totales en el pool
 DEFAULT_LIMIT_PER_HOST = 10  # max conexiones simultáneas por host
+DEFAULT_KEEPALIVE = 30.0     # segundos que una conexión ociosa queda abierta para reusarse
+DEFAULT_DNS_TTL = 300        # segundos que se cachea cada resolución DNS
+DEFAULT_HAPPY_EYEBALLS = 0.25  # segundos antes de probar la siguiente dirección (IPv6/IPv4)
+RESOLVERS = ("auto", "aiodns", "threaded")
 
 
-def make_session(limit: int = DEFAULT_LIMIT, limit_per_host: int = DEFAULT_LIMIT_PER_HOST, headers: dict | None = None) -> aiohttp.ClientSession:
+class ConnectorProfile:
     """
-    Crea y devuelve una aiohttp.ClientSession con un connector configurado.
-    - limit: número máximo de conexiones totales
-    - limit_per_host: número máximo de conexiones por host
-    - headers: headers por defecto
+    Perfil del TCPConnector del scraper.
+
+    - `limit` / `limit_per_host`: conexiones totales y por host (0 = sin límite)
+    - `keepalive_timeout`: segundos que se conserva una conexión ociosa
+    - `dns_ttl`: segundos de la caché de DNS del connector (0 = sin caché)
+    - `happy_eyeballs_delay`: espera antes de intentar la siguiente dirección
+      del host (RFC 8305); 0 = intentar las direcciones de a una
+    - `resolver`: "aiodns" (requiere el paquete aiodns), "threaded"
+      (getaddrinfo en threads) o "auto" (aiodns si está instalado)
     """
-    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host)
-    session = aiohttp.ClientSession(connector=connector, headers=headers)
-    return session
 
+    def __init__(
+        self,
+        limit: int = DEFAULT_LIMIT,
+        limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE,
+        dns_ttl: int = DEFAULT_DNS_TTL,
+        happy_eyeballs_delay: float = DEFAULT_HAPPY_EYEBALLS,
+        resolver: str = "auto",
+    ):
+        if resolver not in RESOLVERS:
+            raise ValueError(f"invalid resolver: {resolver}")
+        if resolver == "aiodns" and not AIODNS_AVAILABLE:
+            raise ValueError("resolver aiodns requires the aiodns package")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+        self.resolver = resolver
+
+    @classmethod
+    def from_env(cls) -> "ConnectorProfile":
+        """Perfil a partir de AIO_LIMIT, AIO_LIMIT_PER_HOST, AIO_KEEPALIVE, AIO_DNS_TTL, AIO_HAPPY_EYEBALLS y AIO_RESOLVER."""
+        return cls(
+            limit=int(os.environ.get("AIO_LIMIT", str(DEFAULT_LIMIT))),
+            limit_per_host=int(os.environ.get("AIO_LIMIT_PER_HOST", str(DEFAULT_LIMIT_PER_HOST))),
+            keepalive_timeout=float(os.environ.get("AIO_KEEPALIVE", str(DEFAULT_KEEPALIVE))),
+            dns_ttl=int(os.environ.get("AIO_DNS_TTL", str(DEFAULT_DNS_TTL))),
+            happy_eyeballs_delay=float(os.environ.get("AIO_HAPPY_EYEBALLS", str(DEFAULT_HAPPY_EYEBALLS))),
+            resolver=os.environ.get("AIO_RESOLVER", "auto"),
+        )
+
+    @property
+    def resolver_name(self) -> str:
+        if self.resolver == "auto":
+            return "aiodns" if AIODNS_AVAILABLE else "threaded"
+        return self.resolver
 
-async def fetch_text(session: aiohttp.ClientSession, url: str, timeout: int) -> Tuple[Optional[str], int, str]:
+    def connector(self) -> aiohttp.TCPConnector:
+        """Crea el connector (llamar dentro del event loop: el resolver se liga a él)."""
+        resolver = aiohttp.AsyncResolver() if self.resolver_name == "aiodns" else aiohttp.ThreadedResolver()
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=self.dns_ttl > 0,
+            ttl_dns_cache=self.dns_ttl if self.dns_ttl > 0 else None,
+            happy_eyeballs_delay=self.happy_eyeballs_delay or None,
+            resolver=resolver,
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_ttl": self.dns_ttl,
+            "happy_eyeballs_delay": self.happy_eyeballs_delay,
+            "resolver": self.resolver_name,
+        }
+
+
+class ConnectionPoolStats:
     """
-    Hace un GET asíncrono y devuelve (text_or_none, status, final_url).
+    Contadores del pool de conexiones de una ClientSession, alimentados por un TraceConfig:
+    adquisiciones que esperaron lugar en el connector (y cuánto), conexiones
+    creadas vs reutilizadas y aciertos de la caché de DNS.
+    """
+
+    def __init__(self):
+        self.queued = 0  # adquisiciones esperando ahora
+        self.queued_total = 0
+        self.queue_wait = 0.0
+        self.queue_wait_max = 0.0
+        self.created = 0
+        self.reused = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_queued_start.append(self._queued_start)
+        trace.on_connection_queued_end.append(self._queued_end)
+        trace.on_connection_create_end.append(self._created)
+        trace.on_connection_reuseconn.append(self._reused)
+        trace.on_dns_cache_hit.append(self._dns_hit)
+        trace.on_dns_cache_miss.append(self._dns_miss)
+        return trace
 
-    - Si ocurre un error controlado (timeout, conexión, invalid URL), devuelve (None, status_estimate, error_msg)
+    async def _queued_start(self, session, ctx, params):
+        self.queued += 1
+        self.queued_total += 1
+        ctx.queued_at = time.perf_counter()
+
+    async def _queued_end(self, session, ctx, params):
+        self.queued -= 1
+        waited = time.perf_counter() - ctx.queued_at
+        self.queue_wait += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+
+    async def _created(self, session, ctx, params):
+        self.created += 1
+
+    async def _reused(self, session, ctx, params):
+        self.reused += 1
+
+    async def _dns_hit(self, session, ctx, params):
+        self.dns_hits += 1
+
+    async def _dns_miss(self, session, ctx, params):
+        self.dns_misses += 1
+
+    def snapshot(self, connector: Optional[aiohttp.BaseConnector] = None) -> Dict[str, Any]:
+        data = {
+            "queued": self.queued,
+            "queued_total": self.queued_total,
+            "queue_wait_ms_avg": round(self.queue_wait / self.queued_total * 1000, 2) if self.queued_total else 0.0,
+            "queue_wait_ms_max": round(self.queue_wait_max * 1000, 2),
+            "created": self.created,
+            "reused": self.reused,
+            "dns_cache_hits": self.dns_hits,
+            "dns_cache_misses": self.dns_misses,
+        }
+        if connector is not None:
+            # aiohttp no expone las conexiones prestadas: se leen del estado interno del connector
+            data["in_use"] = len(getattr(connector, "_acquired", ()))
+            data["idle"] = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return data
+
+
+def make_session(
+    profile: Optional[ConnectorProfile] = None,
+    headers: dict | None = None,
+    stats: Optional[ConnectionPoolStats] = None,
+) -> aiohttp.ClientSession:
     """
-    try:
-        timeout_cfg = aiohttp.ClientTimeout(total=timeout)
-        async with session.get(url, timeout=timeout_cfg) as resp:
-            resp.raise_for_status()  # lanza ClientResponseError si status >=400
-            text = await resp.text()
-            return text, resp.status, str(resp.url)
-    except asyncio.TimeoutError as e:
-        # Timeout: devolver None y un status simbólico (504)
-        return None, 504, f"timeout: {e}"
-    except aiohttp.ClientResponseError as e:
-        # Respuesta con status 4xx/5xx
-        return None, e.status, f"response_error: {e}"
-    except aiohttp.InvalidURL as e:
-        return None, 400, f"invalid_url: {e}"
-    except Exception as e:
-        # Errores de conexión, DNS, etc.
-        return None, 502, f"connection_error: {e}"
\ No newline at end of file
+    Crea y devuelve una aiohttp.ClientSession con el connector del perfil.
+    - profile: ConnectorProfile (default: ConnectorProfile.from_env())
+    - headers: headers por defecto
+    - stats: si se pasa, se le registran los eventos del pool (TraceConfig)
+    """
+    profile = profile or ConnectorProfile.from_env()
+    trace_configs = [stats.trace_config()] if stats is not None else None
+    session = aiohttp.ClientSession(connector=profile.connector(), headers=headers, trace_configs=trace_configs)
+    return session
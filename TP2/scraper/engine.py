@@ -0,0 +1,786 @@
+"""
+Módulo: engine.py
+-----------------
+Motor único de scraping de la Parte A: descarga, parsing y consulta a B.
+
+Un único camino para descargar, extraer y consultar a B, con los mismos
+timeouts, topes de tamaño y mapeo de errores para todos sus usos: los
+handlers HTTP, /scrape/batch y el cliente de línea de comandos
+(client.py --direct). ScrapeEngine reúne los recursos compartidos:
+
+- una ClientSession armada con ConnectorProfile (límites, keep-alive, DNS);
+- el planificador por host (HostScheduler) y el pool de conexiones a B;
+- la caché de resultados, el single-flight y el executor de parsing;
+- el almacén de blobs (BlobStore): con la opción `blobs` = "id" o "url" el
+  screenshot y los thumbnails se devuelven como id de contenido (SHA-256) o
+  como ruta /blobs/<id> en lugar de base64, y se sirven aparte.
+
+API:
+    engine = ScrapeEngine(process_host="127.0.0.1", process_port=9001)
+    await engine.start()
+    data = await engine.fetch(url)                 # descarga + extracción
+    data, images = await engine.parse(body, "utf-8", url)
+    processing_data = await engine.process(payload)
+    response = await engine.run(url, make_options())     # todo, con caché
+    async for result in engine.run_batch(urls, make_options()): ...
+    await engine.close()
+
+Los errores de descarga se informan como excepciones HTTP de aiohttp
+(400, 413, 502, 504) con cuerpo {"error": ...}; los de B quedan en
+processing_data y el status pasa a partial_failure.
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+import aiohttp
+from aiohttp import web
+
+from common.blob_store import BlobStore
+from common.cache import ResponseCache, SingleFlight, conditional_headers, normalize_url, response_validators
+from common.protocol import DEFAULT_POOL_SIZE, PROCESSING_OPERATIONS, SCREENSHOT_RENDERERS, ProcessorPool
+from common.resilience import ResilienceProfile, ResilientProcessor
+from scraper.async_http import ConnectionPoolStats, ConnectorProfile, make_session
+from scraper.host_scheduler import HostScheduler
+from scraper.html_parser import SCRAPING_FIELDS, HtmlExtractor
+from scraper.parse_executor import DEFAULT_PARSE_MODE, DEFAULT_PARSE_WORKERS, DEFAULT_PROCESS_THRESHOLD, ParseExecutor
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+DEFAULT_TIMEOUT = 30  # segundos. Limita cuánto esperamos por una página
+MAX_PAGE_BYTES = 5 * 1024 * 1024  # tope sobre los bytes efectivamente recibidos
+READ_CHUNK = 64 * 1024  # el cuerpo se lee y parsea de a pedazos de este tamaño
+# Imágenes que se reenvían a B, ya ordenadas como las ordena B (common/image_ranking.py):
+# B toma las primeras --max-images, así que el tope es el máximo que B puede usar
+MAX_FORWARDED_IMAGES = 32
+DEFAULT_BATCH_WINDOW = 64  # URLs en vuelo por batch
+
+# Qué reenviar a B de la descarga ya hecha por A, para que B no la repita:
+# - "html": cuerpo comprimido (zlib) + mediciones de A
+# - "images": sólo las URLs de imágenes ya extraídas + mediciones de A
+# - "none": nada; B descarga la página por su cuenta (comportamiento original)
+FORWARD_MODES = ("html", "images", "none")
+DEFAULT_FORWARD_MODE = os.environ.get("FORWARD_MODE", "html")
+
+# Cómo devolver los binarios de processing_data (screenshot, thumbnails):
+# - "inline": bytes (base64 en JSON), como siempre
+# - "id": el id del blob (SHA-256 del contenido)
+# - "url": la ruta BLOB_PATH + id, servida por A (GET /blobs/{id})
+BLOB_MODES = ("inline", "id", "url")
+DEFAULT_BLOB_MODE = os.environ.get("BLOB_MODE", "inline")
+BLOB_PATH = "/blobs/"
+
+
+# --- Opciones por request -----------------------------------------------------
+FIELD_GROUPS = ("scraping_data", "processing_data")
+
+
+def _invalid_fields(message: str) -> ValueError:
+    valid = ", ".join(SCRAPING_FIELDS + PROCESSING_OPERATIONS + FIELD_GROUPS)
+    return ValueError(f"{message} (valid fields: {valid})")
+
+
+def parse_fields(raw: Optional[str]) -> Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]:
+    """
+    Campos pedidos (?fields= / --fields), separados por coma.
+    Devuelve (campos de scraping_data, operaciones de B); None = todos.
+    "scraping_data" y "processing_data" equivalen a todos los campos de cada parte.
+    Lanza ValueError (con la lista de campos válidos) ante un campo
+    desconocido o una lista vacía.
+    """
+    if raw is None:
+        return None, None
+    requested = set()
+    for name in (f.strip() for f in raw.split(",")):
+        if not name:
+            continue
+        if name == "scraping_data":
+            requested.update(SCRAPING_FIELDS)
+        elif name == "processing_data":
+            requested.update(PROCESSING_OPERATIONS)
+        elif name in SCRAPING_FIELDS or name in PROCESSING_OPERATIONS:
+            requested.add(name)
+        else:
+            raise _invalid_fields(f"invalid field: {name}")
+    if not requested:
+        raise _invalid_fields("empty fields")
+    scraping = tuple(f for f in SCRAPING_FIELDS if f in requested)
+    operations = tuple(op for op in PROCESSING_OPERATIONS if op in requested)
+    return (None if len(scraping) == len(SCRAPING_FIELDS) else scraping,
+            None if len(operations) == len(PROCESSING_OPERATIONS) else operations)
+
+
+def make_options(
+    forward_mode: str = DEFAULT_FORWARD_MODE,
+    fresh_performance: bool = False,
+    fields: Optional[str] = None,
+    budget: Optional[float] = None,
+    blobs: str = DEFAULT_BLOB_MODE,
+    renderer: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Opciones de una request (modo de reenvío, medición nueva en B, campos,
+    segundos que el cliente está dispuesto a esperar, cómo devolver los
+    binarios y con qué renderizador saca B el screenshot). Lanza ValueError
+    si son inválidas.
+    """
+    if forward_mode not in FORWARD_MODES:
+        raise ValueError(f"invalid forward mode: {forward_mode}")
+    if blobs not in BLOB_MODES:
+        raise ValueError(f"invalid blobs mode: {blobs}")
+    if renderer is not None and renderer not in SCREENSHOT_RENDERERS:
+        raise ValueError(f"invalid renderer: {renderer}")
+    if budget is not None and not budget > 0:
+        raise ValueError(f"invalid budget: {budget}")
+    scraping_fields, operations = parse_fields(fields)
+    return {
+        "forward_mode": forward_mode,
+        # fresh_performance obliga a B a descargar la página de nuevo para medirla
+        "fresh_performance": fresh_performance,
+        "fields": scraping_fields,
+        "operations": operations,
+        # None: el presupuesto por defecto del perfil de resiliencia
+        "budget": budget,
+        "blobs": blobs,
+        # None: el renderizador por defecto de B
+        "renderer": renderer,
+    }
+
+
+def page_needed(operations: Optional[Tuple[str, ...]]) -> bool:
+    """B sólo usa la página (reenviada o descargada) para thumbnails y performance."""
+    return operations is None or "thumbnails" in operations or "performance" in operations
+
+
+def select_fields(data: Dict[str, Any], fields: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """scraping_data con sólo los campos pedidos (todo si fields es None)."""
+    if fields is None:
+        return data
+    return {f: data[f] for f in fields if f in data}
+
+
+def select_operations(result: Dict[str, Any], operations: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
+    """Respuesta de B con sólo las operaciones pedidas (todo si operations es None)."""
+    if operations is None or not isinstance(result.get("processing_data"), dict):
+        return result
+    parts = result["processing_data"]
+    return {**result, "processing_data": {op: parts[op] for op in operations if op in parts}}
+
+
+# --- Payload para B -----------------------------------------------------------
+def build_forwarded_page(page: Dict[str, Any], mode: str) -> Optional[Dict[str, Any]]:
+    """
+    Arma payload["page"] para B a partir de lo que scrape_worker dejó en `page`.
+    Devuelve None si no hay que reenviar nada. Tras un 304 no hay cuerpo:
+    se reenvían las URLs de imágenes guardadas aunque el modo sea "html".
+    """
+    if mode == "none" or "final_url" not in page:
+        return None
+    forwarded = {
+        "final_url": page["final_url"],
+        "fetch_ms": page["fetch_ms"],
+        "size_bytes": page["size_bytes"],
+    }
+    if mode == "images" or "body" not in page:
+        forwarded["image_urls"] = page["image_urls"]
+    else:
+        # bytes crudos: el protocolo binario los envía como blob (JSON los pasa a base64)
+        forwarded["html_zlib"] = zlib.compress(page["body"])
+    return forwarded
+
+
+def build_processing_payload(
+    url: str, scraping_data: Dict[str, Any], page: Dict[str, Any], options: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Payload para B; `page` es lo que dejó scrape_worker ({} si no hay nada que reenviar)."""
+    payload = {
+        "url": url,
+        "scraping_data": scraping_data,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+    forwarded = build_forwarded_page(page, options["forward_mode"])
+    if forwarded is not None:
+        payload["page"] = forwarded
+    if options["fresh_performance"]:
+        payload["fresh_performance"] = True
+    if options["operations"] is not None:
+        payload["operations"] = list(options["operations"])
+    if options.get("renderer") is not None:
+        payload["renderer"] = options["renderer"]
+    return payload
+
+
+# --- Errores ------------------------------------------------------------------
+def http_error_message(exc: web.HTTPException) -> str:
+    """Mensaje {"error": ...} de las excepciones HTTP de scrape_worker."""
+    try:
+        return json.loads(exc.text)["error"]
+    except (TypeError, ValueError, KeyError):
+        return exc.reason
+
+
+def processing_error(exc: BaseException) -> str:
+    """Descripción de un error de la consulta a B (los timeouts no traen mensaje)."""
+    return str(exc) or type(exc).__name__
+
+
+def url_cache_key(url: str) -> str:
+    """
+    normalize_url de `url`; si está mal formada (puerto inválido, IPv6 sin
+    cerrar) responde 400, como cualquier fallo inesperado de scrape_worker.
+    """
+    try:
+        return normalize_url(url)
+    except ValueError as e:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": f"Fallo inesperado: {str(e)}"}),
+            content_type="application/json",
+        )
+
+
+def page_too_large(size: int) -> web.HTTPException:
+    return web.HTTPRequestEntityTooLarge(
+        max_size=MAX_PAGE_BYTES,
+        actual_size=size,
+        text=json.dumps({"error": f"El contenido es demasiado grande ({size} bytes)"}),
+        content_type="application/json",
+    )
+
+
+def stream_encoding(resp: aiohttp.ClientResponse) -> str:
+    """Encoding para decodificar el cuerpo a medida que llega: charset del header o UTF-8 (como resp.text())."""
+    if resp.charset:
+        try:
+            return codecs.lookup(resp.charset).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def batch_item_url(item: Any) -> str:
+    """URL de un elemento del batch: string o {"url": ...}. Lanza ValueError si no es válida."""
+    if isinstance(item, dict):
+        item = item.get("url")
+    if not isinstance(item, str) or not item.strip():
+        raise ValueError(f"invalid batch item: {item!r}")
+    url = item.strip()
+    if urlparse(url).scheme not in ("http", "https"):
+        raise ValueError(f"invalid url: {url}")
+    return url
+
+
+async def _aiter(items: Iterable[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+# --- Descarga + extracción ----------------------------------------------------
+async def scrape_worker(
+    url: str,
+    session: aiohttp.ClientSession,
+    timeout: int,
+    page: Optional[Dict[str, Any]] = None,
+    cache: Optional[ResponseCache] = None,
+    parser: Optional[ParseExecutor] = None,
+    fields: Optional[Iterable[str]] = None,
+    link_options: Optional[Dict[str, bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Realiza un GET asíncrono a `url` y extrae scraping_data del HTML.
+    Mapea errores de red a excepciones HTTP precisas (400, 413, 502, 504) que aiohttp
+    interpretará y enviará al cliente como respuestas con JSON.
+
+    El cuerpo se lee de a pedazos y se entrega al extractor a medida que llega;
+    el tope de MAX_PAGE_BYTES se aplica a los bytes recibidos (con o sin
+    Content-Length). Con `fields` el resultado sólo trae esos campos y, si son
+    de <head> (title, meta_tags), la lectura se corta apenas están completos.
+
+    Si se pasa `page` (dict), se completa con lo necesario para reenviar la
+    descarga a B: body (bytes), final_url, fetch_ms, size_bytes e image_urls
+    (en ese caso el cuerpo se lee completo).
+
+    Si se pasa `cache`, se guardan los validadores (ETag / Last-Modified) de la
+    respuesta junto con lo extraído, y la próxima descarga es condicional: ante
+    un 304 se devuelve el scraping_data guardado sin descargar ni parsear
+    (`page` queda sin body, con las image_urls guardadas).
+
+    Con `parser` (ParseExecutor) el parsing corre fuera del event loop; si no,
+    se hace en el propio loop. `link_options` (strip_fragments, strip_tracking)
+    se pasa a la normalización de enlaces.
+    """
+    link_options = link_options or {}
+    key = url_cache_key(url) if cache is not None else None
+    previous = await cache.aget("validators", key) if cache is not None else None
+    start = time.perf_counter()
+    try:
+        # Abrimos la petición usando la session compartida y aplicamos timeout global.
+        # El `async with` garantiza que la respuesta se cierre/retorne al pool.
+        async with session.get(
+            url, timeout=aiohttp.ClientTimeout(total=timeout), headers=conditional_headers(previous)
+        ) as resp:
+            # Levanta ClientResponseError si el status es 4xx/5xx
+            resp.raise_for_status()
+
+            not_modified = resp.status == 304 and previous is not None
+            if not not_modified:
+                if resp.content_length and resp.content_length > MAX_PAGE_BYTES:
+                    raise page_too_large(resp.content_length)
+
+                base_url = str(resp.url)
+                encoding = stream_encoding(resp)
+                # Sólo se guardan validadores de extracciones completas
+                validators = response_validators(resp.headers) if cache is not None and fields is None else {}
+                image_limit = MAX_FORWARDED_IMAGES if page is not None or validators else 0
+                # route None: documento grande, se junta entero para el pool de procesos
+                route = parser.stream_route(resp.content_length) if parser is not None else "inline"
+                keep_body = page is not None or route is None
+                extractor = None
+                if route is not None:
+                    extractor = HtmlExtractor(base_url, image_limit, encoding=encoding, fields=fields, **link_options)
+                    if parser is not None:
+                        parser.count(route)
+
+                # Leer el cuerpo de forma asíncrona (no bloqueante), de a pedazos.
+                chunks = []
+                size = 0
+                async for chunk in resp.content.iter_chunked(READ_CHUNK):
+                    size += len(chunk)
+                    if size > MAX_PAGE_BYTES:
+                        raise page_too_large(size)
+                    if keep_body:
+                        chunks.append(chunk)
+                    if extractor is not None:
+                        if parser is not None:
+                            await parser.feed(route, extractor, chunk)
+                        else:
+                            extractor.feed(chunk)
+                        if not keep_body and extractor.done:
+                            break  # ya está todo lo pedido: no leemos el resto
+                fetch_ms = int((time.perf_counter() - start) * 1000)
+                body = b"".join(chunks)
+
+                # Se extraen título, links, meta, headers, count imágenes (y las primeras
+                # imágenes si hay que reenviarlas o guardarlas con los validadores).
+                # Usamos str(resp.url) para resolver URLs relativas y reflejar redirecciones.
+                if extractor is not None:
+                    scraping_data, image_urls = extractor.close()
+                else:
+                    scraping_data, image_urls = await parser.parse(
+                        body, encoding, base_url, image_limit, fields, link_options
+                    )
+            else:
+                fetch_ms = int((time.perf_counter() - start) * 1000)
+
+    # Mapeos de excepciones frecuentes a respuestas HTTP con JSON explicativo:
+    except web.HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        # Timeout de la operación de red
+        raise web.HTTPGatewayTimeout(
+            text=json.dumps({"error": "Timeout mientras se conectaba al servidor"}),
+            content_type="application/json",
+        )
+    except aiohttp.ClientConnectorError as e:
+        # Error al conectar (host inaccesible / conexión rechazada)
+        raise web.HTTPBadGateway(
+            text=json.dumps({"error": f"Conexión rechazada o fallida: {str(e)}"}),
+            content_type="application/json",
+        )
+    except aiohttp.ClientResponseError as e:
+        # El servidor remoto devolvió un status 4xx/5xx
+        status = e.status
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": f"Error HTTP recibido del servidor: {status}"}),
+            content_type="application/json",
+        )
+    except Exception as e:
+        # Cualquier otro error se mapea a 400 con mensaje minimalista
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": f"Fallo inesperado: {str(e)}"}),
+            content_type="application/json",
+        )
+
+    if not_modified:
+        # 304: la página no cambió, reutilizamos lo extraído en la descarga anterior
+        if page is not None:
+            page.update({
+                "final_url": previous["final_url"],
+                "fetch_ms": fetch_ms,
+                "size_bytes": previous["size_bytes"],
+                "image_urls": previous["image_urls"],
+            })
+        if fields is not None:
+            return {f: v for f, v in previous["scraping_data"].items() if f in set(fields)}
+        return previous["scraping_data"]
+
+    if validators:
+        await cache.aset("validators", key, {
+            **validators,
+            "scraping_data": scraping_data,
+            "final_url": base_url,
+            "size_bytes": len(body),
+            "image_urls": image_urls,
+        })
+    if page is not None:
+        page.update({
+            "body": body,
+            "final_url": base_url,
+            "fetch_ms": fetch_ms,
+            "size_bytes": len(body),
+            "image_urls": image_urls,
+        })
+    return scraping_data
+
+
+# --- Motor --------------------------------------------------------------------
+class ScrapeEngine:
+    """
+    Scraping + procesamiento en B con los recursos compartidos de la Parte A.
+
+    La ClientSession, las conexiones hacia B y el executor de parsing se crean
+    en `start()` (dentro del event loop) y se liberan en `close()`. Las
+    consultas a B pasan por ResilientProcessor (presupuesto, reintentos,
+    hedging entre `process_replicas` y circuit breaker). La caché y el
+    planificador pueden pasarse ya armados (p. ej. para compartirlos o
+    persistir la caché); si no, se usa una caché deshabilitada y un
+    planificador con los valores por defecto. Lo mismo el almacén de blobs
+    (por defecto, sólo en memoria).
+    """
+
+    def __init__(
+        self,
+        process_host: str = "127.0.0.1",
+        process_port: int = 9001,
+        process_replicas: Optional[Sequence[Tuple[str, int]]] = None,
+        resilience: Optional[ResilienceProfile] = None,
+        process_pool_size: int = DEFAULT_POOL_SIZE,
+        codecs: Optional[List[str]] = None,
+        timeout: int = DEFAULT_TIMEOUT,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[HostScheduler] = None,
+        connector_profile: Optional[ConnectorProfile] = None,
+        parse_mode: str = DEFAULT_PARSE_MODE,
+        parse_workers: int = DEFAULT_PARSE_WORKERS,
+        parse_process_threshold: int = DEFAULT_PROCESS_THRESHOLD,
+        link_options: Optional[Dict[str, bool]] = None,
+        batch_window: int = DEFAULT_BATCH_WINDOW,
+        blob_store: Optional[BlobStore] = None,
+    ):
+        self.process_host = process_host
+        self.process_port = process_port
+        # Réplicas adicionales de B (la principal es process_host:process_port)
+        self.process_replicas = [(process_host, process_port)] + [
+            r for r in (process_replicas or ()) if tuple(r) != (process_host, process_port)
+        ]
+        self.resilience = resilience or ResilienceProfile.from_env()
+        self.process_pool_size = process_pool_size
+        self.codecs = codecs
+        self.timeout = timeout
+        self.cache = cache if cache is not None else ResponseCache({})
+        self.scheduler = scheduler or HostScheduler(DEFAULT_WORKERS, DEFAULT_PER_HOST)
+        self.connector_profile = connector_profile or ConnectorProfile.from_env()
+        self.parse_mode = parse_mode
+        self.parse_workers = parse_workers
+        self.parse_process_threshold = parse_process_threshold
+        self.link_options = dict(link_options or {})
+        self.batch_window = max(1, batch_window)
+        self.blobs = blob_store if blob_store is not None else BlobStore()
+        self.single_flight = SingleFlight()
+        self.pool_stats = ConnectionPoolStats()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.processor: Optional[ResilientProcessor] = None
+        self.parser: Optional[ParseExecutor] = None
+
+    async def start(self) -> None:
+        # Todo lo que se liga al event loop se crea acá; las conexiones a B se abren al primer uso
+        self.session = make_session(self.connector_profile, stats=self.pool_stats)
+        self.processor = ResilientProcessor(
+            self.process_replicas,
+            lambda host, port: ProcessorPool(host, port, size=self.process_pool_size, codecs=self.codecs),
+            self.resilience,
+        )
+        self.processor.start_health_checks()
+        self.parser = ParseExecutor(
+            self.parse_mode, workers=self.parse_workers, process_threshold=self.parse_process_threshold
+        )
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+        if self.processor is not None:
+            await self.processor.close()
+        if self.parser is not None:
+            self.parser.close()
+        self.cache.close()
+
+    async def __aenter__(self) -> "ScrapeEngine":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    # --- Primitivas -----------------------------------------------------------
+    async def fetch(
+        self, url: str, fields: Optional[Iterable[str]] = None, page: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Descarga `url` y devuelve su scraping_data (ver scrape_worker)."""
+        return await scrape_worker(
+            url, self.session, self.timeout, page=page, cache=self.cache, parser=self.parser,
+            fields=fields, link_options=self.link_options,
+        )
+
+    async def parse(
+        self, body: bytes, encoding: str, base_url: str, fields: Optional[Iterable[str]] = None, image_limit: int = 0
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        """Extrae (scraping_data, image_urls) de un documento ya descargado, fuera del event loop."""
+        return await self.parser.parse(body, encoding, base_url, image_limit, fields, self.link_options)
+
+    async def process(self, payload: Dict[str, Any], budget: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Consulta a B dentro de `budget` segundos (None: el del perfil). Si la
+        comunicación falla (timeout, conexión rechazada, circuito abierto,
+        datos inválidos, etc.) devuelve {"error": ...} en lugar de lanzar.
+        """
+        try:
+            # El pool reutiliza conexiones TCP ya abiertas: cada request viaja con su request_id
+            # y varias pueden compartir el mismo socket (B responde en cualquier orden).
+            return await self.processor.request(payload, budget=budget)
+        except Exception as e:
+            return {"error": f"processing_server_error: {processing_error(e)}"}
+
+    async def process_stream(self, payload: Dict[str, Any], budget: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Eventos parciales de B; el último es {"event": "done", "status": ...}."""
+        try:
+            async for event in self.processor.request_stream({**payload, "stream": True}, budget=budget):
+                yield event
+                if event.get("event") == "done":
+                    return
+        except Exception as e:
+            yield {"event": "done", "status": "failed", "error": f"processing_server_error: {processing_error(e)}"}
+
+    # --- Operaciones completas --------------------------------------------------
+    async def scrape(self, url: str, options: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Descarga y extrae `url` y arma el payload para B.
+        Devuelve (scraping_data, payload); las excepciones de scrape_worker se propagan.
+        """
+        # Si vamos a reenviar la descarga a B (y B la necesita), scrape_worker completa `page`.
+        page: Dict[str, Any] = {}
+        forward = options["forward_mode"] != "none" and page_needed(options["operations"])
+        scraping_data = await self.fetch(url, options["fields"], page=page if forward else None)
+        return scraping_data, build_processing_payload(url, scraping_data, page, options)
+
+    async def run(self, url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Scraping + procesamiento en B de una URL; devuelve la respuesta consolidada.
+        Las excepciones de scrape_worker se propagan; los errores de B quedan en
+        processing_data y el status pasa a partial_failure.
+
+        Requests concurrentes por la misma URL normalizada (y mismas opciones)
+        comparten una única ejecución.
+
+        Con `fields` sólo se extraen los campos pedidos y B recibe sólo las
+        operaciones pedidas; si no se pide ninguna, no se consulta a B. La caché
+        guarda únicamente resultados completos (de los que se sirven subconjuntos).
+        """
+        key = url_cache_key(url)
+        flight_key = (key, options["forward_mode"], options["fresh_performance"], options["fields"], options["operations"],
+                      options.get("renderer"))
+        # El presupuesto para B se cuenta desde que llega la request (incluye la espera y la descarga)
+        started = time.monotonic()
+        response = await self.single_flight.run(flight_key, lambda: self._run(url, key, options, started))
+        # Otra URL puede haber iniciado la ejecución compartida: cada cliente ve la suya
+        response = {**response, "url": url}
+        if options.get("blobs", "inline") != "inline":
+            response["processing_data"] = self.externalize(response["processing_data"], options["blobs"])
+        return response
+
+    def blob_ref(self, data: Any, mode: str) -> Any:
+        """Guarda `data` (bytes) en el almacén y devuelve su id o su ruta; otros valores quedan igual."""
+        if mode == "inline" or not isinstance(data, (bytes, bytearray)):
+            return data
+        blob = self.blobs.put(bytes(data))
+        return blob if mode == "id" else BLOB_PATH + blob
+
+    def externalize(self, processing_data: Dict[str, Any], mode: str) -> Dict[str, Any]:
+        """
+        Copia de processing_data (la respuesta de B, con los datos en su propio
+        "processing_data") con el screenshot y los thumbnails reemplazados por
+        referencias al almacén de blobs. La original puede estar en la caché.
+        """
+        if isinstance(processing_data.get("processing_data"), dict):
+            return {**processing_data, "processing_data": self.externalize(processing_data["processing_data"], mode)}
+        out = dict(processing_data)
+        if "screenshot" in out:
+            out["screenshot"] = self.blob_ref(out["screenshot"], mode)
+        if isinstance(out.get("thumbnails"), list):
+            out["thumbnails"] = [self.blob_ref(t, mode) for t in out["thumbnails"]]
+        return out
+
+    def budget_left(self, options: Dict[str, Any], started: float) -> float:
+        """Segundos que le quedan al cliente para la consulta a B."""
+        return (options.get("budget") or self.resilience.budget) - (time.monotonic() - started)
+
+    async def _run(self, url: str, key: str, options: Dict[str, Any], started: float) -> Dict[str, Any]:
+        cache = self.cache
+        fields, operations = options["fields"], options["operations"]
+
+        # fresh_performance pide una medición nueva y un renderizador explícito
+        # un screenshot concreto: en esos casos no se usa processing_data cacheado
+        processing_data = None
+        renderer = options.get("renderer")
+        if operations == ():
+            processing_data = {}  # no se pidió ninguna operación: B no se consulta
+        elif not options["fresh_performance"] and renderer is None:
+            cached = await cache.aget("processing", key)
+            if cached is not None:
+                processing_data = select_operations(cached, operations)
+
+        scraping_data = None
+        if fields == ():
+            scraping_data = {}  # sin campos de scraping: si B necesita la página, la descarga él
+        else:
+            cached = await cache.aget("scraping", key)
+            if cached is not None:
+                scraping_data = select_fields(cached, fields)
+
+        if scraping_data is not None and processing_data is not None:
+            payload = build_processing_payload(url, scraping_data, {}, options)
+        else:
+            # Sólo el trabajo que toca el sitio (y a B) pasa por el planificador por host:
+            # los aciertos de caché y las requests colapsadas no ocupan lugar ni esperan demoras
+            async with self.scheduler.slot(url):
+                if scraping_data is None:
+                    if processing_data is not None:
+                        # B no hace falta: no tiene sentido guardar el cuerpo para reenviarlo
+                        options = {**options, "forward_mode": "none"}
+                    scraping_data, payload = await self.scrape(url, options)
+                    if fields is None:
+                        await cache.aset("scraping", key, scraping_data)
+                else:
+                    # Sin descarga propia no hay nada que reenviar: B descarga la página si la necesita
+                    payload = build_processing_payload(url, scraping_data, {}, options)
+
+                if processing_data is None:
+                    processing_data = await self.process(payload, budget=self.budget_left(options, started))
+                    if not processing_data.get("error") and operations is None and renderer is None:
+                        await cache.aset("processing", key, processing_data)
+
+        # Consolidamos la respuesta final para el cliente
+        return {
+            "url": url,
+            "timestamp": payload["timestamp"],
+            "scraping_data": scraping_data,
+            "processing_data": processing_data,
+            "status": "success" if not processing_data.get("error") else "partial_failure",
+        }
+
+    async def run_stream(self, url: str, options: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Variante por eventos de run (sin caché): ("scraping_data", {...}) apenas
+        termina la extracción, luego ("screenshot" | "thumbnails" | "performance",
+        {"data": ...}) a medida que B termina cada parte y ("done", {"status": ...}).
+        Los errores de la descarga se lanzan antes del primer evento.
+        """
+        started = time.monotonic()
+        async with self.scheduler.slot(url):
+            scraping_data, payload = await self.scrape(url, options)
+            yield "scraping_data", {"url": url, "timestamp": payload["timestamp"], "scraping_data": scraping_data}
+
+            done: Dict[str, Any] = {"status": "success"}
+            # Sin operaciones pedidas (fields sólo de scraping) no se consulta a B
+            if options["operations"] != ():
+                async for event in self.process_stream(payload, budget=self.budget_left(options, started)):
+                    name = event.get("event")
+                    if name == "done":
+                        if event.get("status") != "success":
+                            done = {"status": "partial_failure", "error": event.get("error")}
+                        break
+                    part = {name: event.get("data")}
+                    if options.get("blobs", "inline") != "inline":
+                        part = self.externalize(part, options["blobs"])
+                    yield name, {"data": part[name]}
+            yield "done", done
+
+    async def run_item(self, index: int, item: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Un elemento de un batch: la respuesta de run con "index", o {"status": "failed", ...}."""
+        try:
+            url = batch_item_url(item)
+        except ValueError as e:
+            return {"index": index, "url": item, "status": "failed", "error": str(e), "http_status": 400}
+
+        try:
+            response = await self.run(url, options)
+        except web.HTTPException as e:
+            return {"index": index, "url": url, "status": "failed",
+                    "error": http_error_message(e), "http_status": e.status}
+        except Exception as e:
+            return {"index": index, "url": url, "status": "failed", "error": str(e), "http_status": 500}
+        return {"index": index, **response}
+
+    async def run_batch(
+        self, items: Union[Iterable[Any], AsyncIterable[Any]], options: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Procesa los elementos de `items` (URLs o {"url": ...}, iterable común o
+        asíncrono) y entrega cada resultado apenas termina, con "index" =
+        posición en la entrada; al final, un resumen {"done": true, "total": ..., "success": ..., ...}.
+
+        Sólo hay `batch_window` elementos en vuelo: la entrada se sigue leyendo a
+        medida que terminan, así un batch de decenas de miles de URLs no crea
+        decenas de miles de tareas a la vez. El límite por host y el reparto de
+        lugares globales los aplica el planificador dentro de run.
+        """
+        counts = {"success": 0, "partial_failure": 0, "failed": 0}
+        pending: set = set()
+        total = 0
+
+        async def finished():
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            results = [task.result() for task in done]
+            for result in results:
+                counts[result["status"]] = counts.get(result["status"], 0) + 1
+            return results
+
+        if not hasattr(items, "__aiter__"):
+            items = _aiter(items)
+        try:
+            async for item in items:
+                if len(pending) >= self.batch_window:
+                    for result in await finished():
+                        yield result
+                pending.add(asyncio.ensure_future(self.run_item(total, item, options)))
+                total += 1
+            while pending:
+                for result in await finished():
+                    yield result
+        finally:
+            # Si quien consume se va (p. ej. el cliente se desconecta), no seguimos scrapeando
+            for task in pending:
+                task.cancel()
+
+        yield {"done": True, "total": total, **counts}
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores del planificador, del pool HTTP, de la caché, del single-flight, del parsing y de los blobs."""
+        return {
+            "scheduler": self.scheduler.stats(),
+            "http_pool": {
+                **self.connector_profile.as_dict(),
+                **self.pool_stats.snapshot(self.session.connector if self.session is not None else None),
+            },
+            "cache": self.cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "parse_executor": {"mode": self.parse_mode, **(self.parser.stats if self.parser is not None else {})},
+            "processor": self.processor.stats() if self.processor is not None else self.resilience.as_dict(),
+            "blobs": self.blobs.stats(),
+        }
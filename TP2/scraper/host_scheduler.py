@@ -0,0 +1,257 @@
+"""
+Módulo: host_scheduler.py
+-------------------------
+Planificador de "cortesía" por host para la Parte A.
+
+Cada host (netloc) tiene su propia cola de espera, un límite de requests
+simultáneas (`per_host`) y un intervalo mínimo entre el inicio de dos
+requests (`min_delay`, o el Crawl-delay de su robots.txt si es mayor). Los
+lugares globales (`capacity`) se reparten por turnos entre los hosts con
+requests listas, así un batch con 90% de URLs de un dominio no acapara los
+workers ni deja esperando a los demás hosts, y ese dominio no recibe más de
+`per_host` requests a la vez.
+
+Uso:
+    scheduler = HostScheduler(capacity=4, per_host=2, min_delay=0.5)
+    async with scheduler.slot(url):
+        ...  # descarga
+
+Los hosts sin requests pendientes ni activas se descartan cuando vence su
+intervalo mínimo, para no acumular estado por cada host visto.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+MAX_CRAWL_DELAY = 30.0  # un Crawl-delay absurdo no debe frenar al host indefinidamente
+ROBOTS_TTL = 24 * 3600
+ROBOTS_TIMEOUT = 5
+
+
+class _Host:
+    __slots__ = ("waiters", "active", "next_start", "delay", "ready", "throttled")
+
+    def __init__(self, delay: float):
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = 0
+        self.next_start = 0.0
+        self.delay = delay
+        self.ready = True  # False mientras se consulta su robots.txt
+        self.throttled = False  # hubo que esperar el intervalo mínimo
+
+
+class HostScheduler:
+    """
+    Cola por host con límite de concurrencia, intervalo mínimo y reparto por turnos.
+
+    `crawl_delay(url)`, si se pasa, es una coroutine que devuelve el Crawl-delay
+    del host de `url` (o None); se consulta una vez por host antes de su primera request.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        per_host: int,
+        min_delay: float = 0.0,
+        crawl_delay: Optional[Callable[[str], Awaitable[Optional[float]]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if capacity < 1 or per_host < 1:
+            raise ValueError("capacity and per-host limit must be >= 1")
+        self.capacity = capacity
+        self.per_host = per_host
+        self.min_delay = min_delay
+        self.crawl_delay = crawl_delay
+        self.clock = clock
+        self._hosts: Dict[str, _Host] = {}
+        self._ring: Deque[str] = deque()  # hosts con requests esperando, en orden de turno
+        self._last_served: Optional[str] = None
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lookups = set()  # consultas de robots.txt en curso
+        self.granted = 0
+        self.delayed = 0  # requests que esperaron por el intervalo mínimo de su host
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.min_delay)
+            if self.crawl_delay is not None:
+                state.ready = False
+                task = asyncio.ensure_future(self._load_crawl_delay(host, state, url))
+                self._lookups.add(task)
+                task.add_done_callback(self._lookups.discard)
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        if len(state.waiters) == 1:
+            # Un host nuevo entra en la ronda antes que el último atendido (que queda al final)
+            if self._ring and self._ring[-1] == self._last_served:
+                self._ring.insert(len(self._ring) - 1, host)
+            else:
+                self._ring.append(host)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(host, state)  # se le había asignado lugar justo antes de cancelarse
+            else:
+                self._forget(host, state, waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(host, state)
+
+    async def _load_crawl_delay(self, host: str, state: _Host, url: str) -> None:
+        try:
+            delay = await self.crawl_delay(url)
+        except Exception:
+            delay = None
+        if delay:
+            state.delay = max(state.delay, min(float(delay), MAX_CRAWL_DELAY))
+        state.ready = True
+        self._maybe_drop(host, state)
+        self._dispatch()
+
+    def _eligible(self, state: _Host, now: float) -> bool:
+        return state.ready and state.active < self.per_host and state.next_start <= now
+
+    def _dispatch(self) -> None:
+        """Asigna lugares libres recorriendo los hosts por turnos."""
+        now = self.clock()
+        wake_at = None
+        skipped = 0
+        while self._active < self.capacity and skipped < len(self._ring):
+            host = self._ring[0]
+            state = self._hosts[host]
+            self._ring.rotate(-1)
+            while state.waiters and state.waiters[0].done():
+                state.waiters.popleft()  # cancelado: lo limpia su propia request
+            if not state.waiters:
+                self._ring.pop()  # recién rotado: es el último
+                continue
+            if not self._eligible(state, now):
+                skipped += 1
+                if state.ready and state.active < self.per_host:
+                    state.throttled = True
+                    wake_at = state.next_start if wake_at is None else min(wake_at, state.next_start)
+                continue
+            waiter = state.waiters.popleft()
+            if not state.waiters:
+                self._ring.pop()
+            if state.throttled:
+                self.delayed += 1
+                state.throttled = False
+            state.active += 1
+            state.next_start = now + state.delay
+            self._last_served = host
+            self._active += 1
+            self.granted += 1
+            waiter.set_result(None)
+            skipped = 0
+        if wake_at is not None and self._active < self.capacity:
+            self._schedule(wake_at)
+
+    def _schedule(self, when: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(max(0.0, when - self.clock()), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, host: str, state: _Host) -> None:
+        state.active -= 1
+        self._active -= 1
+        self._maybe_drop(host, state)
+        self._dispatch()
+
+    def _forget(self, host: str, state: _Host, waiter: asyncio.Future) -> None:
+        try:
+            state.waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not state.waiters and host in self._ring:
+            self._ring.remove(host)
+        self._maybe_drop(host, state)
+
+    def _maybe_drop(self, host: str, state: _Host) -> None:
+        if state.active or state.waiters or not state.ready:
+            return
+        remaining = state.next_start - self.clock()
+        if remaining <= 0:
+            if self._hosts.get(host) is state:
+                del self._hosts[host]
+        else:
+            asyncio.get_running_loop().call_later(remaining, self._maybe_drop, host, state)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "capacity": self.capacity,
+            "per_host": self.per_host,
+            "active": self._active,
+            "queued": sum(len(s.waiters) for s in self._hosts.values()),
+            "hosts": len(self._hosts),
+            "granted": self.granted,
+            "delayed": self.delayed,
+        }
+
+
+class RobotsDelays:
+    """
+    Crawl-delay de robots.txt por host, consultado una vez y guardado `ttl` segundos.
+    Sin robots.txt (o si falla la descarga) no hay demora.
+    """
+
+    def __init__(
+        self,
+        session_getter: Callable[[], aiohttp.ClientSession],
+        user_agent: str = "*",
+        ttl: float = ROBOTS_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.session_getter = session_getter
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.clock = clock
+        self._delays: Dict[str, tuple] = {}  # origen -> (vence, delay)
+
+    async def __call__(self, url: str) -> Optional[float]:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc.lower()}"
+        cached = self._delays.get(origin)
+        if cached is not None and cached[0] > self.clock():
+            return cached[1]
+        delay = await self._fetch(origin)
+        self._delays[origin] = (self.clock() + self.ttl, delay)
+        return delay
+
+    async def _fetch(self, origin: str) -> Optional[float]:
+        try:
+            async with self.session_getter().get(
+                f"{origin}/robots.txt", timeout=aiohttp.ClientTimeout(total=ROBOTS_TIMEOUT)
+            ) as resp:
+                if resp.status != 200:
+                    return None
+                text = await resp.text(errors="replace")
+        except Exception:
+            return None
+        parser = RobotFileParser()
+        parser.parse(text.splitlines())
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is None and self.user_agent != "*":
+            delay = parser.crawl_delay("*")
+        return float(delay) if delay is not None else None
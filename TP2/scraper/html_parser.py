@@ -1,16 +1,207 @@
 """
-Parsing HTML básico con BeautifulSoup para extraer:
+Parsing HTML básico para extraer:
 - título
-- enlaces (normalizados con base_url)
+- enlaces (normalizados con base_url o <base href>, sin repetidos)
+- conteo de enlaces internos / externos
 - meta tags (name y property)
 - estructura de headers H1-H6 (conteo)
 - cantidad de imágenes
 
+parse_html_basic / parse_html_with_images usan HtmlExtractor: un target de
+lxml que recibe los eventos del parser (apertura/cierre de tags, texto) y
+extrae todo en una sola pasada, sin construir el árbol, por lo que la memoria
+no crece con el tamaño de la página. Admite `feed()` incremental (también de
+bytes, decodificados a medida que llegan) y, si se piden sólo algunos campos,
+indica con `done` cuándo ya no hace falta seguir leyendo el documento.
+
+parse_html_soup conserva la implementación original con BeautifulSoup
+(árbol completo + find_all); sirve de referencia para tests y benchmarks
+(benchmarks/bench_html_parser.py) y produce exactamente el mismo resultado.
 """
-from typing import Dict, Any, List
-from urllib.parse import urljoin
+import codecs
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
 from bs4 import BeautifulSoup
+from lxml import etree
+
+from common.image_ranking import MAX_CANDIDATES, OG_IMAGE_PROPERTIES, rank_image_sources
+from scraper.link_normalizer import LinkNormalizer
+
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+SCRAPING_FIELDS = ("title", "links", "link_counts", "meta_tags", "structure", "images_count")
+# Campos que quedan completos al cerrarse <head>: con sólo estos se puede cortar la lectura
+HEAD_FIELDS = frozenset(("title", "meta_tags"))
+
+
+class HtmlExtractor:
+    """
+    Target de lxml que arma scraping_data a partir de los eventos del parser.
+
+    Uso:
+        extractor = HtmlExtractor(base_url, image_limit=3)
+        extractor.feed(chunk)  # str o bytes, tantas veces como haga falta
+        scraping_data, image_urls = extractor.close()
+
+    - `encoding`: si se indica, los bytes se decodifican de forma incremental
+      con ese encoding (errores estrictos, como resp.text()).
+    - `fields`: campos de scraping_data pedidos (None: todos). El resultado
+      sólo los incluye y no se hace el trabajo de los demás (p. ej. el urljoin
+      de cada link); si son todos de <head> (title, meta_tags) `done`
+      pasa a True al cerrarse <head>: el resto del documento puede no leerse.
+      En ese caso se consideran sólo los meta tags de <head>, sin importar
+      cómo se partió el documento en chunks.
+    - `strip_fragments` / `strip_tracking`: opciones de LinkNormalizer, que
+      resuelve (honrando <base href>) y deduplica los enlaces.
+    - `image_limit`: cuántas imágenes principales devolver (URLs absolutas),
+      ordenadas como en common/image_ranking.py (og:image, luego por tamaño
+      declarado); el orden se decide al cerrar el documento.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "",
+        image_limit: int = 0,
+        encoding: Optional[str] = None,
+        fields: Optional[Iterable[str]] = None,
+        strip_fragments: bool = False,
+        strip_tracking: bool = False,
+    ):
+        self.base_url = base_url
+        self.image_limit = image_limit
+        self.fields = None if fields is None else tuple(f for f in SCRAPING_FIELDS if f in set(fields))
+        wanted = set(SCRAPING_FIELDS if self.fields is None else self.fields)
+        self._want_links = "links" in wanted or "link_counts" in wanted
+        self._want_meta = "meta_tags" in wanted
+        self._want_structure = "structure" in wanted
+        self._want_title = "title" in wanted
+        self._head_only = self.fields is not None and set(self.fields) <= HEAD_FIELDS
+        self._head_closed = False
+        self._decoder = codecs.getincrementaldecoder(encoding)() if encoding else None
+        self.links = LinkNormalizer(base_url, strip_fragments=strip_fragments, strip_tracking=strip_tracking)
+        self.meta_tags: Dict[str, str] = {}
+        self.structure = {tag: 0 for tag in HEADING_TAGS}
+        self.images_count = 0
+        self.image_urls: List[str] = []
+        self._image_candidates: List[Tuple[str, Any, Any]] = []
+        self._og_images: List[str] = []
+        # Título: sólo el primer <title>; el texto se junta por segmentos entre
+        # tags y cada segmento se recorta, como get_text(strip=True)
+        self._title_state = 0  # 0: sin ver, 1: adentro, 2: cerrado
+        self._title_parts: List[str] = []
+        self._segment: List[str] = []
+        self._parser = etree.HTMLParser(target=self)
+
+    # --- API de alimentación -------------------------------------------------
+    def feed(self, data: Union[str, bytes]) -> None:
+        if self._decoder is not None and isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        if data:
+            self._parser.feed(data)
+
+    @property
+    def done(self) -> bool:
+        """True si los campos pedidos ya están completos (sólo con campos de <head> y sin imágenes)."""
+        # Las imágenes se ordenan por tamaño: hace falta ver el documento entero
+        if not self._head_only or self.image_limit:
+            return False
+        title_ok = "title" not in self.fields or self._title_state == 2
+        meta_ok = "meta_tags" not in self.fields or self._head_closed
+        return title_ok and meta_ok
+
+    def close(self) -> Tuple[Dict[str, Any], List[str]]:
+        """Termina el parseo y devuelve (scraping_data, image_urls)."""
+        if self._decoder is not None:
+            tail = self._decoder.decode(b"", final=True)
+            if tail:
+                self._parser.feed(tail)
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            pass  # documento vacío: lxml se queja pero no hay nada que extraer
+        if self.image_limit:
+            self.image_urls = rank_image_sources(self._image_candidates, self._og_images, self.image_limit)
+        return self.result(), list(self.image_urls)
+
+    def result(self) -> Dict[str, Any]:
+        data = {
+            "title": "".join(self._title_parts),
+            "links": list(self.links.links),
+            "link_counts": self.links.counts(),
+            "meta_tags": dict(self.meta_tags),
+            "structure": dict(self.structure),
+            "images_count": self.images_count,
+        }
+        if self.fields is None:
+            return data
+        return {f: data[f] for f in self.fields}
+
+    # --- Interfaz target de lxml ----------------------------------------------
+    def start(self, tag, attrib):
+        if self._title_state == 1:
+            self._flush_title_segment()
+        if tag == "a":
+            if self._want_links:
+                href = attrib.get("href")
+                if href is not None:
+                    self.links.add(href)
+        elif tag == "meta":
+            if self.image_limit:
+                prop = attrib.get("property")
+                if prop and prop.lower() in OG_IMAGE_PROPERTIES and attrib.get("content", "").strip():
+                    self._og_images.append(self.links.resolve(attrib["content"].strip()))
+            # Con campos sólo de <head> el resultado no puede depender de hasta
+            # dónde llegó el último chunk: los <meta> de <body> se ignoran
+            if not self._want_meta or (self._head_only and self._head_closed):
+                return
+            # meta name="description" / property="og:title" content="..."
+            name = attrib.get("name")
+            if name:
+                self.meta_tags[name.lower()] = attrib.get("content", "")
+            prop = attrib.get("property")
+            if prop:
+                self.meta_tags[prop.lower()] = attrib.get("content", "")
+        elif tag == "img":
+            self.images_count += 1
+            src = attrib.get("src")
+            if src and self.image_limit and len(self._image_candidates) < MAX_CANDIDATES:
+                src = src.strip()
+                if not src.startswith("data:"):
+                    src = self.links.resolve(src)
+                self._image_candidates.append((src, attrib.get("width"), attrib.get("height")))
+        elif tag == "base":
+            href = attrib.get("href")
+            if href is not None:
+                self.links.set_base(href)
+        elif tag in self.structure:
+            if self._want_structure:
+                self.structure[tag] += 1
+        elif tag == "title" and self._title_state == 0 and self._want_title:
+            self._title_state = 1
+
+    def end(self, tag):
+        if self._title_state == 1:
+            self._flush_title_segment()
+            if tag == "title":
+                self._title_state = 2
+        if tag == "head":
+            self._head_closed = True
+
+    def data(self, data):
+        if self._title_state == 1:
+            self._segment.append(data)
+
+    def comment(self, text):
+        # Los comentarios no cuentan como texto, pero cortan el segmento
+        if self._title_state == 1:
+            self._flush_title_segment()
+
+    def _flush_title_segment(self):
+        if self._segment:
+            text = "".join(self._segment).strip()
+            if text:
+                self._title_parts.append(text)
+            self._segment = []
 
 
 def _get_meta_mapping(soup: BeautifulSoup) -> Dict[str, str]:
@@ -36,31 +227,66 @@ def _extract_links(soup: BeautifulSoup, base_url: str) -> List[str]:
     Extrae enlaces absolutos resolviendo href relativos contra base_url.
     - Ignora enlaces sin href
     - Normaliza via urljoin para manejar redirecciones y base tags
+    - Descarta repetidos conservando el orden
     """
     links = []
     for a in soup.find_all("a", href=True):
         href = a["href"]
         full = urljoin(base_url, href)
         links.append(full)
-    return links
+    return list(dict.fromkeys(links))
 
 
-def parse_html_basic(html: str, base_url: str = "") -> Dict[str, Any]:
-    """
-    Parsea HTML y devuelve un diccionario con la información principal.
+def _count_links(links: List[str], page_url: str) -> Dict[str, int]:
+    """Enlaces internos (mismo host que la página), externos y de otros esquemas."""
+    page_host = urlsplit(page_url).hostname or ""
+    counts = {"internal": 0, "external": 0, "other": 0}
+    for link in links:
+        parts = urlsplit(link)
+        if parts.scheme not in ("http", "https"):
+            counts["other"] += 1
+        elif (parts.hostname or "") == page_host:
+            counts["internal"] += 1
+        else:
+            counts["external"] += 1
+    return counts
 
-    - `html`: contenido HTML como str
-    - `base_url`: URL base para resolver enlaces relativos
+
+def _document_base(soup: BeautifulSoup, base_url: str) -> str:
+    """URL base efectiva: el primer <base href> del documento, si lo hay."""
+    base = soup.find("base", href=True)
+    if base is not None and base["href"].strip():
+        return urljoin(base_url, base["href"].strip())
+    return base_url
+
+
+def _extract_image_sources(soup: BeautifulSoup, base_url: str, limit: int) -> List[str]:
     """
-    # Crear el parser con lxml
-    soup = BeautifulSoup(html, "lxml")
+    Devuelve hasta `limit` URLs absolutas de imágenes principales (orden de
+    common/image_ranking.py). Es la lista que se reenvía a la Parte B para generar thumbnails.
+    """
+    og = [
+        urljoin(base_url, m.get("content", "").strip())
+        for m in soup.find_all("meta", property=True)
+        if m["property"].lower() in OG_IMAGE_PROPERTIES and m.get("content", "").strip()
+    ]
+    candidates = []
+    for img in soup.find_all("img", src=True, limit=MAX_CANDIDATES):
+        src = img["src"].strip()
+        if src and not src.startswith("data:"):
+            src = urljoin(base_url, src)
+        candidates.append((src, img.get("width"), img.get("height")))
+    return rank_image_sources(candidates, og, limit)
+
 
+def _parse_soup(soup: BeautifulSoup, base_url: str) -> Dict[str, Any]:
+    """Extrae scraping_data de un árbol ya construido."""
     # Título de la página
     title_tag = soup.find("title")
     title = title_tag.get_text(strip=True) if title_tag else ""
 
-    # Links
-    links = _extract_links(soup, base_url)
+    # Links (contra <base href> si el documento lo declara)
+    links = _extract_links(soup, _document_base(soup, base_url))
 
     # Meta tags
     meta_tags = _get_meta_mapping(soup)
@@ -77,7 +303,45 @@ def parse_html_basic(html: str, base_url: str = "") -> Dict[str, Any]:
     return {
         "title": title,
         "links": links,
+        "link_counts": _count_links(links, base_url),
         "meta_tags": meta_tags,
         "structure": structure,
         "images_count": images_count,
-    }
\ No newline at end of file
+    }
+
+
+def parse_html_soup(html: str, base_url: str = "", limit: Optional[int] = None):
+    """
+    Implementación original: árbol BeautifulSoup + find_all por cada dato.
+    Devuelve scraping_data, o (scraping_data, image_urls) si se pasa `limit`.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    if limit is None:
+        return _parse_soup(soup, base_url)
+    return _parse_soup(soup, base_url), _extract_image_sources(soup, _document_base(soup, base_url), limit)
+
+
+def parse_html_basic(html: Union[str, bytes], base_url: str = "") -> Dict[str, Any]:
+    """
+    Parsea HTML y devuelve un diccionario con la información principal.
+
+    - `html`: contenido HTML como str (o bytes)
+    - `base_url`: URL base para resolver enlaces relativos
+    """
+    extractor = HtmlExtractor(base_url)
+    if html:
+        extractor.feed(html)
+    return extractor.close()[0]
+
+
+def parse_html_with_images(
+    html: Union[str, bytes], base_url: str = "", limit: int = 3
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Igual que parse_html_basic pero además devuelve las `limit` imágenes
+    principales (URLs absolutas, og:image y las más grandes primero), en la misma pasada.
+    """
+    extractor = HtmlExtractor(base_url, image_limit=limit)
+    if html:
+        extractor.feed(html)
+    return extractor.close()
@@ -0,0 +1,145 @@
+"""
+Módulo: link_normalizer.py
+--------------------------
+Normalización y deduplicación de los enlaces de una página.
+
+Resolver cada <a href> con urllib.parse.urljoin cuesta varios microsegundos
+y las páginas con mucha navegación traen miles de anchors, casi siempre
+repetidos (menú, footer, paginación). LinkNormalizer:
+
+- separa la URL base una sola vez (y la reemplaza si aparece <base href>);
+- resuelve los href "simples" relativos a la raíz (/a/b?c) concatenando el
+  origen, sin pasar por urljoin; el resto usa urljoin, con el mismo resultado;
+- guarda cada href ya resuelto en una caché propia de la página;
+- deduplica conservando el orden de aparición;
+- opcionalmente descarta el fragmento (#...) y los parámetros de tracking
+  (utm_*, fbclid, gclid, ...);
+- cuenta los enlaces únicos internos (mismo host que la página), externos
+  y de otros esquemas (mailto:, javascript:, tel:, ...).
+"""
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+# Path absoluto sin segmentos vacíos ni que empiecen con "." (nada que
+# urljoin tenga que resolver o recomponer), con query y fragmento no vacíos.
+_SIMPLE_ROOT_PATH = re.compile(
+    r"/(?:[A-Za-z0-9_~!$&'()*+,=:@%-][A-Za-z0-9._~!$&'()*+,=:@%-]*/?)*"
+    r"(?:\?[^#\s]+)?(?:#\S+)?\Z"
+)
+
+TRACKING_PARAMS = frozenset((
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "igshid", "ref_src",
+))
+TRACKING_PREFIXES = ("utm_",)
+WEB_SCHEMES = ("http", "https")
+
+
+def _is_tracking(param: str) -> bool:
+    key = param.split("=", 1)[0].lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def strip_tracking_params(url: str) -> str:
+    """Quita de la query los parámetros de tracking, sin recodificar el resto."""
+    head, sep, fragment = url.partition("#")
+    path, qsep, query = head.partition("?")
+    if not qsep:
+        return url
+    kept = [p for p in query.split("&") if p and not _is_tracking(p)]
+    url = path + ("?" + "&".join(kept) if kept else "")
+    return url + sep + fragment
+
+
+class LinkNormalizer:
+    """
+    Resuelve, filtra y deduplica los enlaces de un documento.
+
+    Uso:
+        links = LinkNormalizer("https://example.com/dir/", strip_fragments=True)
+        links.set_base("/otra/")        # si el documento trae <base href>
+        links.add("a.html")             # por cada <a href>
+        links.links, links.counts()
+
+    `resolve(href)` sólo resuelve (con caché), para otras URLs del documento
+    como las de <img src>.
+    """
+
+    def __init__(self, base_url: str = "", strip_fragments: bool = False, strip_tracking: bool = False):
+        self.page_host = (urlsplit(base_url).hostname or "") if base_url else ""
+        self.strip_fragments = strip_fragments
+        self.strip_tracking = strip_tracking
+        self.links: List[str] = []
+        self._seen = set()
+        self._resolved: Dict[str, str] = {}  # href -> URL absoluta (ya filtrada)
+        self._base_set = False
+        self.internal = 0
+        self.external = 0
+        self.other = 0
+        self._use_base(base_url)
+
+    def _use_base(self, base_url: str) -> None:
+        self.base_url = base_url
+        parts = urlsplit(base_url) if base_url else None
+        # Atajo sólo para bases http(s) con host: ahí urljoin("/x") == origen + "/x"
+        if parts is not None and parts.scheme in WEB_SCHEMES and parts.netloc:
+            self._origin: Optional[str] = f"{parts.scheme}://{parts.netloc}"
+            self._origin_internal = (parts.hostname or "") == self.page_host
+        else:
+            self._origin = None
+            self._origin_internal = False
+        self._resolved.clear()
+
+    def set_base(self, href: str) -> None:
+        """Aplica <base href> (sólo el primero cuenta, como en los navegadores)."""
+        if self._base_set:
+            return
+        self._base_set = True
+        href = href.strip()
+        if href:
+            self._use_base(urljoin(self.base_url, href))
+
+    def resolve(self, href: str) -> str:
+        """URL absoluta de `href` (con los filtros configurados)."""
+        url = self._resolved.get(href)
+        if url is None:
+            if self._origin is not None and href[:1] == "/" and _SIMPLE_ROOT_PATH.match(href):
+                url = self._origin + href
+            else:
+                url = urljoin(self.base_url, href)
+            if self.strip_fragments and "#" in url:
+                url = url.partition("#")[0]
+            if self.strip_tracking and "?" in url:
+                url = strip_tracking_params(url)
+            self._resolved[href] = url
+        return url
+
+    def add(self, href: str) -> None:
+        """Agrega el enlace de un <a href> si no estaba."""
+        url = self.resolve(href)
+        if url in self._seen:
+            return
+        self._seen.add(url)
+        self.links.append(url)
+        self._classify(href, url)
+
+    def _classify(self, href: str, url: str) -> None:
+        if self._origin is not None and href[:1] == "/" and href[1:2] != "/":
+            # relativo a la raíz: mismo host que la base
+            if self._origin_internal:
+                self.internal += 1
+            else:
+                self.external += 1
+            return
+        parts = urlsplit(url)
+        if parts.scheme not in WEB_SCHEMES:
+            self.other += 1
+        elif (parts.hostname or "") == self.page_host:
+            self.internal += 1
+        else:
+            self.external += 1
+
+    def counts(self) -> Dict[str, int]:
+        return {"internal": self.internal, "external": self.external, "other": self.other}
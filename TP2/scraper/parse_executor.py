@@ -0,0 +1,127 @@
+"""
+Módulo: parse_executor.py
+-------------------------
+Ejecuta el parsing HTML de la Parte A fuera del event loop.
+
+Parsear una página de varios MB lleva decenas de milisegundos de CPU; hecho
+dentro del handler, congela todas las demás requests en vuelo. ParseExecutor
+lo delega según el modo:
+
+- "inline": en el propio loop (comportamiento original);
+- "thread": en un ThreadPoolExecutor (lxml libera el GIL sólo en parte);
+- "process": en un ProcessPoolExecutor;
+- "auto": threads para documentos chicos y procesos para los que superan
+  `process_threshold` bytes, donde la contención del GIL pesa más que el
+  costo de enviar el documento.
+
+Al pool de procesos el documento viaja como bytes (sin decodificar), junto
+con el encoding que informó la respuesta: se decodifica en el worker.
+
+Los documentos que no van a procesos pueden parsearse a medida que llega el
+cuerpo (stream_route + feed): cada pedazo se entrega a un HtmlExtractor en
+el loop ("inline") o en el pool de threads, en orden.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from scraper.html_parser import HtmlExtractor
+
+PARSE_MODES = ("auto", "thread", "process", "inline")
+DEFAULT_PARSE_MODE = os.environ.get("PARSE_EXECUTOR", "auto")
+DEFAULT_PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(os.cpu_count() or 2)))
+DEFAULT_PROCESS_THRESHOLD = int(os.environ.get("PARSE_PROCESS_THRESHOLD_KB", "256")) * 1024
+
+
+def parse_document(
+    body: bytes,
+    encoding: str,
+    base_url: str,
+    image_limit: int = 0,
+    fields: Optional[Iterable[str]] = None,
+    link_options: Optional[Dict[str, bool]] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Decodifica y extrae (scraping_data, image_urls). Es la función que corre en los workers."""
+    extractor = HtmlExtractor(base_url, image_limit=image_limit, fields=fields, **(link_options or {}))
+    html = body.decode(encoding)
+    if html:
+        extractor.feed(html)
+    return extractor.close()
+
+
+class ParseExecutor:
+    """Reparte el parsing entre un pool de threads y uno de procesos según el modo."""
+
+    def __init__(
+        self,
+        mode: str = DEFAULT_PARSE_MODE,
+        workers: int = DEFAULT_PARSE_WORKERS,
+        process_threshold: int = DEFAULT_PROCESS_THRESHOLD,
+    ):
+        if mode not in PARSE_MODES:
+            raise ValueError(f"invalid parse mode: {mode}")
+        self.mode = mode
+        self.process_threshold = process_threshold
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        if mode in ("thread", "auto"):
+            self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        if mode in ("process", "auto"):
+            self._processes = ProcessPoolExecutor(max_workers=workers)
+        self.stats = {"inline": 0, "thread": 0, "process": 0}
+
+    def _route(self, size: int) -> str:
+        if self.mode == "auto":
+            return "process" if size >= self.process_threshold else "thread"
+        return self.mode
+
+    async def parse(
+        self,
+        body: bytes,
+        encoding: str,
+        base_url: str,
+        image_limit: int = 0,
+        fields: Optional[Iterable[str]] = None,
+        link_options: Optional[Dict[str, bool]] = None,
+    ) -> Tuple[Dict[str, Any], List[str]]:
+        route = self._route(len(body))
+        self.stats[route] += 1
+        fields = None if fields is None else tuple(fields)
+        if route == "inline":
+            return parse_document(body, encoding, base_url, image_limit, fields, link_options)
+        executor = self._processes if route == "process" else self._threads
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, parse_document, body, encoding, base_url, image_limit, fields, link_options
+        )
+
+    def stream_route(self, content_length: Optional[int]) -> Optional[str]:
+        """
+        "inline" o "thread" si el documento se parsea a medida que llega;
+        None si hay que juntarlo entero y mandarlo al pool de procesos.
+        Sin Content-Length, el modo auto parsea en threads.
+        """
+        if self.mode == "process":
+            return None
+        if self.mode == "auto":
+            if content_length is not None and content_length >= self.process_threshold:
+                return None
+            return "thread"
+        return self.mode
+
+    def count(self, route: str) -> None:
+        self.stats[route] += 1
+
+    async def feed(self, route: str, extractor: HtmlExtractor, data: bytes) -> None:
+        """Entrega un pedazo del cuerpo al extractor (en el loop o en un thread)."""
+        if route == "inline":
+            extractor.feed(data)
+        else:
+            await asyncio.get_running_loop().run_in_executor(self._threads, extractor.feed, data)
+
+    def close(self):
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
@@ -8,198 +8,521 @@ Mejoras a la interfaz:
 - Modo verbose/debug.
 - Tolerancia a errores comunes durante la inicialización.
 
+Front ends disponibles (--frontend):
+- asyncio (default): un único event loop acepta las conexiones y delega el
+  trabajo al ProcessPoolExecutor con loop.run_in_executor. La cantidad de
+  threads no crece con la concurrencia.
+- threaded: socketserver.ThreadingMixIn, un thread por conexión bloqueado en
+  future.result() mientras el worker procesa.
+
+Ambos front ends responden el chequeo de salud de A ({"health": true}) sin
+pasar por el pool, con la cantidad de tareas en curso y de procesos, que A usa
+para repartir la carga entre varias instancias de B, y con los tiempos de cada
+renderizador del screenshot. Esos tiempos se suman en el proceso principal a
+partir de la entrada "render" de cada respuesta, así incluyen los de todos los
+workers (A los muestra en /stats).
+
 Ejecución:
     python3 server_processing.py -i 127.0.0.1 -p 9001
 
 """
 
 import argparse
+import asyncio
+import functools
 import socketserver
 import struct
-import json
-import base64
-import io
-import time
-from concurrent.futures import ProcessPoolExecutor
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from multiprocessing import cpu_count
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from PIL import Image, ImageDraw, ImageFont
-from bs4 import BeautifulSoup
-
-# Intentar importar Selenium + webdriver-manager como alternativa para screenshots.
-# Si no está disponible, SELENIUM_AVAILABLE será False y se usará un placeholder.
-try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.service import Service as ChromeService
-    from selenium.webdriver.chrome.options import Options as ChromeOptions
-    from webdriver_manager.chrome import ChromeDriverManager
-    SELENIUM_AVAILABLE = True
-except Exception:
-    SELENIUM_AVAILABLE = False
-
-# Helper: crear una sesión requests con reintentos
-def make_retry_session(total_retries=3, backoff_factor=0.5, status_forcelist=(500,502,503,504)):
-    session = requests.Session()
-    retry = Retry(
-        total=total_retries,
-        read=total_retries,
-        connect=total_retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-        allowed_methods=frozenset(['GET', 'POST'])
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
-
-
-# Helper: captura con Selenium (devuelve bytes PNG)
-def capture_screenshot_selenium(url, timeout_s=30):
-    """Devuelve bytes PNG usando Selenium con Chrome en modo headless mediante webdriver-manager."""
-    opts = ChromeOptions()
-    # Opciones para headless y entorno sin sandbox (útiles en Docker)
-    # Añadimos opciones que suelen funcionar en distintos entornos.
-    try:
-        opts.add_argument("--headless=new")
-    except Exception:
-        opts.add_argument("--headless")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--window-size=1280,1024")
-    # Crear servicio usando webdriver-manager para descargar el driver automáticamente
-    service = ChromeService(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=opts)
-    try:
-        driver.set_page_load_timeout(timeout_s)
-        driver.get(url)
-        png = driver.get_screenshot_as_png()
-        return png
-    finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+
+from common.protocol import (
+    BIN_MAGIC,
+    FRAME_V2_HEADER,
+    LEN_STRUCT,
+    MAX_MESSAGE_SIZE,
+    MUX_HEADER,
+    MUX_MAGIC,
+    SCREENSHOT_RENDERERS,
+    decode_frame_v2,
+    health_reply,
+    is_health_request,
+    negotiate,
+    pack_frame_v2,
+    pack_mux_frame,
+    read_frame_v2,
+    read_mux_frame,
+    result_to_events,
+)
+from common.serialization import JSON_CODEC, get_codec
+
+from processor.browser_pool import (
+    DEFAULT_MAX_MEMORY_MB,
+    DEFAULT_MAX_PAGES,
+    configure_browser_pool,
+    get_browser_pool,
+)
+from processor.pipeline import (
+    SELENIUM_AVAILABLE,
+    IMAGES_DEADLINE,
+    MAX_IMAGES,
+    build_result,
+    configure_fetch,
+    fetch_images,
+    fetch_page,
+    get_http_session,
+    get_image_session,
+    make_thumbnails,
+    needs_fetch,
+    needs_page,
+    page_base_url,
+    page_from_forwarded,
+    render_page,
+    requested_operations,
+    resolve_image_url,
+    run_pipeline,
+    screenshot_renderer,
+)
+from processor.renderers import (
+    DEFAULT_FALLBACK,
+    DEFAULT_RENDERER,
+    RenderTimings,
+    configure_renderers,
+    is_placeholder,
+    placeholder_b64,
+)
+from processor.thumbnails import FORMATS as THUMB_FORMATS, ThumbnailProfile, configure_thumbnails
+
+TASK_TIMEOUT = 60  # segundos máximos por tarea en el pool
+IO_THREADS = 32    # threads para descargas y Selenium en el front end asyncio
 
 
 def process_task(payload):
     """Tarea de procesamiento que se ejecuta en un worker del pool.
 
-    Realiza:
-    - Descarga de la página (requests con reintentos) para medir rendimiento.
-    - Captura de screenshot con Selenium si está disponible, si no, genera placeholder con Pillow.
-    - Descarga de hasta 3 imágenes principales y generación de thumbnails.
+    Versión secuencial de las etapas de processor/pipeline.py (la usa el front
+    end threaded, que delega la request completa a un worker):
+    - Descarga de la página (sesión requests del proceso, con reintentos y
+      keep-alive) para medir rendimiento, salvo que el Servidor A la haya
+      reenviado en payload["page"].
+    - Screenshot con el renderizador de payload["renderer"]: Selenium si está
+      disponible y, si no, el de respaldo (wireframe o placeholder precodificado).
+      Si se pide "performance", la misma carga del navegador mide Navigation/Resource Timing.
+    - Descarga en paralelo de las imágenes principales (con plazo total) y
+      generación de sus thumbnails en un lote.
     - Retorna un dict serializable con estado y datos de procesamiento.
+    Sólo se ejecutan las partes pedidas en payload["operations"] (todas por defecto).
     """
     url = payload.get("url")
-    result = {"screenshot": None, "performance": {}, "thumbnails": []}
+    operations = requested_operations(payload)
     try:
-        session = make_retry_session(total_retries=3, backoff_factor=0.5)
-        start = time.time()
-        resp = session.get(url, timeout=30, stream=True)
-        content = resp.content
-        load_time_ms = int((time.time() - start) * 1000)
-        total_size_kb = max(1, len(content) // 1024)
-        num_requests = 1
-
-        # Intentar screenshot con Selenium si está disponible
-        screenshot_bytes = None
-        if SELENIUM_AVAILABLE:
-            try:
-                screenshot_bytes = capture_screenshot_selenium(url, timeout_s=30)
-            except Exception:
-                screenshot_bytes = None
-
-        # Si no hay Selenium o falló, usar marcador de posición con Pillow
-        if screenshot_bytes is None:
-            img = Image.new("RGB", (1024, 768), color=(255, 255, 255))
-            d = ImageDraw.Draw(img)
-            try:
-                font = ImageFont.load_default()
-            except Exception:
-                font = None
-            d.text((10, 10), f"Captura (placeholder) para {url}", fill=(0, 0, 0), font=font)
-            buf = io.BytesIO()
-            img.save(buf, format="PNG")
-            screenshot_bytes = buf.getvalue()
-
-        result["screenshot"] = base64.b64encode(screenshot_bytes).decode("ascii")
-
-        # Parsear HTML para encontrar etiquetas img
-        soup = BeautifulSoup(content, "lxml")
-        imgs = []
-        for tag in soup.find_all("img"):
-            src = tag.get("src")
-            if src:
-                imgs.append(src)
-            if len(imgs) >= 3:
-                break
+        renderer = screenshot_renderer(payload)
+        session = get_http_session()
+        page = None
+        if needs_page(operations):
+            if needs_fetch(payload):
+                page = fetch_page(url, session, not payload.get("fresh_performance"))
+            else:
+                page = page_from_forwarded(payload["page"])
+        screenshot_bytes, browser_metrics, render = render_page(url, payload, operations, renderer)
 
         thumbnails = []
-        from urllib.parse import urljoin
-        for src in imgs:
-            try:
-                if src.startswith("//"):
-                    src = "http:" + src
-                elif src.startswith("/"):
-                    src = urljoin(url, src)
-                # Descargar imagen con session que tiene reintentos
-                r = session.get(src, timeout=10)
-                r.raise_for_status()
-                thumb_img = Image.open(io.BytesIO(r.content)).convert("RGB")
-                thumb_img.thumbnail((128, 128))
-                b = io.BytesIO()
-                thumb_img.save(b, format="PNG", optimize=True)
-                thumbnails.append(base64.b64encode(b.getvalue()).decode("ascii"))
-                num_requests += 1
-            except Exception:
-                # ignorar fallo en una sola imagen y continuar con las demás
-                continue
-
-        result["performance"] = {
-            "load_time_ms": load_time_ms,
-            "total_size_kb": total_size_kb,
-            "num_requests": num_requests,
-        }
-        result["thumbnails"] = thumbnails
-        return {"status": "success", "processing_data": result}
+        if "thumbnails" in operations:
+            base_url = page_base_url(payload)
+            srcs = [resolve_image_url(base_url, src) for src in page["image_sources"]]
+            images = fetch_images(srcs, get_image_session())
+            thumbnails = [t for t in make_thumbnails(images) if t is not None]
+        return build_result(screenshot_bytes, page, thumbnails, operations, browser_metrics, render)
     except Exception as e:
         return {"status": "failed", "error": str(e)}
 
 
+def init_worker(thumbnail_profile, fetch_cfg, browser_cfg=None, render_cfg=None):
+    """Initializer de los procesos del pool: thumbnails, sesión HTTP, renderizadores y, si corresponde, navegadores."""
+    configure_thumbnails(thumbnail_profile)
+    configure_fetch(*fetch_cfg)
+    if render_cfg is not None:
+        configure_renderers(*render_cfg)
+    if browser_cfg is not None:
+        configure_browser_pool(*browser_cfg)
+
+
+def encode_json_reply(res):
+    """
+    Respuesta (o evento) en JSON. Si el screenshot es el placeholder se usa su
+    base64 ya calculado (renderers.placeholder_b64) en lugar de codificarlo de nuevo.
+    """
+    data = res.get("processing_data")
+    if isinstance(data, dict) and is_placeholder(data.get("screenshot")):
+        res = {**res, "processing_data": {**data, "screenshot": placeholder_b64()}}
+    elif res.get("event") == "screenshot" and is_placeholder(res.get("data")):
+        res = {**res, "data": placeholder_b64()}
+    return JSON_CODEC.encode(res)
+
+
+def pack_reply(request_id, res, codec=None):
+    """Frame de respuesta multiplexado: JSON (versión 1) o binario con el codec negociado (versión 2)."""
+    if codec is None:
+        return pack_mux_frame(request_id, encode_json_reply(res))
+    return pack_frame_v2(request_id, res, codec)
+
+
+def handshake_reply(body):
+    """Procesa el saludo del protocolo binario; devuelve (respuesta, codec o None)."""
+    try:
+        answer = negotiate(JSON_CODEC.decode(body))
+    except ValueError as e:
+        answer = {"error": str(e)}
+    codec = None if "error" in answer else get_codec(answer["codec"])
+    return answer, codec
+
+
 class LengthPrefixedTCPHandler(socketserver.BaseRequestHandler):
-    """Handler para mensajes TCP con prefijo de longitud (4 bytes big-endian) seguido de JSON UTF-8."""
+    """Handler para mensajes TCP con prefijo de longitud (4 bytes big-endian) seguido de JSON UTF-8.
+
+    Si la conexión empieza con MUX_MAGIC se atiende en modo multiplexado
+    (ver common/protocol.py): varias requests por conexión, cada una con su
+    request_id, respondidas a medida que terminan. Con BIN_MAGIC se negocia
+    además el protocolo binario (codec compacto + blobs crudos).
+    """
+    def _recv_exactly(self, n):
+        data = b""
+        while len(data) < n:
+            packet = self.request.recv(n - len(data))
+            if not packet:
+                break
+            data += packet
+        return data
+
     def handle(self):
         try:
-            raw_len = self.request.recv(4)
+            raw_len = self._recv_exactly(4)
             if len(raw_len) < 4:
                 return
+            if raw_len == MUX_MAGIC:
+                self.handle_multiplexed()
+                return
+            if raw_len == BIN_MAGIC:
+                codec = self._handshake()
+                if codec is not None:
+                    self.handle_multiplexed(codec)
+                return
             msg_len = struct.unpack(">I", raw_len)[0]
-            data = b""
-            while len(data) < msg_len:
-                packet = self.request.recv(msg_len - len(data))
-                if not packet:
-                    break
-                data += packet
-            payload = json.loads(data.decode("utf-8"))
-            # Enviar la tarea al executor (pool de procesos)
-            future = self.server.executor.submit(process_task, payload)
-            res = future.result(timeout=60)
-            out = json.dumps(res).encode("utf-8")
+            if msg_len > MAX_MESSAGE_SIZE:
+                raise ValueError("payload too large")
+            data = self._recv_exactly(msg_len)
+            if len(data) < msg_len:
+                return
+            payload = JSON_CODEC.decode(data)
+            if is_health_request(payload):
+                res = self.server.health()
+            else:
+                # Enviar la tarea al executor (pool de procesos)
+                future = self.server.submit(payload)
+                res = future.result(timeout=TASK_TIMEOUT)
+            out = encode_json_reply(res)
             self.request.sendall(struct.pack(">I", len(out)) + out)
         except Exception as e:
             try:
-                err = json.dumps({"status": "failed", "error": str(e)}).encode("utf-8")
+                err = JSON_CODEC.encode({"status": "failed", "error": str(e)})
                 self.request.sendall(struct.pack(">I", len(err)) + err)
             except Exception:
                 pass
 
+    def _handshake(self):
+        header = self._recv_exactly(MUX_HEADER.size)
+        if len(header) < MUX_HEADER.size:
+            return None
+        _, msg_len = MUX_HEADER.unpack(header)
+        if msg_len > MAX_MESSAGE_SIZE:
+            return None
+        body = self._recv_exactly(msg_len)
+        if len(body) < msg_len:
+            return None
+        answer, codec = handshake_reply(body)
+        self.request.sendall(pack_mux_frame(0, JSON_CODEC.encode(answer)))
+        return codec
+
+    def _recv_frame(self, codec):
+        """
+        Lee un frame; devuelve (request_id, payload o excepción) o None si el
+        peer cerró o el frame supera MAX_MESSAGE_SIZE (como read_frame_v2).
+        """
+        if codec is None:
+            header = self._recv_exactly(MUX_HEADER.size)
+            if len(header) < MUX_HEADER.size:
+                return None
+            request_id, msg_len = MUX_HEADER.unpack(header)
+            if msg_len > MAX_MESSAGE_SIZE:
+                return None
+            data = self._recv_exactly(msg_len)
+            if len(data) < msg_len:
+                return None
+            try:
+                return request_id, JSON_CODEC.decode(data)
+            except ValueError as e:
+                return request_id, e
+
+        header = self._recv_exactly(FRAME_V2_HEADER.size)
+        if len(header) < FRAME_V2_HEADER.size:
+            return None
+        request_id, msg_len, n_blobs = FRAME_V2_HEADER.unpack(header)
+        total = msg_len
+        if total > MAX_MESSAGE_SIZE:
+            return None
+        data = self._recv_exactly(msg_len)
+        if len(data) < msg_len:
+            return None
+        blobs = []
+        for _ in range(n_blobs):
+            raw = self._recv_exactly(LEN_STRUCT.size)
+            if len(raw) < LEN_STRUCT.size:
+                return None
+            (blob_len,) = LEN_STRUCT.unpack(raw)
+            total += blob_len
+            if total > MAX_MESSAGE_SIZE:
+                return None
+            blob = self._recv_exactly(blob_len)
+            if len(blob) < blob_len:
+                return None
+            blobs.append(blob)
+        try:
+            return request_id, decode_frame_v2(data, blobs, codec)
+        except Exception as e:
+            return request_id, e
+
+    def handle_multiplexed(self, codec=None):
+        """Lee frames hasta EOF; cada resultado se envía apenas su future termina."""
+        send_lock = threading.Lock()
+        pending = set()
+
+        def reply(request_id, res):
+            out = pack_reply(request_id, res, codec)
+            with send_lock:
+                try:
+                    self.request.sendall(out)
+                except OSError:
+                    pass
+
+        def on_done(request_id, stream, future):
+            with send_lock:
+                pending.discard(future)
+            try:
+                res = future.result()
+            except Exception as e:
+                res = {"status": "failed", "error": str(e)}
+            # El worker produce el resultado entero: en modo streaming se envía como eventos
+            for message in (result_to_events(res) if stream else [res]):
+                reply(request_id, message)
+
+        try:
+            while True:
+                frame = self._recv_frame(codec)
+                if frame is None:
+                    break
+                request_id, payload = frame
+                if isinstance(payload, Exception):
+                    reply(request_id, {"status": "failed", "error": str(payload)})
+                    continue
+                if is_health_request(payload):
+                    reply(request_id, self.server.health())
+                    continue
+                future = self.server.submit(payload)
+                with send_lock:
+                    pending.add(future)
+                stream = bool(payload.get("stream"))
+                future.add_done_callback(lambda f, rid=request_id, st=stream: on_done(rid, st, f))
+        finally:
+            # No cerrar el socket con respuestas pendientes de envío
+            with send_lock:
+                inflight = list(pending)
+            wait(inflight, timeout=TASK_TIMEOUT)
+
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 1024
+    task_fn = staticmethod(process_task)
+    capacity = None  # procesos del pool (lo informa el chequeo de salud)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self.render_timings = RenderTimings()
+
+    def submit(self, payload):
+        """Envía la tarea al pool llevando la cuenta de las que están en curso."""
+        with self._in_flight_lock:
+            self.in_flight += 1
+        future = self.executor.submit(self.task_fn, payload)
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future):
+        with self._in_flight_lock:
+            self.in_flight -= 1
+        if not future.cancelled() and future.exception() is None and isinstance(future.result(), dict):
+            self.render_timings.record(future.result().get("render"))
+
+    def health(self):
+        return health_reply(self.in_flight, self.capacity, self.render_timings.as_dict())
+
+
+class AsyncProcessingServer:
+    """
+    Front end asyncio para la Parte B.
+
+    Acepta el mismo protocolo que LengthPrefixedTCPHandler (simple y
+    multiplexado) pero sin un thread por conexión: el trabajo se entrega a
+    los executors con loop.run_in_executor y la coroutine queda suspendida
+    (sin ocupar un thread) hasta que termina.
+
+    Por defecto cada request recorre run_pipeline: las etapas de red van a
+    `io_executor` (threads) y sólo las de CPU a `executor` (procesos). Si se
+    indica `task_fn`, la request completa se ejecuta como una única tarea en
+    `executor` (útil para benchmarks y tests).
+    """
+
+    def __init__(self, host, port, executor, task_fn=None, io_executor=None, task_timeout=TASK_TIMEOUT, capacity=None):
+        self.host = host
+        self.port = port
+        self.executor = executor
+        self.task_fn = task_fn
+        self.io_executor = io_executor
+        self.task_timeout = task_timeout
+        self.capacity = capacity  # procesos del pool (lo informa el chequeo de salud)
+        self.in_flight = 0
+        self.render_timings = RenderTimings()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port, backlog=1024)
+        return self._server
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else []
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def health(self):
+        return health_reply(self.in_flight, self.capacity, self.render_timings.as_dict())
+
+    async def _run_task(self, payload, emit=None):
+        if is_health_request(payload):
+            return self.health()
+        loop = asyncio.get_running_loop()
+        if self.task_fn is not None:
+            work = loop.run_in_executor(self.executor, self.task_fn, payload)
+        else:
+            work = run_pipeline(payload, self.executor, self.io_executor, emit=emit)
+        self.in_flight += 1
+        try:
+            res = await asyncio.wait_for(work, timeout=self.task_timeout)
+            if isinstance(res, dict):
+                self.render_timings.record(res.get("render"))
+            return res
+        except asyncio.TimeoutError:
+            return {"status": "failed", "error": "processing timeout"}
+        except Exception as e:
+            return {"status": "failed", "error": str(e)}
+        finally:
+            self.in_flight -= 1
+
+    async def _handle_client(self, reader, writer):
+        try:
+            raw_len = await reader.readexactly(4)
+            if raw_len == MUX_MAGIC:
+                await self._handle_multiplexed(reader, writer)
+                return
+            if raw_len == BIN_MAGIC:
+                _, body = await read_mux_frame(reader)
+                answer, codec = handshake_reply(body)
+                writer.write(pack_mux_frame(0, JSON_CODEC.encode(answer)))
+                await writer.drain()
+                if codec is not None:
+                    await self._handle_multiplexed(reader, writer, codec)
+                return
+            (msg_len,) = LEN_STRUCT.unpack(raw_len)
+            if msg_len > MAX_MESSAGE_SIZE:
+                res = {"status": "failed", "error": "payload too large"}
+            else:
+                data = await reader.readexactly(msg_len)
+                try:
+                    res = await self._run_task(JSON_CODEC.decode(data))
+                except ValueError as e:
+                    res = {"status": "failed", "error": str(e)}
+            out = encode_json_reply(res)
+            writer.write(LEN_STRUCT.pack(len(out)) + out)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _handle_multiplexed(self, reader, writer, codec=None):
+        """Cada frame se procesa en su propia tarea; la respuesta sale apenas termina."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(request_id, message):
+            out = pack_reply(request_id, message, codec)
+            async with write_lock:
+                writer.write(out)
+                await writer.drain()
+
+        async def serve(request_id, decode):
+            try:
+                payload = decode()
+            except Exception as e:
+                await send(request_id, {"status": "failed", "error": str(e)})
+                return
+            if not payload.get("stream") or is_health_request(payload):
+                await send(request_id, await self._run_task(payload))
+                return
+
+            # Modo streaming: un frame por parte terminada y un "done" final
+            sent = set()
+
+            async def emit(part, data):
+                sent.add(part)
+                await send(request_id, {"event": part, "data": data})
+
+            res = await self._run_task(payload, emit=emit)
+            for message in result_to_events(res):
+                if message["event"] not in sent:
+                    await send(request_id, message)
+
+        try:
+            while True:
+                if codec is None:
+                    request_id, data = await read_mux_frame(reader)
+                    decode = functools.partial(JSON_CODEC.decode, data)
+                else:
+                    request_id, data, blobs = await read_frame_v2(reader)
+                    decode = functools.partial(decode_frame_v2, data, blobs, codec)
+                task = asyncio.ensure_future(serve(request_id, decode))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def main():
@@ -207,13 +530,80 @@ def main():
     parser.add_argument("-i", "--ip", required=True, help="Dirección de escucha")
     parser.add_argument("-p", "--port", required=True, type=int, help="Puerto de escucha")
     parser.add_argument("-n", "--processes", type=int, default=cpu_count(), help="Número de procesos en el pool (default: CPU count)")
+    parser.add_argument("--frontend", choices=("asyncio", "threaded"), default="asyncio",
+                        help="Front end de red: asyncio (default) o threaded (un thread por conexión)")
+    parser.add_argument("--browsers", type=int, default=1,
+                        help="Navegadores headless reutilizables por proceso (default: 1)")
+    parser.add_argument("--browser-max-pages", type=int, default=DEFAULT_MAX_PAGES,
+                        help=f"Páginas antes de reciclar un navegador (default: {DEFAULT_MAX_PAGES})")
+    parser.add_argument("--browser-max-memory-mb", type=float, default=DEFAULT_MAX_MEMORY_MB,
+                        help=f"Memoria JS (MB) a partir de la cual se recicla un navegador (default: {DEFAULT_MAX_MEMORY_MB:g})")
+    parser.add_argument("--max-images", type=int, default=MAX_IMAGES,
+                        help=f"Imágenes principales por página para thumbnails (default: {MAX_IMAGES})")
+    parser.add_argument("--images-deadline", type=float, default=IMAGES_DEADLINE,
+                        help=f"Segundos para descargar todas las imágenes de una página (default: {IMAGES_DEADLINE})")
+    thumbs = ThumbnailProfile.from_env()
+    parser.add_argument("--thumb-format", choices=THUMB_FORMATS, default=thumbs.format,
+                        help=f"Formato de los thumbnails (default: {thumbs.format}, env THUMB_FORMAT)")
+    parser.add_argument("--thumb-quality", type=int, default=thumbs.quality,
+                        help=f"Calidad WebP/JPEG de los thumbnails, 1-95 (default: {thumbs.quality}, env THUMB_QUALITY)")
+    parser.add_argument("--thumb-size", type=int, default=thumbs.size,
+                        help=f"Lado máximo de los thumbnails en píxeles (default: {thumbs.size}, env THUMB_SIZE)")
+    parser.add_argument("--thumb-max-pixels", type=int, default=thumbs.max_pixels,
+                        help=f"Píxeles máximos a decodificar por imagen (default: {thumbs.max_pixels}, env THUMB_MAX_PIXELS)")
+    parser.add_argument("--thumb-cache-mb", type=int, default=thumbs.cache_mb,
+                        help=f"Memoria por proceso para la caché de thumbnails por contenido; 0 la deshabilita (default: {thumbs.cache_mb}, env THUMB_CACHE_MB)")
+    parser.add_argument("--thumb-cache-dir", default=thumbs.cache_dir,
+                        help="Directorio de la caché de thumbnails, compartido por los procesos del pool (env THUMB_CACHE_DIR)")
+    parser.add_argument("--renderer", choices=SCREENSHOT_RENDERERS, default=DEFAULT_RENDERER,
+                        help=f"Renderizador del screenshot si la request no elige uno (default: {DEFAULT_RENDERER})")
+    parser.add_argument("--fallback-renderer", choices=("wireframe", "placeholder"), default=DEFAULT_FALLBACK,
+                        help=f"Renderizador sin navegador cuando no hay Selenium o falla (default: {DEFAULT_FALLBACK})")
     args = parser.parse_args()
+    try:
+        thumbnail_profile = ThumbnailProfile(
+            size=args.thumb_size, format=args.thumb_format, quality=args.thumb_quality, max_pixels=args.thumb_max_pixels,
+            cache_mb=args.thumb_cache_mb, cache_dir=args.thumb_cache_dir,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    browser_cfg = (args.browsers, args.browser_max_pages, args.browser_max_memory_mb)
+    # Con el front end threaded los screenshots se toman en los workers: cada
+    # proceso del pool tiene sus propios navegadores. Con asyncio se toman en
+    # el pool de threads de I/O, así que el pool de navegadores vive en este proceso.
+    fetch_cfg = (args.max_images, args.images_deadline)
+    render_cfg = (args.renderer, args.fallback_renderer)
+    if args.frontend == "threaded":
+        initargs = (thumbnail_profile, fetch_cfg, browser_cfg, render_cfg)
+    else:
+        initargs = (thumbnail_profile, fetch_cfg, None, render_cfg)
+        # El renderizador se elige en este proceso (el wireframe se dibuja en el pool)
+        configure_renderers(*render_cfg)
+        # Las descargas corren en los threads de I/O de este proceso: una sesión para todos
+        configure_fetch(*fetch_cfg, pool_size=IO_THREADS)
+        configure_browser_pool(*browser_cfg)
+    executor_kwargs = {"initializer": init_worker, "initargs": initargs}
+
+    with ProcessPoolExecutor(max_workers=args.processes, **executor_kwargs) as executor:
+        print(f"Servidor de procesamiento ({args.frontend}) escuchando en {args.ip}:{args.port} con {args.processes} procesos")
+        if args.frontend == "asyncio":
+            with ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io") as io_executor:
+                if SELENIUM_AVAILABLE:
+                    # Arrancar los navegadores en segundo plano: la primera captura ya los encuentra listos
+                    io_executor.submit(get_browser_pool().warm)
+                server = AsyncProcessingServer(args.ip, args.port, executor, io_executor=io_executor,
+                                               capacity=args.processes)
+                try:
+                    asyncio.run(server.serve_forever())
+                except KeyboardInterrupt:
+                    pass
+            return
 
-    with ProcessPoolExecutor(max_workers=args.processes) as executor:
         server = ThreadedTCPServer((args.ip, args.port), LengthPrefixedTCPHandler)
         server.executor = executor
+        server.capacity = args.processes
         try:
-            print(f"Servidor de procesamiento escuchando en {args.ip}:{args.port} con {args.processes} procesos")
             server.serve_forever()
         except KeyboardInterrupt:
             server.shutdown()
@@ -221,4 +611,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
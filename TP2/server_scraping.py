@@ -10,105 +10,119 @@ Este archivo expone un servidor HTTP (aiohttp) que:
 - realiza el scraping asíncrono de la página (usando una ClientSession compartida)
 - extrae datos básicos (título, enlaces, meta, headers, count imágenes)
 - envía los datos al servidor de procesamiento (Parte B) mediante un protocolo
-  length-prefixed JSON (función send_request_and_receive_json)
+  length-prefixed JSON, reutilizando conexiones multiplexadas (ProcessorPool)
 - espera la respuesta de B de forma asíncrona y devuelve un JSON consolidado al cliente
+- /scrape/stream: misma operación pero enviando cada parte como evento (NDJSON o SSE)
+  apenas está lista
+- /scrape/batch (POST): lista de URLs (JSON o NDJSON) procesadas con concurrencia
+  acotada (global y por host); cada resultado se envía apenas termina
+- cachea scraping_data y processing_data por URL normalizada (TTL distintos, LRU,
+  SQLite opcional) y colapsa requests concurrentes por la misma URL; /stats
+  expone los contadores
+- parsea el HTML fuera del event loop (pool de threads o de procesos) y mide el
+  lag del loop (también en /stats)
+- con ?blobs=id|url devuelve el screenshot y los thumbnails como id de
+  contenido o ruta /blobs/{id} en lugar de base64; /blobs/{id} los sirve
+
+Todo el trabajo (descarga, parsing, caché, planificador, consultas a B) lo hace
+scraper.engine.ScrapeEngine; los handlers sólo traducen HTTP <-> motor.
 """
 import argparse            # parsing de línea de comandos
-import asyncio             # primitives de concurrencia (event loop, Semaphore, etc.)
 import json                # serializar / deserializar payloads JSON
-import struct
-from datetime import datetime
 import os
-from typing import Dict, Any, Optional
-from urllib.parse import urljoin, urlparse
-import socket
-import ssl
-import asyncio
-import math
-
-import aiohttp             # cliente HTTP asíncrono y utilidades
+import functools
+from typing import Dict, Any, Optional, AsyncIterator, List, Tuple
+
 from aiohttp import web    # framework web asíncrono (handlers, respuestas)
-from bs4 import BeautifulSoup
 
-# funciones locales modulares: parsing HTML y protocolo de comunicación con B
-from scraper.html_parser import parse_html_basic
-from common.protocol import send_request_and_receive_json
+# funciones locales modulares: motor de scraping, parsing HTML y protocolo con B
+from scraper.async_http import RESOLVERS, ConnectorProfile
+from scraper.engine import (
+    BLOB_MODES,
+    DEFAULT_BLOB_MODE,
+    DEFAULT_FORWARD_MODE,
+    DEFAULT_TIMEOUT,
+    DEFAULT_WORKERS,
+    FORWARD_MODES,
+    ScrapeEngine,
+    http_error_message,
+    make_options,
+)
+from scraper.host_scheduler import HostScheduler, RobotsDelays
+from scraper.parse_executor import DEFAULT_PARSE_MODE, DEFAULT_PARSE_WORKERS, DEFAULT_PROCESS_THRESHOLD, PARSE_MODES
+from common.protocol import DEFAULT_POOL_SIZE
+from common.resilience import ResilienceProfile, parse_replica
+from common.serialization import available_codecs, json_default
+from common.loop_monitor import LoopLagMonitor
+from common.blob_store import BlobStore, sniff_content_type
+from common.cache import ResponseCache, SqliteBackend
+
+# json.dumps para las respuestas HTTP: los bytes recibidos de B (PNG) se devuelven en base64
+json_dumps = functools.partial(json.dumps, default=json_default)
 
 # valores por defecto configurables
-DEFAULT_WORKERS = 4
-DEFAULT_TIMEOUT = 30  # segundos. Limita cuánto esperamos por una página
-
 PROCESSOR_HOST = os.environ.get("PROC_HOST", "127.0.0.1")
 PROCESSOR_PORT = int(os.environ.get("PROC_PORT", "9001"))
+PROCESSOR_POOL_SIZE = DEFAULT_POOL_SIZE  # conexiones persistentes hacia B (env PROC_POOL_SIZE)
 
-# Nuevo: valores por defecto del conector y configuración de reintentos
-CONNECTOR_LIMIT = int(os.environ.get("AIO_LIMIT", "100"))
-CONNECTOR_LIMIT_PER_HOST = int(os.environ.get("AIO_LIMIT_PER_HOST", "10"))
-ASK_RETRIES = int(os.environ.get("ASK_RETRIES", "3"))
-ASK_BACKOFF_BASE = float(os.environ.get("ASK_BACKOFF_BASE", "0.5"))
-
-
-async def fetch_html(session, url):
-    timeout = aiohttp.ClientTimeout(total=30)
-    async with session.get(url, timeout=timeout) as resp:
-        text = await resp.text(errors="ignore")
-        return text
-
-
-def extract_data(html, base_url):
-    soup = BeautifulSoup(html, "lxml")
-    title_tag = soup.find("title")
-    title = title_tag.get_text(strip=True) if title_tag else ""
-    links = []
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        links.append(urljoin(base_url, href))
-    meta = {}
-    for m in soup.find_all("meta"):
-        if m.get("name"):
-            meta[m.get("name")] = m.get("content", "")
-        if m.get("property"):
-            meta[m.get("property")] = m.get("content", "")
-    headers = {}
-    for i in range(1, 7):
-        headers[f"h{i}"] = len(soup.find_all(f"h{i}"))
-    images_count = len(soup.find_all("img"))
-    return {
-        "title": title,
-        "links": links,
-        "meta_tags": meta,
-        "structure": headers,
-        "images_count": images_count,
-    }
-
-
-async def ask_processor(host, port, payload):
-    # Bucle de reintentos con backoff exponencial y manejo amplio de excepciones
-    last_exc = None
-    data = json.dumps(payload).encode("utf-8")
-    for attempt in range(1, ASK_RETRIES + 1):
-        try:
-            reader, writer = await asyncio.open_connection(host, port)
-            writer.write(struct.pack(">I", len(data)) + data)
-            await writer.drain()
-            raw_len = await reader.readexactly(4)
-            msg_len = struct.unpack(">I", raw_len)[0]
-            data_in = await reader.readexactly(msg_len)
-            writer.close()
-            try:
-                await writer.wait_closed()
-            except Exception:
-                pass
-            return json.loads(data_in.decode("utf-8"))
-        except (asyncio.IncompleteReadError, ConnectionRefusedError, OSError, asyncio.TimeoutError,
-                socket.gaierror, ssl.SSLError, asyncio.CancelledError) as e:
-            last_exc = e
-            # backoff (no dormir si fue cancelado)
-            if isinstance(e, asyncio.CancelledError):
-                raise
-            await asyncio.sleep(ASK_BACKOFF_BASE * (2 ** (attempt - 1)))
-            continue
-    raise last_exc
+# El connector HTTP se configura con ConnectorProfile: env AIO_LIMIT, AIO_LIMIT_PER_HOST,
+# AIO_KEEPALIVE, AIO_DNS_TTL, AIO_HAPPY_EYEBALLS, AIO_RESOLVER
+
+# Planificador por host: requests simultáneas e intervalo mínimo (segundos) entre
+# requests al mismo host, y si se respeta el Crawl-delay de robots.txt
+DEFAULT_PER_HOST = int(os.environ.get("SCRAPE_PER_HOST", "2"))
+DEFAULT_HOST_DELAY = float(os.environ.get("SCRAPE_HOST_DELAY", "0"))
+ROBOTS_CRAWL_DELAY = os.environ.get("ROBOTS_CRAWL_DELAY", "").lower() in ("1", "true", "yes")
+ROBOTS_USER_AGENT = os.environ.get("ROBOTS_USER_AGENT", "*")
+# /scrape/batch: URLs en vuelo por batch
+DEFAULT_BATCH_WINDOW = int(os.environ.get("BATCH_WINDOW", "64"))
+BATCH_MAX_BODY = 64 * 1024 * 1024  # tope para batches enviados como un único JSON
+
+# Caché de resultados: TTL (segundos) por parte de la respuesta; 0 la deshabilita
+SCRAPING_TTL = int(os.environ.get("SCRAPING_TTL", "300"))
+PROCESSING_TTL = int(os.environ.get("PROCESSING_TTL", "3600"))
+CACHE_ENTRIES = int(os.environ.get("CACHE_ENTRIES", "1024"))
+CACHE_MB = int(os.environ.get("CACHE_MB", "256"))
+CACHE_DB = os.environ.get("CACHE_DB") or None
+# ETag/Last-Modified de cada página (con su scraping_data) para revalidar con GET condicional
+VALIDATORS_TTL = int(os.environ.get("VALIDATORS_TTL", str(7 * 24 * 3600)))
+
+# Almacén de blobs servidos en /blobs/{id}: memoria (MB) y directorio opcional
+BLOB_MB = int(os.environ.get("BLOB_MB", "128"))
+BLOB_DIR = os.environ.get("BLOB_DIR") or None
+
+# Normalización de enlaces: descartar fragmentos (#...) y parámetros de tracking (utm_*, fbclid, ...)
+STRIP_FRAGMENTS = os.environ.get("LINKS_STRIP_FRAGMENTS", "").lower() in ("1", "true", "yes")
+STRIP_TRACKING = os.environ.get("LINKS_STRIP_TRACKING", "").lower() in ("1", "true", "yes")
+
+
+def json_error(exc_class, message: str) -> web.HTTPException:
+    """Excepción HTTP de aiohttp con cuerpo JSON {"error": message}."""
+    return exc_class(text=json.dumps({"error": message}), content_type="application/json")
+
+
+def processing_options(params, app: web.Application) -> Dict[str, Any]:
+    """
+    Valida y devuelve las opciones de la query (?forward=, ?fresh_performance=,
+    ?fields= o ?include=, ?budget= en segundos, ?blobs=inline|id|url,
+    ?renderer=auto|browser|wireframe|placeholder).
+    """
+    try:
+        budget = params.get("budget")
+        return make_options(
+            forward_mode=params.get("forward", app["forward_mode"]),
+            # ?fresh_performance=1 obliga a B a descargar la página de nuevo para medirla
+            fresh_performance=params.get("fresh_performance", "").lower() in ("1", "true", "yes"),
+            fields=params.get("fields", params.get("include")),
+            # ?budget=5: el cliente no espera más de 5 s (el resto se descuenta para B)
+            budget=float(budget) if budget is not None else None,
+            # ?blobs=url: screenshot y thumbnails como rutas /blobs/{id} en lugar de base64
+            blobs=params.get("blobs", app["blob_mode"]),
+            # ?renderer=wireframe: screenshot sin navegador (esquema de la página)
+            renderer=params.get("renderer") or None,
+        )
+    except ValueError as e:
+        raise json_error(web.HTTPBadRequest, str(e))
 
 
 # Handler HTTP para el endpoint /scrape
@@ -116,68 +130,197 @@ async def handle_scrape(request: web.Request) -> web.Response:
     """
     Handler que:
     - valida parámetros de la request (url)
-    - limita concurrencia con un Semaphore almacenado en app["sem"]
-    - invoca scrape_worker para obtener scraping_data
-    - comunica el resultado a la Parte B mediante send_request_and_receive_json
-    - consolida la respuesta (scraping + processing) y la devuelve como JSON
+    - delega en app["engine"] el scraping, la consulta a la Parte B, la caché y
+      el planificador por host (cada host con su cola, lugares globales por turnos)
+    - devuelve la respuesta consolidada (scraping + processing) como JSON
     """
     # obtener parámetros query (?url=...)
     params = request.rel_url.query
     url = params.get("url")
     if not url:
         # Falta parámetro obligatorio: respondemos 400 con JSON explicativo
-        raise web.HTTPBadRequest(
-            text=json.dumps({"error": "missing url parameter"}),
-            content_type="application/json",
-        )
+        raise json_error(web.HTTPBadRequest, "missing url parameter")
 
     # Accedemos al estado compartido de la app
     app = request.app
-    sem: asyncio.Semaphore = app["sem"]  # controla número concurrente de scrapers
-    session: aiohttp.ClientSession = app["http_session"]  # session compartida (pool de conexiones)
-    timeout = app["timeout"]  # timeout configurado
-    process_host = app["process_host"]  # host del Servidor B
-    process_port = app["process_port"]  # puerto del Servidor B
-
-    # `async with sem` limita cuantas coroutines pueden ejecutar scraping simultáneamente.
-    async with sem:
+    options = processing_options(params, app)
+
+    try:
+        response = await app["engine"].run(url, options)
+    except web.HTTPException as e:
+        # Propagamos excepciones HTTP lanzadas por scrape_worker (p. ej. 400 en fetch_error).
+        # La excepción puede ser compartida por varias requests (single-flight), así que
+        # cada una responde con su propia Response.
+        return web.json_response({"error": http_error_message(e)}, status=e.status)
+    except Exception as e:
+        # Errores inesperados: devolvemos 500 con detalle mínimo.
+        return web.json_response({"url": url, "status": "failed", "error": str(e)}, status=500)
+    # web.json_response serializa a JSON, añade header Content-Type y devuelve una Response.
+    return web.json_response(response, dumps=json_dumps)
+
+
+STREAM_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def format_event(fmt: str, event: str, data: Dict[str, Any]) -> bytes:
+    """Serializa un evento como línea NDJSON o como evento Server-Sent Events."""
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json_dumps(data)}\n\n".encode("utf-8")
+    return (json_dumps({"event": event, **data}) + "\n").encode("utf-8")
+
+
+# Handler HTTP para el endpoint /scrape/stream
+async def handle_scrape_stream(request: web.Request) -> web.StreamResponse:
+    """
+    Variante streaming de /scrape (?url=...&format=ndjson|sse).
+
+    Envía eventos a medida que están listos, en lugar de un único JSON:
+    - "scraping_data" apenas termina scrape_worker (título, links, meta, ...)
+    - "screenshot", "thumbnails" y "performance" cuando B termina cada parte
+    - "done" al final, con el status consolidado (success / partial_failure)
+    """
+    params = request.rel_url.query
+    url = params.get("url")
+    if not url:
+        raise json_error(web.HTTPBadRequest, "missing url parameter")
+    fmt = params.get("format", "ndjson")
+    if fmt not in STREAM_FORMATS:
+        raise json_error(web.HTTPBadRequest, f"invalid stream format: {fmt}")
+
+    app = request.app
+    options = processing_options(params, app)
+
+    events = app["engine"].run_stream(url, options)
+    try:
         try:
-            # Ejecutamos la tarea de scraping. Es awaitable y no bloquea el loop.
-            scraping_data = await scrape_worker(url, session, timeout)
+            name, data = await events.__anext__()
         except web.HTTPException as e:
-            # Propagamos excepciones HTTP lanzadas por scrape_worker (p. ej. 400 en fetch_error)
             return e
         except Exception as e:
-            # Errores inesperados: devolvemos 500 con detalle mínimo.
             return web.json_response({"url": url, "status": "failed", "error": str(e)}, status=500)
 
-        # Preparamos el payload que mandaremos al Servidor B para procesamiento adicional.
-        payload = {
-            "url": url,
-            "scraping_data": scraping_data,
-            "timestamp": datetime.utcnow().isoformat() + "Z",
-        }
+        # A partir de acá el status HTTP ya es 200: los errores de B viajan como eventos
+        resp = web.StreamResponse(headers={"Content-Type": STREAM_FORMATS[fmt], "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        await resp.write(format_event(fmt, name, data))
+        async for name, data in events:
+            await resp.write(format_event(fmt, name, data))
+        await resp.write_eof()
+        return resp
+    finally:
+        # Libera el lugar del planificador aunque el cliente se haya ido a mitad del stream
+        await events.aclose()
 
-        processing_data: Optional[Dict[str, Any]] = None
-        try:
-            # send_request_and_receive_json abre una conexión TCP asíncrona (asyncio.open_connection),
-            # envía JSON con prefijo de longitud (4 bytes big-endian) y espera la respuesta con el mismo formato.
-            processing_data = await send_request_and_receive_json(process_host, process_port, payload)
-        except Exception as e:
-            # Si la comunicación con B falla (timeout, conexión rechazada, datos inválidos, etc.),
-            # devolvemos scraping_data y un processing_data con la info del error.
-            processing_data = {"error": f"processing_server_error: {str(e)}"}
-
-        # Consolidamos la respuesta final para el cliente
-        response = {
-            "url": url,
-            "timestamp": payload["timestamp"],
-            "scraping_data": scraping_data,
-            "processing_data": processing_data,
-            "status": "success" if not processing_data.get("error") else "partial_failure",
-        }
-        # web.json_response serializa a JSON, añade header Content-Type y devuelve una Response.
-        return web.json_response(response)
+
+async def read_batch_items(request: web.Request) -> AsyncIterator[Any]:
+    """
+    Itera los elementos enviados a /scrape/batch sin validarlos.
+    - application/x-ndjson o text/plain: una URL por línea (string JSON, objeto
+      {"url": ...} o URL sin comillas); se lee a medida que llega el cuerpo.
+    - application/json: lista de URLs u objeto {"urls": [...]}.
+    """
+    if request.content_type in ("application/x-ndjson", "application/jsonl", "text/plain"):
+        async for raw in request.content:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line or line.startswith("#"):
+                continue
+            if line[0] in "{\"":
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield line
+            else:
+                yield line
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise json_error(web.HTTPBadRequest, "invalid JSON body")
+    urls = body.get("urls") if isinstance(body, dict) else body
+    if not isinstance(urls, list):
+        raise json_error(web.HTTPBadRequest, "expected a JSON list of urls or {\"urls\": [...]}")
+    for item in urls:
+        yield item
+
+
+# Handler HTTP para el endpoint /scrape/batch
+async def handle_scrape_batch(request: web.Request) -> web.StreamResponse:
+    """
+    POST /scrape/batch: scrapea y procesa una lista de URLs.
+
+    La respuesta es NDJSON: una línea por URL, en el orden en que terminan
+    (con "index" = posición en la entrada), con el mismo formato que /scrape o
+    {"status": "failed", "error": ..., "http_status": ...}. La última línea es
+    un resumen {"done": true, "total": ..., "success": ..., ...}.
+
+    La ventana de URLs en vuelo y el límite por host los aplica app["engine"]
+    (ScrapeEngine.run_batch).
+    """
+    app = request.app
+    options = processing_options(request.rel_url.query, app)
+    items = read_batch_items(request)
+
+    # Un JSON inválido debe responderse con 400, antes de empezar el stream
+    try:
+        first = [await items.__anext__()]
+    except StopAsyncIteration:
+        first = []
+
+    async def all_items():
+        for item in first:
+            yield item
+        async for item in items:
+            yield item
+
+    resp = web.StreamResponse(headers={"Content-Type": STREAM_FORMATS["ndjson"], "Cache-Control": "no-cache"})
+    await resp.prepare(request)
+
+    results = app["engine"].run_batch(all_items(), options)
+    try:
+        async for result in results:
+            await resp.write((json_dumps(result) + "\n").encode("utf-8"))
+    finally:
+        # Si el cliente se desconecta, no seguimos scrapeando para nadie
+        await results.aclose()
+    await resp.write_eof()
+    return resp
+
+
+# Handler HTTP para el endpoint /blobs/{id}
+async def handle_blob(request: web.Request) -> web.Response:
+    """
+    Devuelve un blob (screenshot o thumbnail) por su id de contenido. Como el
+    id es el hash del contenido, la respuesta no cambia nunca: se puede
+    cachear indefinidamente y el ETag es el propio id.
+    """
+    blob = request.match_info["blob_id"]
+    if request.headers.get("If-None-Match", "").strip('"') == blob and blob in request.app["engine"].blobs:
+        return web.Response(status=304, headers={"ETag": f'"{blob}"'})
+    data = request.app["engine"].blobs.get(blob)
+    if data is None:
+        raise json_error(web.HTTPNotFound, "blob not found")
+    return web.Response(
+        body=data,
+        content_type=sniff_content_type(data),
+        headers={"ETag": f'"{blob}"', "Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+# Handler HTTP para el endpoint /stats
+async def handle_stats(request: web.Request) -> web.Response:
+    """
+    Contadores de la caché, del single-flight, del planificador y del pool de
+    conexiones HTTP, parsings por executor y lag del event loop.
+    """
+    app = request.app
+    return web.json_response({
+        **app["engine"].stats(),
+        "event_loop_lag": app["loop_monitor"].stats(),
+    })
 
 
 # Factory que crea la aplicación aiohttp y gestiona recursos
@@ -186,33 +329,95 @@ def create_app(
     process_port: int = 9001,
     workers: int = DEFAULT_WORKERS,
     timeout: int = DEFAULT_TIMEOUT,
+    process_pool_size: int = PROCESSOR_POOL_SIZE,
+    forward_mode: str = DEFAULT_FORWARD_MODE,
+    codec: str = "auto",
+    per_host: int = DEFAULT_PER_HOST,
+    host_delay: float = DEFAULT_HOST_DELAY,
+    robots_crawl_delay: bool = ROBOTS_CRAWL_DELAY,
+    batch_window: int = DEFAULT_BATCH_WINDOW,
+    scraping_ttl: int = SCRAPING_TTL,
+    processing_ttl: int = PROCESSING_TTL,
+    cache_entries: int = CACHE_ENTRIES,
+    cache_mb: int = CACHE_MB,
+    cache_db: Optional[str] = CACHE_DB,
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    parse_workers: int = DEFAULT_PARSE_WORKERS,
+    parse_process_threshold: int = DEFAULT_PROCESS_THRESHOLD,
+    strip_fragments: bool = STRIP_FRAGMENTS,
+    strip_tracking: bool = STRIP_TRACKING,
+    connector_profile: Optional[ConnectorProfile] = None,
+    process_replicas: Optional[List[Tuple[str, int]]] = None,
+    resilience: Optional[ResilienceProfile] = None,
+    blob_mode: str = DEFAULT_BLOB_MODE,
+    blob_mb: int = BLOB_MB,
+    blob_dir: Optional[str] = BLOB_DIR,
 ) -> web.Application:
     """
     Crea y configura la aiohttp.web.Application.
     """
-    app = web.Application()
-
-    # Registrar ruta /scrape
-    app.add_routes([web.get("/scrape", handle_scrape)])
+    # client_max_size: los batches enviados como un único JSON pueden ser grandes
+    app = web.Application(client_max_size=BATCH_MAX_BODY)
+
+    # Registrar rutas /scrape, /scrape/stream, /scrape/batch, /blobs/{id} y /stats
+    app.add_routes([
+        web.get("/scrape", handle_scrape),
+        web.get("/scrape/stream", handle_scrape_stream),
+        web.post("/scrape/batch", handle_scrape_batch),
+        web.get("/blobs/{blob_id}", handle_blob),
+        web.get("/stats", handle_stats),
+    ])
 
     # Estado compartido accesible desde handlers vía request.app
-    app["sem"] = asyncio.Semaphore(workers)  # controla concurrencia
-    app["timeout"] = timeout
-    app["process_host"] = process_host
-    app["process_port"] = process_port
+    app["forward_mode"] = forward_mode
+    app["blob_mode"] = blob_mode
+    # Concurrencia: `workers` lugares globales repartidos por turnos entre hosts, cada uno
+    # con su cola, hasta `per_host` requests simultáneas y `host_delay` s entre inicios
+    robots = RobotsDelays(lambda: engine.session, ROBOTS_USER_AGENT) if robots_crawl_delay else None
+    # El motor concentra la session HTTP, el pool hacia B, el parsing, la caché
+    # de resultados por URL normalizada y el colapso de requests concurrentes
+    engine = app["engine"] = ScrapeEngine(
+        process_host=process_host,
+        process_port=process_port,
+        # Réplicas adicionales de B y política de reintentos / hedging / circuit breaker
+        process_replicas=process_replicas,
+        resilience=resilience,
+        process_pool_size=process_pool_size,
+        # Codec preferido para el protocolo binario con B ("auto": el más compacto disponible)
+        codecs=None if codec == "auto" else [codec],
+        timeout=timeout,
+        cache=ResponseCache(
+            {"scraping": scraping_ttl, "processing": processing_ttl, "validators": VALIDATORS_TTL},
+            max_entries=cache_entries,
+            max_bytes=cache_mb * 1024 * 1024,
+            backend=SqliteBackend(cache_db) if cache_db else None,
+        ),
+        scheduler=HostScheduler(workers, per_host, min_delay=host_delay, crawl_delay=robots),
+        # Connector HTTP (límites, keep-alive, caché de DNS, happy eyeballs, resolver)
+        connector_profile=connector_profile,
+        parse_mode=parse_mode,
+        parse_workers=parse_workers,
+        parse_process_threshold=parse_process_threshold,
+        link_options={"strip_fragments": strip_fragments, "strip_tracking": strip_tracking},
+        # /scrape/batch: URLs en vuelo por batch
+        batch_window=batch_window,
+        # Screenshots y thumbnails servidos en /blobs/{id} (con ?blobs=id|url)
+        blob_store=BlobStore(max_bytes=blob_mb * 1024 * 1024, directory=blob_dir),
+    )
 
     # Hooks de ciclo de vida: on_startup y on_cleanup son coroutines ejecutadas por aiohttp
     # on_startup corre cuando web.run_app inicia el servidor (ya hay un event loop en ejecución)
     async def on_startup(app: web.Application):
-        # Crear ClientSession DENTRO del event loop activo.
-        # ClientSession crea recursos asíncronos ligados al loop.
-        app["http_session"] = aiohttp.ClientSession()
+        # La ClientSession, el pool hacia B y el executor se crean DENTRO del event loop activo
+        await app["engine"].start()
+        # Medición del lag del loop
+        app["loop_monitor"] = LoopLagMonitor()
+        app["loop_monitor"].start()
 
     async def on_cleanup(app: web.Application):
-        # Cerrar la ClientSession al apagar la app para liberar sockets y recursos.
-        session = app.get("http_session")
-        if session:
-            await session.close()
+        # Cerrar session, conexiones con B, caché y executor al apagar la app
+        await app["engine"].close()
+        await app["loop_monitor"].stop()
 
     # Registrar los hooks en la app para que aiohttp los invoque automáticamente
     app.on_startup.append(on_startup)
@@ -227,7 +432,79 @@ def parse_args():
     p.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Número de workers (default: 4)")
     p.add_argument("--process-host", default="127.0.0.1", help="Host del servidor de procesamiento (Parte B)")
     p.add_argument("--process-port", default=9001, type=int, help="Puerto del servidor de procesamiento (Parte B)")
+    p.add_argument("--process-pool-size", type=int, default=PROCESSOR_POOL_SIZE,
+                   help=f"Conexiones persistentes hacia la Parte B (default: {PROCESSOR_POOL_SIZE})")
+    p.add_argument("--process-replica", action="append", type=parse_replica, default=[], metavar="HOST:PORT",
+                   help="Réplica adicional de la Parte B: reparto por carga, reintentos y hedging (repetible)")
+    resilience = ResilienceProfile.from_env()
+    p.add_argument("--process-budget", type=float, default=resilience.budget,
+                   help=f"Segundos máximos para obtener la respuesta de B, salvo ?budget= (default: {resilience.budget}, env PROC_BUDGET)")
+    p.add_argument("--process-attempt-timeout", type=float, default=resilience.attempt_timeout,
+                   help=f"Segundos máximos por intento hacia B (default: {resilience.attempt_timeout}, env PROC_ATTEMPT_TIMEOUT)")
+    p.add_argument("--process-attempts", type=int, default=resilience.attempts,
+                   help=f"Intentos en total hacia B, con backoff y jitter (default: {resilience.attempts}, env PROC_ATTEMPTS)")
+    p.add_argument("--hedge", action="store_true", default=resilience.hedge,
+                   help="Enviar una segunda copia a otra réplica si B tarda más que su p95 (env PROC_HEDGE)")
+    p.add_argument("--breaker-failures", type=int, default=resilience.breaker_failures,
+                   help=f"Fallas seguidas que abren el circuito hacia una réplica (default: {resilience.breaker_failures}, env PROC_BREAKER_FAILURES)")
+    p.add_argument("--breaker-reset", type=float, default=resilience.breaker_reset,
+                   help=f"Segundos con el circuito abierto antes de probar de nuevo (default: {resilience.breaker_reset}, env PROC_BREAKER_RESET)")
+    p.add_argument("--health-interval", type=float, default=resilience.health_interval,
+                   help=f"Segundos entre chequeos de salud de las réplicas de B; 0 los desactiva (default: {resilience.health_interval}, env PROC_HEALTH_INTERVAL)")
+    p.add_argument("--forward", choices=FORWARD_MODES, default=DEFAULT_FORWARD_MODE,
+                   help="Qué reenviar a la Parte B de la descarga de A: html, images o none (default: html)")
+    p.add_argument("--blobs", choices=BLOB_MODES, default=DEFAULT_BLOB_MODE,
+                   help="Cómo devolver screenshot y thumbnails, salvo ?blobs=: inline (base64), id o url (/blobs/{id}) "
+                        f"(default: {DEFAULT_BLOB_MODE}, env BLOB_MODE)")
+    p.add_argument("--blob-mb", type=int, default=BLOB_MB,
+                   help=f"Memoria máxima del almacén de blobs en MB (default: {BLOB_MB}, env BLOB_MB)")
+    p.add_argument("--blob-dir", default=BLOB_DIR,
+                   help="Directorio para persistir los blobs (default: sólo memoria, env BLOB_DIR)")
+    p.add_argument("--codec", choices=["auto"] + available_codecs(), default="auto",
+                   help="Codec del protocolo binario con la Parte B (default: auto)")
     p.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT, help="Timeout de scraping en segundos (default: 30)")
+    p.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                   help=f"Requests simultáneas por host (default: {DEFAULT_PER_HOST})")
+    p.add_argument("--host-delay", type=float, default=DEFAULT_HOST_DELAY,
+                   help="Segundos mínimos entre requests al mismo host (default: 0, env SCRAPE_HOST_DELAY)")
+    p.add_argument("--robots-crawl-delay", action="store_true", default=ROBOTS_CRAWL_DELAY,
+                   help="Respetar el Crawl-delay de robots.txt de cada host (env ROBOTS_CRAWL_DELAY)")
+    p.add_argument("--batch-window", type=int, default=DEFAULT_BATCH_WINDOW,
+                   help=f"URLs en vuelo por batch en /scrape/batch (default: {DEFAULT_BATCH_WINDOW})")
+    p.add_argument("--scraping-ttl", type=int, default=SCRAPING_TTL,
+                   help=f"Segundos en caché de scraping_data, 0 = sin caché (default: {SCRAPING_TTL})")
+    p.add_argument("--processing-ttl", type=int, default=PROCESSING_TTL,
+                   help=f"Segundos en caché de processing_data, 0 = sin caché (default: {PROCESSING_TTL})")
+    p.add_argument("--cache-entries", type=int, default=CACHE_ENTRIES,
+                   help=f"Entradas máximas en memoria (LRU) (default: {CACHE_ENTRIES})")
+    p.add_argument("--cache-mb", type=int, default=CACHE_MB,
+                   help=f"Memoria máxima de la caché en MB (default: {CACHE_MB})")
+    p.add_argument("--cache-db", default=CACHE_DB,
+                   help="Archivo SQLite para persistir la caché entre reinicios (default: sólo memoria)")
+    p.add_argument("--parse-executor", choices=PARSE_MODES, default=DEFAULT_PARSE_MODE,
+                   help="Dónde parsear el HTML: auto, thread, process o inline (default: auto)")
+    p.add_argument("--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS,
+                   help=f"Threads/procesos del executor de parsing (default: {DEFAULT_PARSE_WORKERS})")
+    p.add_argument("--parse-process-threshold-kb", type=int, default=DEFAULT_PROCESS_THRESHOLD // 1024,
+                   help="Con --parse-executor auto, tamaño desde el que se parsea en procesos (default: 256)")
+    profile = ConnectorProfile.from_env()
+    p.add_argument("--conn-limit", type=int, default=profile.limit,
+                   help=f"Conexiones HTTP simultáneas en total, 0 = sin límite (default: {profile.limit}, env AIO_LIMIT)")
+    p.add_argument("--conn-limit-per-host", type=int, default=profile.limit_per_host,
+                   help=f"Conexiones HTTP simultáneas por host (default: {profile.limit_per_host}, env AIO_LIMIT_PER_HOST)")
+    p.add_argument("--keepalive-timeout", type=float, default=profile.keepalive_timeout,
+                   help=f"Segundos que se conserva una conexión ociosa (default: {profile.keepalive_timeout}, env AIO_KEEPALIVE)")
+    p.add_argument("--dns-ttl", type=int, default=profile.dns_ttl,
+                   help=f"Segundos de la caché de DNS, 0 = sin caché (default: {profile.dns_ttl}, env AIO_DNS_TTL)")
+    p.add_argument("--happy-eyeballs-delay", type=float, default=profile.happy_eyeballs_delay,
+                   help=f"Segundos antes de probar otra dirección del host, 0 = desactivado "
+                        f"(default: {profile.happy_eyeballs_delay}, env AIO_HAPPY_EYEBALLS)")
+    p.add_argument("--resolver", choices=RESOLVERS, default=profile.resolver,
+                   help="Resolver DNS: aiodns, threaded o auto = aiodns si está instalado (env AIO_RESOLVER)")
+    p.add_argument("--strip-fragments", action="store_true", default=STRIP_FRAGMENTS,
+                   help="Descartar el fragmento (#...) de los enlaces (env LINKS_STRIP_FRAGMENTS)")
+    p.add_argument("--strip-tracking", action="store_true", default=STRIP_TRACKING,
+                   help="Descartar parámetros de tracking (utm_*, fbclid, ...) de los enlaces (env LINKS_STRIP_TRACKING)")
     return p.parse_args()
 
 
@@ -241,69 +518,49 @@ def main():
         process_port=args.process_port,
         workers=args.workers,
         timeout=args.timeout,
+        process_pool_size=args.process_pool_size,
+        forward_mode=args.forward,
+        codec=args.codec,
+        per_host=args.per_host,
+        host_delay=args.host_delay,
+        robots_crawl_delay=args.robots_crawl_delay,
+        batch_window=args.batch_window,
+        scraping_ttl=args.scraping_ttl,
+        processing_ttl=args.processing_ttl,
+        cache_entries=args.cache_entries,
+        cache_mb=args.cache_mb,
+        cache_db=args.cache_db,
+        parse_mode=args.parse_executor,
+        parse_workers=args.parse_workers,
+        parse_process_threshold=args.parse_process_threshold_kb * 1024,
+        strip_fragments=args.strip_fragments,
+        strip_tracking=args.strip_tracking,
+        connector_profile=ConnectorProfile(
+            limit=args.conn_limit,
+            limit_per_host=args.conn_limit_per_host,
+            keepalive_timeout=args.keepalive_timeout,
+            dns_ttl=args.dns_ttl,
+            happy_eyeballs_delay=args.happy_eyeballs_delay,
+            resolver=args.resolver,
+        ),
+        process_replicas=args.process_replica,
+        resilience=ResilienceProfile(
+            budget=args.process_budget,
+            attempt_timeout=args.process_attempt_timeout,
+            attempts=args.process_attempts,
+            hedge=args.hedge,
+            breaker_failures=args.breaker_failures,
+            breaker_reset=args.breaker_reset,
+            health_interval=args.health_interval,
+        ),
+        blob_mode=args.blobs,
+        blob_mb=args.blob_mb,
+        blob_dir=args.blob_dir,
     )
     # web.run_app:
     # - crea y administra el event loop
     web.run_app(app, host=args.ip, port=args.port)
 
 
-# A continuación está la implementación consolidada de `scrape_worker`.
-async def scrape_worker(url: str, session: aiohttp.ClientSession, timeout: int) -> Dict[str, Any]:
-    """
-    Realiza un GET asíncrono a `url` y usa parse_html_basic para extraer scraping_data.
-    Mapea errores de red a excepciones HTTP precisas (400, 502, 504) que aiohttp
-    interpretará y enviará al cliente como respuestas con JSON.
-    """
-    try:
-        # Abrimos la petición usando la session compartida y aplicamos timeout global.
-        # El `async with` garantiza que la respuesta se cierre/retorne al pool.
-        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
-            # Levanta ClientResponseError si el status es 4xx/5xx
-            resp.raise_for_status()
-
-            if resp.content_length and resp.content_length > 5 * 1024 * 1024:  # > 5 MB
-                raise web.HTTPRequestEntityTooLarge(
-                    text=json.dumps(
-                        {"error": f"El contenido es demasiado grande ({resp.content_length} bytes)"}
-                    ),
-                    content_type="application/json",
-                )
-
-            # Leer el cuerpo de forma asíncrona (no bloqueante).
-            html = await resp.text()
-
-    # Mapeos de excepciones frecuentes a respuestas HTTP con JSON explicativo:
-    except asyncio.TimeoutError:
-        # Timeout de la operación de red
-        raise web.HTTPGatewayTimeout(
-            text=json.dumps({"error": "Timeout mientras se conectaba al servidor"}),
-            content_type="application/json",
-        )
-    except aiohttp.ClientConnectorError as e:
-        # Error al conectar (host inaccesible / conexión rechazada)
-        raise web.HTTPBadGateway(
-            text=json.dumps({"error": f"Conexión rechazada o fallida: {str(e)}"}),
-            content_type="application/json",
-        )
-    except aiohttp.ClientResponseError as e:
-        # El servidor remoto devolvió un status 4xx/5xx
-        status = e.status
-        raise web.HTTPBadRequest(
-            text=json.dumps({"error": f"Error HTTP recibido del servidor: {status}"}),
-            content_type="application/json",
-        )
-    except Exception as e:
-        # Cualquier otro error se mapea a 400 con mensaje minimalista
-        raise web.HTTPBadRequest(
-            text=json.dumps({"error": f"Fallo inesperado: {str(e)}"}),
-            content_type="application/json",
-        )
-
-    # Si llegamos acá, tenemos el HTML; parse_html_basic extrae título, links, meta, headers, count imágenes.
-    # Usamos str(resp.url) para resolver URLs relativas y reflejar redirecciones.
-    scraping_data = parse_html_basic(html, base_url=str(resp.url))
-    return scraping_data
-
-
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
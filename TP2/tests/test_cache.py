@@ -0,0 +1,133 @@
+import asyncio
+import pathlib
+import sys
+import threading
+import pytest
+
+# Asegurar que TP2 esté en sys.path para que 'common' sea importable
+base = pathlib.Path(__file__).resolve().parents[1]
+if str(base) not in sys.path:
+    sys.path.insert(0, str(base))
+
+from common.cache import ResponseCache, SingleFlight, SqliteBackend, normalize_url  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.COM:443?b=2&a=1#top") == "https://example.com/?a=1&b=2"
+    assert normalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+    assert normalize_url("http://[::1]:8080/x") == "http://[::1]:8080/x"
+    assert normalize_url("http://[::1]:80") == "http://[::1]/"
+    assert normalize_url("https://[2001:DB8::1]/") == "https://[2001:db8::1]/"
+    assert normalize_url("http://user:pw@Example.com/x") == "http://user:pw@example.com/x"
+    assert normalize_url("http://user:pw@example.com/x") != normalize_url("http://example.com/x")
+
+
+def test_cache_ttl_per_namespace_and_lru():
+    clock = FakeClock()
+    cache = ResponseCache({"scraping": 10, "processing": 100}, max_entries=2, clock=clock)
+    cache.set("scraping", "u1", {"title": "a"})
+    cache.set("processing", "u1", {"screenshot": b"png"})
+    assert cache.get("scraping", "u1") == {"title": "a"}
+
+    clock.now += 50  # scraping venció, processing sigue vigente
+    assert cache.get("scraping", "u1") is None
+    assert cache.get("processing", "u1") == {"screenshot": b"png"}
+
+    # Con dos entradas como máximo, la menos usada recientemente se descarta
+    cache.set("scraping", "u2", 2)
+    cache.get("processing", "u1")
+    cache.set("scraping", "u3", 3)
+    assert cache.get("scraping", "u2") is None
+    assert cache.get("processing", "u1") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["scraping"] == {"hits": 1, "misses": 2, "ttl": 10}
+
+
+def test_cache_persists_in_sqlite(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache({"processing": 100}, backend=SqliteBackend(path))
+    cache.set("processing", "u", {"thumbnails": [b"\x00\x01"]})
+    cache.close()
+
+    reopened = ResponseCache({"processing": 100}, backend=SqliteBackend(path))
+    assert reopened.get("processing", "u") == {"thumbnails": [b"\x00\x01"]}
+    assert reopened.stats()["processing"]["hits"] == 1
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_async_access_runs_backend_io_off_the_event_loop(tmp_path):
+    """aget / aset consultan y escriben SQLite desde el thread de E/S de la caché."""
+    threads = []
+
+    class RecordingBackend(SqliteBackend):
+        def get(self, key):
+            threads.append(threading.current_thread().name)
+            return super().get(key)
+
+        def set(self, key, expires, blob):
+            threads.append(threading.current_thread().name)
+            super().set(key, expires, blob)
+
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache({"scraping": 100}, backend=RecordingBackend(path))
+    await cache.aset("scraping", "u", {"title": "a"})
+    assert await cache.aget("scraping", "u") == {"title": "a"}  # desde memoria, sin E/S
+    assert await cache.aget("scraping", "otra") is None
+    cache.close()
+
+    reopened = ResponseCache({"scraping": 100}, backend=RecordingBackend(path))
+    assert await reopened.aget("scraping", "u") == {"title": "a"}
+    assert reopened.stats()["scraping"]["hits"] == 1
+    reopened.close()
+    assert len(threads) == 3 and all(name.startswith("cache-io") for name in threads)
+
+
+@pytest.mark.asyncio
+async def test_single_flight_collapses_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    results = await asyncio.gather(*(flight.run("k", work) for _ in range(5)))
+    assert results == ["ok"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "started": 1, "collapsed": 4}
+
+
+def test_blob_store_content_addressed_lru_and_directory(tmp_path):
+    from common.blob_store import BlobStore, blob_id, sniff_content_type
+
+    store = BlobStore(max_bytes=10, directory=str(tmp_path))
+    first = store.put(b"logo-123")
+    assert first == blob_id(b"logo-123") and store.put(b"logo-123") == first
+    assert store.stats()["stored"] == 1
+
+    # El LRU en memoria descarta el primero, pero sigue en disco
+    second = store.put(b"sprite-45")
+    assert store.stats()["evictions"] == 1 and store.stats()["entries"] == 1
+    assert store.get(first) == b"logo-123"
+    # Otro proceso (u otro arranque) con el mismo directorio ve los blobs
+    other = BlobStore(max_bytes=0, directory=str(tmp_path))
+    assert second in other and other.get(second) == b"sprite-45"
+    assert other.get("0" * 64) is None and other.get("../etc/passwd") is None
+
+    # Clave propia (hash de la imagen de origen + parámetros del thumbnail)
+    memory = BlobStore()
+    memory.put(b"thumb", key="f" * 64)
+    assert memory.get("f" * 64) == b"thumb"
+    assert sniff_content_type(b"\x89PNG\r\n\x1a\n...") == "image/png"
+    assert sniff_content_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
@@ -41,3 +41,778 @@ def test_processor_returns_processing_data_or_error():
     else:
         assert "error" in res
 
+
+
+def _fake_task(payload):
+    return {"status": "success", "processing_data": {"echo": payload.get("n"), "png": b"\x89PNG\x00raw"}}
+
+
+def test_threaded_frontend_caps_frame_sizes_and_drops_truncated_frames():
+    """El front end threaded aplica MAX_MESSAGE_SIZE y trata las lecturas cortas como EOF."""
+    import json
+    import pathlib
+    import socket
+    import struct
+    import sys
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from common.protocol import BIN_MAGIC, FRAME_V2_HEADER, LEN_STRUCT, MUX_HEADER, MUX_MAGIC, pack_mux_frame
+    from server_processing import LengthPrefixedTCPHandler, ThreadedTCPServer
+
+    def read_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def connect(port, data=b""):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        sock.sendall(data)
+        return sock
+
+    def handshake(sock):
+        sock.sendall(BIN_MAGIC + pack_mux_frame(0, json.dumps({"versions": [2], "codecs": ["json"]}).encode()))
+        _, length = MUX_HEADER.unpack(sock.recv(MUX_HEADER.size, socket.MSG_WAITALL))
+        assert json.loads(sock.recv(length, socket.MSG_WAITALL))["codec"] == "json"
+
+    huge = 0xFFFFFFF0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        server = ThreadedTCPServer(("127.0.0.1", 0), LengthPrefixedTCPHandler)
+        server.executor = executor
+        server.task_fn = _fake_task
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            # Protocolo simple: se responde el error sin leer el cuerpo
+            with connect(port, struct.pack(">I", huge)) as sock:
+                (length,) = struct.unpack(">I", sock.recv(4, socket.MSG_WAITALL))
+                assert "payload too large" in json.loads(sock.recv(length, socket.MSG_WAITALL))["error"]
+            # Multiplexado: el header gigante cierra la conexión
+            with connect(port, MUX_MAGIC + MUX_HEADER.pack(1, huge)) as sock:
+                assert read_all(sock) == b""
+            # v2: blob gigante y cuerpo truncado cierran la conexión sin responder
+            with connect(port) as sock:
+                handshake(sock)
+                sock.sendall(FRAME_V2_HEADER.pack(1, 2, 1) + b"{}" + LEN_STRUCT.pack(huge))
+                assert read_all(sock) == b""
+            with connect(port) as sock:
+                handshake(sock)
+                sock.sendall(FRAME_V2_HEADER.pack(1, 100, 0) + b'{"data": {}')
+                sock.shutdown(socket.SHUT_WR)
+                assert read_all(sock) == b""
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_async_frontend_serves_simple_and_multiplexed_clients():
+    """El front end asyncio atiende el protocolo simple y el multiplexado sin red externa."""
+    import asyncio
+    import base64
+    import pathlib
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from server_processing import AsyncProcessingServer
+    from common.protocol import ProcessorPool, send_request_and_receive_json
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        server = AsyncProcessingServer("127.0.0.1", 0, executor, task_fn=_fake_task)
+        await server.start()
+        port = server.sockets[0].getsockname()[1]
+        pool = ProcessorPool("127.0.0.1", port, size=1)
+        json_pool = ProcessorPool("127.0.0.1", port, size=1, binary=False)
+        try:
+            res = await send_request_and_receive_json("127.0.0.1", port, {"n": 7})
+            assert res["processing_data"]["echo"] == 7
+            # Protocolo simple/JSON: los bytes llegan en base64
+            assert res["processing_data"]["png"] == base64.b64encode(b"\x89PNG\x00raw").decode("ascii")
+
+            results = await asyncio.gather(*(pool.request({"n": n}) for n in range(10)))
+            assert [r["processing_data"]["echo"] for r in results] == list(range(10))
+            # Protocolo binario negociado: los bytes llegan crudos
+            assert results[0]["processing_data"]["png"] == b"\x89PNG\x00raw"
+            assert pool._slots[0].version == 2
+
+            res = await json_pool.request({"n": 3})
+            assert res["processing_data"]["echo"] == 3
+            assert json_pool._slots[0].version == 1
+        finally:
+            await pool.close()
+            await json_pool.close()
+            await server.close()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_stages_concurrently(monkeypatch):
+    """Con etapas de red simuladas (0.2 s c/u), la latencia total es la de la más lenta."""
+    import io
+    import pathlib
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    buf = io.BytesIO()
+    Image.new("RGB", (400, 300), color=(200, 10, 10)).save(buf, format="PNG")
+    png = buf.getvalue()
+
+    def fake_fetch_page(url, session, conditional=True):
+        time.sleep(0.2)
+        return {"load_time_ms": 200, "total_size_kb": 1, "image_sources": ["/a.png", "/b.png", "/c.png"]}
+
+    def fake_fetch_image(src, session, timeout=10, deadline=None):
+        time.sleep(0.2)
+        return png
+
+    def fake_render(name, url, scraping_data=None):
+        time.sleep(0.3)
+        return png, 300.0, True
+
+    monkeypatch.setattr(pipeline, "fetch_page", fake_fetch_page)
+    monkeypatch.setattr(pipeline, "fetch_image", fake_fetch_image)
+    monkeypatch.setattr(pipeline, "SELENIUM_AVAILABLE", False)
+    monkeypatch.setattr(pipeline, "render_fallback", fake_render)
+
+    with ThreadPoolExecutor(max_workers=2) as cpu, ThreadPoolExecutor(max_workers=8) as io_pool:
+        start = time.perf_counter()
+        res = await pipeline.run_pipeline({"url": "https://example.com"}, cpu, io_pool)
+        elapsed = time.perf_counter() - start
+
+    assert res["status"] == "success"
+    pd = res["processing_data"]
+    assert len(pd["thumbnails"]) == 3
+    assert pd["performance"]["num_requests"] == 4
+    # En serie serían 0.2 + 0.3 + 3 * 0.2 = 1.1 s
+    assert elapsed < 0.8
+
+    # payload["operations"]: sólo screenshot no descarga la página ni imágenes
+    def no_fetch(*args, **kwargs):
+        raise AssertionError("no debería descargar nada")
+
+    monkeypatch.setattr(pipeline, "fetch_page", no_fetch)
+    monkeypatch.setattr(pipeline, "fetch_image", no_fetch)
+    with ThreadPoolExecutor(max_workers=2) as cpu, ThreadPoolExecutor(max_workers=2) as io_pool:
+        res = await pipeline.run_pipeline({"url": "https://example.com", "operations": ["screenshot"]}, cpu, io_pool)
+    assert res["status"] == "success"
+    assert list(res["processing_data"]) == ["screenshot"]
+
+
+def test_forwarded_page_skips_second_download():
+    """Con la página reenviada por A, B usa sus mediciones y no vuelve a descargar."""
+    import base64
+    import pathlib
+    import sys
+    import zlib
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    html = b"<html><body><img src='/a.png'><img src='b.png'></body></html>"
+    payload = {
+        "url": "https://example.com/x",
+        "page": {
+            "html_zlib": base64.b64encode(zlib.compress(html)).decode("ascii"),
+            "final_url": "https://example.com/x/",
+            "fetch_ms": 120,
+            "size_bytes": 4096,
+        },
+    }
+    assert not pipeline.needs_fetch(payload)
+    assert pipeline.needs_fetch(dict(payload, fresh_performance=True))
+    assert pipeline.needs_fetch({"url": "https://example.com"})
+
+    page = pipeline.page_from_forwarded(payload["page"])
+    assert page["image_sources"] == ["/a.png", "b.png"]
+    assert page["load_time_ms"] == 120
+    assert page["total_size_kb"] == 4
+    assert page["source"] == "scraper"
+    assert pipeline.page_base_url(payload) == "https://example.com/x/"
+
+    only_images = pipeline.page_from_forwarded({"image_urls": ["https://cdn/x.png"], "fetch_ms": 5, "size_bytes": 10})
+    assert only_images["image_sources"] == ["https://cdn/x.png"]
+
+
+def test_fetch_page_revalidates_with_etag():
+    """La segunda descarga envía If-None-Match y ante un 304 reutiliza las imágenes."""
+    import pathlib
+    import sys
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = b"<html><body><img src='/a.png'>" + b"<p>x</p>" * 500 + b"</body></html>"
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/page"
+    try:
+        session = pipeline.make_retry_session()
+        first = pipeline.fetch_page(url, session)
+        second = pipeline.fetch_page(url, session)
+        fresh = pipeline.fetch_page(url, session, conditional=False)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert seen == [None, '"v1"', None]
+    assert second["image_sources"] == first["image_sources"] == ["/a.png"]
+    assert second["total_size_kb"] == first["total_size_kb"] == fresh["total_size_kb"]
+
+
+class StubDriver:
+    """Driver de mentira con la interfaz que usan el pool, screenshot.py y performance.py."""
+
+    instances = 0
+
+    def __init__(self, memory_mb=10):
+        StubDriver.instances += 1
+        self.memory_mb = memory_mb
+        self.alive = True
+        self.visited = []
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def get(self, url):
+        self.visited.append(url)
+
+    def get_screenshot_as_png(self):
+        return b"\x89PNG-stub"
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("browser crashed")
+        if "usedJSHeapSize" in script:
+            return self.memory_mb * 1024 * 1024
+        return 1
+
+    def quit(self):
+        self.alive = False
+
+
+def _load_browser_pool():
+    import pathlib
+    import sys
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import browser_pool
+    return browser_pool
+
+
+def test_browser_pool_reuses_and_recycles_after_max_pages():
+    browser_pool = _load_browser_pool()
+    created = []
+
+    def factory():
+        created.append(StubDriver())
+        return created[-1]
+
+    pool = browser_pool.BrowserPool(factory=factory, size=1, max_pages=3)
+    for _ in range(5):
+        with pool.borrow() as driver:
+            driver.get("https://example.com")
+    # 3 páginas con el primer navegador, luego se recicla y se crea otro
+    assert len(created) == 2
+    assert created[0].alive is False
+    assert created[0].visited == ["https://example.com"] * 3
+    assert pool.stats["recycled"] == 1
+    pool.close()
+    assert created[1].alive is False
+
+
+def test_browser_pool_health_check_and_memory_threshold():
+    browser_pool = _load_browser_pool()
+    created = []
+
+    def factory():
+        created.append(StubDriver(memory_mb=10))
+        return created[-1]
+
+    pool = browser_pool.BrowserPool(factory=factory, size=1, max_pages=100, max_memory_mb=50)
+    with pool.borrow() as driver:
+        pass
+    # El navegador ocioso deja de responder: se descarta al prestarlo
+    created[0].alive = False
+    with pool.borrow() as driver:
+        assert driver is created[1]
+        driver.memory_mb = 80  # supera el umbral: se recicla al devolverlo
+    assert pool.stats["unhealthy"] == 1
+    assert pool.stats["recycled"] == 1
+    with pool.borrow() as driver:
+        assert driver is created[2]
+    pool.close()
+
+
+def test_screenshot_module_borrows_from_pool():
+    browser_pool = _load_browser_pool()
+    from processor.screenshot import generate_screenshot
+
+    pool = browser_pool.BrowserPool(factory=StubDriver, size=1)
+    first = generate_screenshot({"url": "https://example.com"}, pool=pool)
+    second = generate_screenshot({"url": "https://example.org"}, pool=pool)
+    assert first["screenshot"] and second["screenshot"]
+    assert pool.stats["created"] == 1
+    assert pool.stats["borrowed"] == 2
+    pool.close()
+
+
+def test_browser_performance_metrics_share_the_screenshot_page_load(monkeypatch):
+    """Screenshot y Navigation/Resource Timing salen de una sola carga en el navegador del pool."""
+    browser_pool = _load_browser_pool()
+    from processor import performance, pipeline
+
+    summary = performance.summarize_timings(performance.FakeBrowserDriver.DEFAULT_PAGE, top=2)
+    assert summary["ttfb_ms"] == 80.0
+    assert summary["dom_content_loaded_ms"] == 300.0
+    assert summary["load_time_ms"] == 450.0
+    assert summary["transfer_bytes"] == 20480 + 51200 + 10240 + 204800
+    assert summary["num_requests"] == 4
+    assert summary["requests_by_type"] == {"document": 1, "script": 1, "link": 1, "img": 1}
+    assert [r["url"] for r in summary["largest_resources"]] == [
+        "https://cdn.example/hero.jpg", "https://cdn.example/app.js"]
+
+    drivers = []
+
+    def factory():
+        drivers.append(performance.FakeBrowserDriver())
+        return drivers[-1]
+
+    monkeypatch.setattr(pipeline, "SELENIUM_AVAILABLE", True)
+    browser_pool.set_browser_pool(browser_pool.BrowserPool(factory=factory, size=1))
+    try:
+        page = {"load_time_ms": 999, "total_size_kb": 1, "image_sources": [], "source": "scraper"}
+        png, metrics = pipeline.capture_browser("https://example.com", ("screenshot", "performance"))
+        result = pipeline.build_result(png, page, [], ("screenshot", "performance"), metrics)
+    finally:
+        browser_pool.set_browser_pool(None)
+    assert drivers[0].loads == 1
+    assert result["processing_data"]["screenshot"] == b"\x89PNG-fake"
+    perf = result["processing_data"]["performance"]
+    assert perf["source"] == "browser" and perf["load_time_ms"] == 450.0
+    # Sin métricas del navegador queda la estimación de la descarga de la página
+    assert pipeline.build_performance(page, [])["load_time_ms"] == 999
+
+
+@pytest.mark.asyncio
+async def test_renderer_selection_without_browser(monkeypatch):
+    """Sin Chrome: wireframe desde scraping_data o placeholder precodificado, elegidos por request y medidos."""
+    import io
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+
+    _load_browser_pool()
+    from processor import pipeline, renderers
+    from server_processing import process_task
+
+    monkeypatch.setattr(pipeline, "SELENIUM_AVAILABLE", False)
+    assert renderers.resolve_renderer("auto", True) == "browser"
+    assert renderers.resolve_renderer("auto", False) == renderers.fallback_renderer() == "wireframe"
+    assert renderers.resolve_renderer("browser", False) == "wireframe"
+    with pytest.raises(ValueError):
+        renderers.resolve_renderer("gpu", False)
+    assert renderers.placeholder_png() is renderers.placeholder_png()
+
+    scraping_data = {"title": "Página de ejemplo", "structure": {"h1": 1, "h2": 2}, "images_count": 4,
+                     "link_counts": {"internal": 10, "external": 3}}
+    payload = {"url": "https://example.com", "operations": ["screenshot"], "scraping_data": scraping_data}
+    with ThreadPoolExecutor(max_workers=1) as cpu, ThreadPoolExecutor(max_workers=1) as io_pool:
+        wire = await pipeline.run_pipeline(payload, cpu, io_pool)
+        placeholder = await pipeline.run_pipeline(dict(payload, renderer="placeholder"), cpu, io_pool)
+        invalid = await pipeline.run_pipeline(dict(payload, renderer="gpu"), cpu, io_pool)
+
+    assert wire["render"]["renderer"] == "wireframe" and wire["render"]["ms"] > 0
+    shot = wire["processing_data"]["screenshot"]
+    assert Image.open(io.BytesIO(shot)).size == renderers.CANVAS
+    assert shot != renderers.placeholder_png()
+    assert placeholder["processing_data"]["screenshot"] is renderers.placeholder_png()
+    assert placeholder["render"] == {"renderer": "placeholder", "ms": placeholder["render"]["ms"]}
+    assert invalid["status"] == "failed" and "renderer" in invalid["error"]
+
+    # Front end threaded: misma selección; "browser" sin Selenium cae al de respaldo
+    res = process_task(dict(payload, renderer="browser"))
+    assert res["status"] == "success" and res["render"]["renderer"] == "wireframe"
+
+
+@pytest.mark.asyncio
+async def test_render_timings_reach_the_health_reply(monkeypatch):
+    """B suma la entrada "render" de cada respuesta y la devuelve en el chequeo de salud."""
+    import base64
+    import json
+    import pathlib
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from common.protocol import HEALTH_REQUEST, ProcessorPool
+    from processor import pipeline, renderers
+    from server_processing import AsyncProcessingServer, encode_json_reply
+
+    monkeypatch.setattr(pipeline, "SELENIUM_AVAILABLE", False)
+    broken = {"calls": 0}
+
+    def broken_renderer(url, scraping_data=None):
+        broken["calls"] += 1
+        raise RuntimeError("sin fuente")
+
+    renderers.register_renderer("broken", broken_renderer)
+    payload = {"url": "https://example.com", "operations": ["screenshot"], "scraping_data": {"title": "x"}}
+    try:
+        with ThreadPoolExecutor(max_workers=1) as cpu, ThreadPoolExecutor(max_workers=1) as io_pool:
+            server = AsyncProcessingServer("127.0.0.1", 0, cpu, io_executor=io_pool, capacity=1)
+            await server.start()
+            pool = ProcessorPool("127.0.0.1", server.sockets[0].getsockname()[1], size=1)
+            try:
+                for renderer in ("wireframe", "wireframe", "placeholder", "broken"):
+                    res = await pool.request(dict(payload, renderer=renderer), timeout=10)
+                    assert res["status"] == "success"
+                health = await pool.request(HEALTH_REQUEST, timeout=10)
+            finally:
+                await pool.close()
+                await server.close()
+    finally:
+        renderers._renderers.pop("broken")
+
+    stats = health["renderers"]
+    assert stats["wireframe"]["count"] == 2 and stats["wireframe"]["avg_ms"] > 0
+    assert stats["placeholder"]["count"] == 1
+    assert stats["broken"] == dict(stats["broken"], count=1, failures=1) and broken["calls"] == 1
+    assert res["render"]["failed"] is True
+
+    # El placeholder (también una copia, como la que vuelve del pool de procesos) sale ya en base64
+    copy = bytes(bytearray(renderers.placeholder_png()))
+    assert renderers.is_placeholder(copy) and not renderers.is_placeholder(copy[:-1] + b"x")
+    encoded = renderers.placeholder_b64()
+    monkeypatch.setattr(base64, "b64encode", None)  # ya no se vuelve a codificar
+    reply = json.loads(encode_json_reply({"status": "success", "processing_data": {"screenshot": copy}}))
+    event = json.loads(encode_json_reply({"event": "screenshot", "data": copy}))
+    assert reply["processing_data"]["screenshot"] == event["data"] == encoded
+
+
+@pytest.mark.asyncio
+async def test_cancelled_pipeline_cancels_browser_stage(monkeypatch):
+    """Si B corta la tarea por timeout, la etapa del navegador no sigue sola."""
+    import asyncio
+    import pathlib
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    finished = []
+
+    async def slow_browser_stage(url, payload, operations, renderer, loop, cpu, io_pool, emit=None):
+        await asyncio.sleep(0.2)
+        finished.append("browser")
+        return None, None, None
+
+    async def slow_thumbnails(srcs, loop, session, cpu, io_pool):
+        await asyncio.sleep(1)
+        return []
+
+    monkeypatch.setattr(pipeline, "_browser_stage", slow_browser_stage)
+    monkeypatch.setattr(pipeline, "_thumbnails_stage", slow_thumbnails)
+    payload = {"url": "https://example.com", "operations": ["screenshot", "thumbnails"],
+               "page": {"image_urls": ["https://example.com/a.png"], "fetch_ms": 1, "size_bytes": 1}}
+    with ThreadPoolExecutor(max_workers=1) as cpu, ThreadPoolExecutor(max_workers=1) as io_pool:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pipeline.run_pipeline(payload, cpu, io_pool), timeout=0.05)
+        await asyncio.sleep(0.3)
+    assert finished == []
+
+
+@pytest.mark.asyncio
+async def test_async_frontend_streams_events_per_part(monkeypatch):
+    """En modo streaming B envía un frame por parte terminada y un "done" final."""
+    import asyncio
+    import io
+    import pathlib
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+    from server_processing import AsyncProcessingServer
+    from common.protocol import ProcessorPool
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(buf, format="PNG")
+    png = buf.getvalue()
+
+    def slow_render(name, url, scraping_data=None):
+        import time
+        time.sleep(0.2)
+        return png, 200.0, True
+
+    monkeypatch.setattr(pipeline, "SELENIUM_AVAILABLE", False)
+    monkeypatch.setattr(pipeline, "render_fallback", slow_render)
+    monkeypatch.setattr(pipeline, "fetch_image", lambda src, session, timeout=10, deadline=None: png)
+
+    payload = {
+        "url": "https://example.com",
+        "page": {"image_urls": ["https://example.com/a.png"], "fetch_ms": 10, "size_bytes": 2048},
+        "stream": True,
+    }
+    with ThreadPoolExecutor(max_workers=2) as cpu, ThreadPoolExecutor(max_workers=4) as io_pool:
+        server = AsyncProcessingServer("127.0.0.1", 0, cpu, io_executor=io_pool)
+        await server.start()
+        pool = ProcessorPool("127.0.0.1", server.sockets[0].getsockname()[1], size=1)
+        try:
+            events = [e async for e in pool.request_stream(payload, timeout=10)]
+        finally:
+            await pool.close()
+            await server.close()
+
+    names = [e["event"] for e in events]
+    # El screenshot (lento) llega después de thumbnails/performance
+    assert names == ["thumbnails", "performance", "screenshot", "done"]
+    assert events[1]["data"]["num_requests"] == 2
+    assert events[-1]["status"] == "success"
+
+
+def test_thumbnail_engine_draft_formats_and_pixel_limit(monkeypatch):
+    """JPEG con draft (sin decodificar completo), formatos de salida, límite de píxeles y lotes."""
+    import io
+    import pathlib
+    import sys
+    from PIL import Image
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import thumbnails
+    from processor.thumbnails import ThumbnailError, ThumbnailProfile, make_thumbnail, make_thumbnails
+
+    buf = io.BytesIO()
+    Image.new("RGB", (4000, 3000), color=(10, 120, 200)).save(buf, format="JPEG", quality=90)
+    jpeg = buf.getvalue()
+
+    from PIL import JpegImagePlugin
+
+    drafts = []
+    real_draft = JpegImagePlugin.JpegImageFile.draft
+
+    def spy_draft(self, mode, size):
+        result = real_draft(self, mode, size)
+        drafts.append(self.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", spy_draft)
+    for fmt, pil_format in (("webp", "WEBP"), ("jpeg", "JPEG"), ("png", "PNG")):
+        thumb = Image.open(io.BytesIO(make_thumbnail(jpeg, ThumbnailProfile(format=fmt, size=128))))
+        assert thumb.format == pil_format and max(thumb.size) == 128
+    # El draft decodificó a 1/8 de la resolución (500x375), no 4000x3000
+    assert drafts[0] == (500, 375)
+
+    # Gracias al draft el JPEG entra en el límite; un PNG del mismo tamaño no
+    small_limit = ThumbnailProfile(max_pixels=1_000_000)
+    assert make_thumbnail(jpeg, small_limit)
+    buf = io.BytesIO()
+    Image.new("RGB", (2000, 1000)).save(buf, format="PNG")
+    with pytest.raises(ThumbnailError):
+        make_thumbnail(buf.getvalue(), small_limit)
+    with pytest.raises(ValueError):
+        ThumbnailProfile(format="gif")
+
+    # Lote: las imágenes inválidas quedan en None sin cortar el resto; la
+    # misma imagen de origen (con los mismos parámetros) sale de la caché
+    thumbnails.configure_thumbnails(ThumbnailProfile(format="png", size=32))
+    try:
+        batch = make_thumbnails([jpeg, b"no es una imagen", jpeg])
+        store = thumbnails.get_thumbnail_store().stats()
+    finally:
+        thumbnails.configure_thumbnails(None)
+    assert batch[1] is None and batch[0] == batch[2]
+    assert Image.open(io.BytesIO(batch[0])).size == (32, 24)
+    assert store["stored"] == 1 and store["hits"] == 1
+    assert ThumbnailProfile(size=32).cache_key(jpeg) != ThumbnailProfile(size=64).cache_key(jpeg)
+
+
+def test_thumbnail_reduces_before_converting(monkeypatch):
+    """Fuera de JPEG se reduce primero y se convierte la imagen chica; el alfa depende del modo original."""
+    import io
+    import pathlib
+    import sys
+    from PIL import Image
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor.thumbnails import ThumbnailProfile, make_thumbnail
+
+    def encode(img, fmt="PNG", **kwargs):
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, **kwargs)
+        return buf.getvalue()
+
+    converted = []
+    real_convert = Image.Image.convert
+
+    def spy_convert(self, mode=None, *args, **kwargs):
+        # Las conversiones a alfa premultiplicado (La, RGBa) son internas de resize
+        if mode in ("RGB", "RGBA") and self.mode not in ("La", "RGBa"):
+            converted.append((self.mode, self.size))
+        return real_convert(self, mode, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, "convert", spy_convert)
+    png = ThumbnailProfile(format="png", size=64)
+    jpeg = ThumbnailProfile(format="jpeg", size=64)
+
+    la = Image.open(io.BytesIO(make_thumbnail(encode(Image.new("LA", (1200, 800))), png)))
+    rgba = Image.open(io.BytesIO(make_thumbnail(encode(Image.new("RGBA", (1200, 800))), jpeg)))
+    assert (la.mode, la.size) == ("RGBA", (64, 43)) and rgba.mode == "RGB"
+    assert converted and all(size[0] <= 64 for _, size in converted)
+
+    # Con paleta se convierte antes (Pillow no la remuestrea con LANCZOS) y conserva la transparencia
+    converted.clear()
+    palette = Image.new("P", (300, 200))
+    gif = Image.open(io.BytesIO(make_thumbnail(encode(palette, "GIF", transparency=0), png)))
+    assert gif.mode == "RGBA" and converted[0] == ("P", (300, 200))
+
+
+def test_image_selection_and_concurrent_downloads_with_deadline(monkeypatch):
+    """og:image primero, luego las <img> más grandes; descargas en paralelo con plazo total."""
+    import pathlib
+    import sys
+    import time
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    html = b"""<html><head><meta property="og:image" content="/og.jpg"></head><body>
+    <img src="/pixel.gif" width="1" height="1">
+    <img src="/sin-tamano.png">
+    <img src="/chica.jpg" width="200" height="100">
+    <img src="data:image/png;base64,AAAA" width="900" height="900">
+    <img src="/grande.jpg" width="1200px" height="800px">
+    <img src="/og.jpg" width="600" height="400">
+    </body></html>"""
+    assert pipeline.find_image_sources(html, limit=10) == [
+        "/og.jpg", "/grande.jpg", "/chica.jpg", "/sin-tamano.png", "/pixel.gif",
+    ]
+    assert pipeline.find_image_sources(html, limit=2) == ["/og.jpg", "/grande.jpg"]
+
+    delays = {"a": 0.2, "b": 0.2, "lenta": 1.5, "rota": 0}
+
+    def fake_fetch_image(src, session, timeout=10, deadline=None):
+        if src == "rota":
+            raise ConnectionError("404")
+        time.sleep(delays[src])
+        return src.encode()
+
+    monkeypatch.setattr(pipeline, "fetch_image", fake_fetch_image)
+    session = pipeline.get_http_session()
+    assert pipeline.get_http_session() is session  # una sesión por proceso
+    start = time.perf_counter()
+    images = pipeline.fetch_images(["a", "lenta", "rota", "b"], session, deadline=0.5)
+    elapsed = time.perf_counter() - start
+    # En paralelo y sin esperar a la lenta: no 0.2 + 1.5 + 0.2
+    assert images == [b"a", b"b"]
+    assert elapsed < 0.8
+
+
+def test_image_downloads_stop_at_the_deadline_without_retries():
+    """Una imagen que llega de a poco se corta al vencer el plazo y los errores no se reintentan."""
+    import pathlib
+    import sys
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from processor import pipeline
+
+    hits = {"/rota.png": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/rota.png":
+                hits[self.path] += 1
+                self.send_response(503)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(64 * 1024 * 40))
+            self.end_headers()
+            try:
+                for _ in range(40):  # 64 KB cada 0.1 s: 4 s en total
+                    self.wfile.write(b"x" * 64 * 1024)
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = f"http://127.0.0.1:{server.server_address[1]}"
+    session = pipeline.make_image_session()
+    try:
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            pipeline.fetch_image(root + "/lenta.png", session, deadline=time.monotonic() + 0.4)
+        assert time.perf_counter() - start < 1.0
+
+        start = time.perf_counter()
+        assert pipeline.fetch_images([root + "/lenta.png"], session, deadline=0.4) == []
+        assert time.perf_counter() - start < 0.8
+
+        with pytest.raises(Exception):
+            pipeline.fetch_image(root + "/rota.png", session)
+        assert hits["/rota.png"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import pathlib
+import sys
+import pytest
+
+# Asegurar que TP2 esté en sys.path para que 'common' sea importable
+base = pathlib.Path(__file__).resolve().parents[1]
+if str(base) not in sys.path:
+    sys.path.insert(0, str(base))
+
+from common.protocol import (  # noqa: E402
+    MUX_MAGIC,
+    ProcessorPool,
+    decode_frame_v2,
+    extract_blobs,
+    negotiate,
+    pack_frame_v2,
+    pack_mux_frame,
+    read_frame_v2,
+    read_mux_frame,
+    restore_blobs,
+)
+from common.serialization import available_codecs, get_codec  # noqa: E402
+
+
+async def start_mux_server(delay_for, connections):
+    """
+    Servidor multiplexado mínimo: responde {"echo": n} tras `delay_for(n)` segundos,
+    de modo que las respuestas pueden salir en otro orden que las requests.
+    """
+    async def handle(reader, writer):
+        connections.append(writer)
+        assert await reader.readexactly(4) == MUX_MAGIC
+        lock = asyncio.Lock()
+
+        async def answer(request_id, payload):
+            await asyncio.sleep(delay_for(payload["n"]))
+            async with lock:
+                writer.write(pack_mux_frame(request_id, json.dumps({"echo": payload["n"]}).encode()))
+                await writer.drain()
+
+        tasks = []
+        try:
+            while True:
+                request_id, body = await read_mux_frame(reader)
+                tasks.append(asyncio.ensure_future(answer(request_id, json.loads(body))))
+        except asyncio.IncompleteReadError:
+            pass
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, port
+
+
+@pytest.mark.asyncio
+async def test_pool_multiplexes_out_of_order_responses():
+    connections = []
+    # Las primeras requests tardan más: B responde en orden inverso
+    server, port = await start_mux_server(lambda n: 0.05 * (5 - n), connections)
+    pool = ProcessorPool("127.0.0.1", port, size=1, binary=False)
+    try:
+        results = await asyncio.gather(*(pool.request({"n": n}, timeout=5) for n in range(5)))
+        assert [r["echo"] for r in results] == list(range(5))
+        # Todas las requests compartieron un único socket
+        assert len(connections) == 1
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_pool_reconnects_after_connection_loss():
+    connections = []
+    server, port = await start_mux_server(lambda n: 0, connections)
+    pool = ProcessorPool("127.0.0.1", port, size=2, binary=False)
+    try:
+        assert (await pool.request({"n": 1}, timeout=5))["echo"] == 1
+        # B corta todas las conexiones abiertas
+        for w in connections:
+            w.close()
+        await asyncio.sleep(0.05)
+        assert (await pool.request({"n": 2}, timeout=5))["echo"] == 2
+        assert len(connections) >= 2
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_blobs_roundtrip_outside_codec_body():
+    message = {"screenshot": b"\x89PNG" + bytes(200), "thumbnails": [b"a", b"b"], "title": "x"}
+    blobs, paths = [], []
+    body = extract_blobs(message, blobs, paths)
+    assert body["screenshot"] is None
+    assert blobs[1:] == [b"a", b"b"]
+    assert paths == [["screenshot"], ["thumbnails", 0], ["thumbnails", 1]]
+    assert restore_blobs(body, blobs, paths) == message
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec_name", available_codecs())
+async def test_frame_v2_keeps_payloads_that_look_like_blob_markers(codec_name):
+    """Los datos del usuario no se confunden con referencias a blobs."""
+    codec = get_codec(codec_name)
+    message = {"meta": {"__blob__": 0}, "list": [{"__blob__": 1}, b"raw"], "0": {"1": b"x"}}
+    reader = asyncio.StreamReader()
+    reader.feed_data(pack_frame_v2(7, message, codec))
+    reader.feed_eof()
+    _, body, blobs = await read_frame_v2(reader)
+    assert decode_frame_v2(body, blobs, codec) == message
+    with pytest.raises(ValueError):
+        decode_frame_v2(body, blobs[:1], codec)
+
+
+def test_negotiate_picks_first_common_codec():
+    assert negotiate({"versions": [2], "codecs": ["zstd-msgpack", "json"]}) == {"version": 2, "codec": "json"}
+    assert "error" in negotiate({"versions": [9], "codecs": ["json"]})
+    assert "error" in negotiate({"versions": [2], "codecs": ["nope"]})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec_name", available_codecs())
+async def test_frame_v2_roundtrip(codec_name):
+    codec = get_codec(codec_name)
+    png = bytes(range(256)) * 10
+    frame = pack_frame_v2(42, {"screenshot": png, "meta": {"n": 1}}, codec)
+    # Los bytes viajan crudos: el frame no crece como con base64
+    assert len(frame) < len(png) + 200
+
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame)
+    reader.feed_eof()
+    request_id, body, blobs = await read_frame_v2(reader)
+    assert request_id == 42
+    assert decode_frame_v2(body, blobs, codec) == {"screenshot": png, "meta": {"n": 1}}
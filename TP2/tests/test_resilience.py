@@ -0,0 +1,291 @@
+import asyncio
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+import pytest
+
+# Asegurar que TP2 esté en sys.path para que 'common' sea importable
+base = pathlib.Path(__file__).resolve().parents[1]
+if str(base) not in sys.path:
+    sys.path.insert(0, str(base))
+
+from common.protocol import ProcessorPool  # noqa: E402
+from common.resilience import (  # noqa: E402
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilienceProfile,
+    ResilientProcessor,
+    parse_replica,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakePool:
+    """Réplica de B: `behaviour` es una lista de "ok", "fail" o segundos de demora (se repite el último)."""
+
+    def __init__(self, name, behaviour):
+        self.name = name
+        self.behaviour = list(behaviour)
+        self.calls = []
+        self.cancelled = 0
+        self.in_flight = 0
+        self.capacity = None
+        self.renderers = {}
+
+    async def request(self, payload, timeout=30):
+        if payload.get("health"):
+            if "fail" in self.behaviour:
+                raise ConnectionError(f"{self.name} down")
+            return {"status": "ok", "in_flight": self.in_flight, "capacity": self.capacity,
+                    "renderers": self.renderers}
+        self.calls.append(timeout)
+        step = self.behaviour.pop(0) if len(self.behaviour) > 1 else self.behaviour[0]
+        if step == "fail":
+            raise ConnectionError(f"{self.name} down")
+        if step != "ok":
+            try:
+                await asyncio.wait_for(asyncio.sleep(step), timeout)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return {"from": self.name}
+
+    async def close(self):
+        pass
+
+
+def make_processor(pools, **profile):
+    by_port = {9000 + i: pool for i, pool in enumerate(pools)}
+    return ResilientProcessor(
+        [("b", port) for port in by_port],
+        lambda host, port: by_port[port],
+        ResilienceProfile(**profile),
+        rng=lambda: 0.0,
+    )
+
+
+def test_circuit_breaker_opens_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()  # una sola request de prueba
+    assert breaker.state == "half_open" and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 2
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+    assert ResilienceProfile(backoff_base=0.1, backoff_cap=0.3).backoff(5, rng=lambda: 1.0) == 0.3
+    assert parse_replica("[::1]:9001") == ("::1", 9001)
+    with pytest.raises(ValueError):
+        parse_replica("localhost")
+
+
+@pytest.mark.asyncio
+async def test_short_budget_timeouts_do_not_open_the_breaker():
+    """Un cliente con ?budget= corto no puede abrir el circuito de una réplica sana."""
+    slow = FakePool("slow", [0.5])
+    processor = make_processor([slow], attempts=1, breaker_failures=2, attempt_timeout=0.3)
+
+    for _ in range(5):
+        with pytest.raises(asyncio.TimeoutError):
+            await processor.request({}, budget=0.08)
+    assert processor.stats()["backends"]["b:9000"]["state"] == "closed"
+
+    # El tope completo sí cuenta: dos timeouts seguidos abren el circuito
+    for _ in range(2):
+        with pytest.raises(asyncio.TimeoutError):
+            await processor.request({})
+    assert processor.stats()["backends"]["b:9000"]["state"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_retries_move_to_another_replica_and_breaker_fails_fast():
+    down = FakePool("down", ["fail"])
+    up = FakePool("up", ["ok"])
+    processor = make_processor([down, up], attempts=3, breaker_failures=2, breaker_reset=60)
+
+    assert await processor.request({}) == {"from": "up"}
+    assert len(down.calls) == 1 and processor.counters["retries"] == 1
+
+    # Con el circuito de "down" abierto, las requests van directo a "up"
+    await processor.request({})
+    await processor.request({})
+    assert len(down.calls) == 2 and len(up.calls) == 3
+    assert processor.stats()["backends"]["b:9000"]["state"] == "open"
+
+    # Sin réplicas disponibles se falla de inmediato, sin esperar timeouts
+    only_down = make_processor([FakePool("down", ["fail"])], attempts=5, breaker_failures=2, breaker_reset=60)
+    with pytest.raises(ConnectionError):
+        await only_down.request({})
+    with pytest.raises(CircuitOpenError):
+        await only_down.request({})
+    assert only_down.counters["fast_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_timeouts_come_from_the_remaining_budget():
+    slow = FakePool("slow", [5])
+    processor = make_processor([slow], attempts=3, attempt_timeout=0.2, budget=10)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    with pytest.raises(asyncio.TimeoutError):
+        await processor.request({}, budget=0.3)
+    assert loop.time() - start < 0.5
+    # El primer intento usa su tope; el segundo, lo que queda del presupuesto
+    assert slow.calls[0] == 0.2 and slow.calls[1] < 0.11
+
+
+@pytest.mark.asyncio
+async def test_hedge_goes_to_second_replica_after_p95():
+    # Sin carga, los turnos alternan: la request 21 es la número 11 de "primary"
+    primary = FakePool("primary", [0.0] * 10 + [1.0])
+    secondary = FakePool("secondary", [0.0])
+    processor = make_processor([primary, secondary], hedge=True)
+    for _ in range(20):
+        await processor.request({})
+    assert len(primary.calls) == len(secondary.calls) == 10
+
+    result = await processor.request({})
+    assert result == {"from": "secondary"}
+    assert processor.counters["hedged"] == 1 and processor.counters["hedge_wins"] == 1
+    await asyncio.sleep(0.01)
+    assert primary.cancelled == 1  # la copia lenta se cancela
+
+
+@pytest.mark.asyncio
+async def test_routes_to_least_loaded_and_health_checks_remove_and_readd():
+    busy = FakePool("busy", ["ok"])
+    idle = FakePool("idle", ["ok"])
+    processor = make_processor([busy, idle], health_failures=2)
+
+    # B informa 3 tareas en curso con 2 procesos en "busy": todo va a "idle"
+    busy.in_flight, busy.capacity = 3, 2
+    busy.renderers = {"wireframe": {"count": 4, "failures": 0, "total_ms": 80.0, "max_ms": 30.0, "avg_ms": 20.0}}
+    await processor.check_health()
+    assert processor.stats()["backends"]["b:9000"]["renderers"] == busy.renderers
+    for _ in range(3):
+        assert await processor.request({}) == {"from": "idle"}
+
+    # Dos chequeos fallidos seguidos sacan a la réplica del reparto
+    busy.in_flight = 0
+    idle.behaviour = ["fail"]
+    await processor.check_health()
+    assert processor.stats()["backends"]["b:9001"]["healthy"]
+    await processor.check_health()
+    assert not processor.stats()["backends"]["b:9001"]["healthy"]
+    assert await processor.request({}) == {"from": "busy"}
+    assert len(idle.calls) == 3
+
+    # Vuelve a responder: entra de nuevo al reparto
+    idle.behaviour = ["ok"]
+    await processor.check_health()
+    backend = processor.stats()["backends"]["b:9001"]
+    assert backend["healthy"] and backend["removed"] == 1 and backend["readded"] == 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_processing_server(port):
+    """Instancia real de la Parte B (server_processing.py) con un proceso."""
+    proc = subprocess.Popen(
+        [sys.executable, "server_processing.py", "-i", "127.0.0.1", "-p", str(port), "-n", "1"],
+        cwd=str(base), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    pytest.skip("no se pudo levantar server_processing.py")
+
+
+class CountingPool(ProcessorPool):
+    """ProcessorPool que cuenta las requests de trabajo (no los chequeos) que recibe."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.served = 0
+
+    async def request(self, payload, timeout=30):
+        if not payload.get("health"):
+            self.served += 1
+        return await super().request(payload, timeout=timeout)
+
+
+async def wait_until(condition, timeout=10):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timeout esperando el chequeo de salud"
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_several_processing_servers_share_load_and_recover():
+    ports = [free_port() for _ in range(3)]
+    procs = {port: start_processing_server(port) for port in ports}
+    pools = {}
+
+    def factory(host, port):
+        pools[port] = CountingPool(host, port, size=1)
+        return pools[port]
+
+    processor = ResilientProcessor(
+        [("127.0.0.1", port) for port in ports],
+        factory,
+        ResilienceProfile(health_interval=0.1, health_timeout=1, health_failures=1, breaker_reset=0.2),
+    )
+    payload = {"url": "https://example.com", "operations": []}
+    try:
+        processor.start_health_checks()
+        results = await asyncio.gather(*(processor.request(payload) for _ in range(30)))
+        assert all(r["status"] == "success" for r in results)
+        assert all(pool.served == 10 for pool in pools.values())
+
+        # Se cae una instancia: el chequeo la saca y las requests siguen saliendo bien
+        victim = f"127.0.0.1:{ports[0]}"
+        procs[ports[0]].kill()
+        procs[ports[0]].wait()
+        await wait_until(lambda: not processor.stats()["backends"][victim]["healthy"])
+        served = pools[ports[0]].served
+        results = await asyncio.gather(*(processor.request(payload) for _ in range(10)))
+        assert all(r["status"] == "success" for r in results)
+        assert pools[ports[0]].served == served
+
+        # Vuelve en el mismo puerto: se agrega de nuevo al reparto
+        procs[ports[0]] = start_processing_server(ports[0])
+        await wait_until(lambda: processor.stats()["backends"][victim]["healthy"])
+        await asyncio.gather(*(processor.request(payload) for _ in range(9)))
+        assert pools[ports[0]].served > served
+        assert processor.stats()["backends"][victim]["readded"] == 1
+    finally:
+        await processor.close()
+        for proc in procs.values():
+            proc.kill()
+            proc.wait()
@@ -51,13 +51,134 @@ async def test_parse_html_basic_empty():
     for i in range(1, 7):
         assert out["structure"].get(f"h{i}") == 0
 
+def test_streaming_extractor_matches_soup_reference():
+    """HtmlExtractor (una pasada, sin árbol) devuelve exactamente lo mismo que BeautifulSoup."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    html_parser = load_module_from_path("html_parser", base / "scraper" / "html_parser.py")
+
+    html = (
+        "<html><head><title> Hola <!-- c --> mundo </title>"
+        "<meta name='Description' content='d'><meta property='og:title' content='og'><meta name='x'>"
+        "</head><body><h1>a<h2>b</h2></h1><H3>c</H3>"
+        "<a href=''>vacío</a><a>sin href</a><a href='/p?q=1#f'>p</a><a href='https://otro/'>o</a>"
+        "<img><img src=''><img src='a.png'><img src='/b.png'><img src='c.png'><img src='d.png'>"
+        "<svg><title>no es el título</title></svg></body></html>"
+    )
+    expected = html_parser.parse_html_soup(html, "https://example.com/dir/", limit=3)
+    assert html_parser.parse_html_with_images(html, "https://example.com/dir/", limit=3) == expected
+    assert html_parser.parse_html_basic(html, "https://example.com/dir/") == expected[0]
+
+    # Alimentado de a pedazos (incluso cortando tags) da el mismo resultado
+    extractor = html_parser.HtmlExtractor("https://example.com/dir/", image_limit=3)
+    for i in range(0, len(html), 7):
+        extractor.feed(html[i:i + 7])
+    assert extractor.close() == expected
+
+
+def test_head_only_fields_do_not_depend_on_chunk_size():
+    """Con campos de <head> el resultado es el mismo se corte donde se corte la lectura."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    html_parser = load_module_from_path("html_parser", base / "scraper" / "html_parser.py")
+
+    html = (
+        "<html><head><title>T</title><meta name='description' content='head'></head>"
+        "<body><meta name='description' content='body'><meta property='og:title' content='late'>"
+        "<p>texto</p></body></html>"
+    )
+    results = []
+    for size in (1, 7, 64, len(html)):
+        extractor = html_parser.HtmlExtractor("https://example.com/", fields=["title", "meta_tags"])
+        for i in range(0, len(html), size):
+            extractor.feed(html[i:i + size])
+            if extractor.done:
+                break
+        results.append(extractor.close()[0])
+    assert results == [{"title": "T", "meta_tags": {"description": "head"}}] * 4
+
+
+def test_forwarded_images_are_ranked_like_processor():
+    """A reenvía las imágenes en el mismo orden que B usa al parsear el HTML, y B aplica su --max-images."""
+    from urllib.parse import urljoin
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from scraper import html_parser
+    from processor import pipeline
+
+    page = "https://example.com/dir/"
+    html = (
+        "<html><head><meta property='og:image' content='/og.jpg'></head><body>"
+        "<img src='/pixel.gif' width='1' height='1'><img src='sin-tamano.png'>"
+        "<img src='chica.jpg' width='200' height='100'><img src='data:image/png;base64,AAAA' width='900' height='900'>"
+        "<img src='/grande.jpg' width='1200px' height='800px'><img src='/og.jpg' width='600' height='400'>"
+        "</body></html>"
+    )
+    expected = [urljoin(page, src) for src in pipeline.find_image_sources(html.encode(), limit=10)]
+    _, images = html_parser.parse_html_with_images(html, page, limit=10)
+    assert images == expected == [
+        "https://example.com/og.jpg", "https://example.com/grande.jpg", "https://example.com/dir/chica.jpg",
+        "https://example.com/dir/sin-tamano.png", "https://example.com/pixel.gif",
+    ]
+    assert html_parser.parse_html_soup(html, page, limit=10)[1] == images
+    # Alimentado de a pedazos: el orden se decide al cerrar
+    extractor = html_parser.HtmlExtractor(page, image_limit=10)
+    for i in range(0, len(html), 11):
+        extractor.feed(html[i:i + 11])
+    assert extractor.close()[1] == images
+
+    try:
+        pipeline.configure_fetch(max_images=4)
+        forwarded = pipeline.page_from_forwarded({"image_urls": images, "fetch_ms": 1, "size_bytes": 10})
+        assert forwarded["image_sources"] == images[:4]
+    finally:
+        pipeline.configure_fetch()
+
+
+def test_link_normalizer_base_dedupe_filters_and_counts():
+    """Mismo resultado que urljoin, honrando <base href>, sin repetidos y con filtros opcionales."""
+    from urllib.parse import urljoin
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from scraper.link_normalizer import LinkNormalizer
+    from scraper import html_parser
+
+    page = "https://www.example.com/dir/page.html?x=1"
+    hrefs = ["/a", "/a", "/a/../b", "/a//c", "/d?", "/e;p", "c.html", "#top", "", "//cdn.example/x",
+             "https://otro.example/?utm_source=n&id=2#f", "mailto:a@b.c", "/f?utm_medium=x#s"]
+    links = LinkNormalizer(page)
+    for href in hrefs:
+        links.add(href)
+    assert links.links == list(dict.fromkeys(urljoin(page, h) for h in hrefs))
+    assert links.counts() == {"internal": 9, "external": 2, "other": 1}
+
+    stripped = LinkNormalizer(page, strip_fragments=True, strip_tracking=True)
+    for href in hrefs:
+        stripped.add(href)
+    assert "https://otro.example/?id=2" in stripped.links
+    assert "https://www.example.com/f" in stripped.links
+    assert "https://www.example.com/dir/page.html?x=1" in stripped.links  # "#top" y "" colapsan
+
+    html = (
+        "<html><head><base href='https://static.example/b/'><base href='/ignorada/'></head><body>"
+        "<a href='x'>1</a><a href='/y'>2</a><a href='x'>3</a><img src='i.png'></body></html>"
+    )
+    data, images = html_parser.parse_html_with_images(html, page, limit=3)
+    assert data["links"] == ["https://static.example/b/x", "https://static.example/y"]
+    assert data["link_counts"] == {"internal": 0, "external": 2, "other": 0}
+    assert images == ["https://static.example/b/i.png"]
+    assert (data, images) == html_parser.parse_html_soup(html, page, limit=3)
+
+
 @pytest.mark.asyncio
 async def test_handle_scrape_endpoint_success(aiohttp_client, monkeypatch):
     """
     Test del handler /scrape de server_scraping.py.
     - Añade el root del proyecto a sys.path para que 'scraper' sea importable.
     - Mockea scrape_worker para no depender de la red.
-    - Mockea la comunicación con la Parte B (send_request_and_receive_json).
+    - Mockea la comunicación con la Parte B (ProcessorPool).
     - Verifica respuesta consolidada y códigos HTTP.
     """
     base = pathlib.Path(__file__).resolve().parents[1]
@@ -68,9 +189,10 @@ async def test_handle_scrape_endpoint_success(aiohttp_client, monkeypatch):
 
     # Importar el módulo normalmente (de este modo las importaciones relativas/absolutas dentro del módulo funcionan)
     server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
 
     # Fake scrape_worker: devuelve scraping_data simple
-    async def fake_scrape_worker(url, session, timeout):
+    async def fake_scrape_worker(url, session, timeout, page=None, **kwargs):
         return {
             "title": "Fake",
             "links": ["https://example/"],
@@ -79,13 +201,20 @@ async def test_handle_scrape_endpoint_success(aiohttp_client, monkeypatch):
             "images_count": 0,
         }
 
-    # Fake processing server response
-    async def fake_send_request_and_receive_json(host, port, payload):
-        return {"processed": True, "note": "ok"}
+    # Fake pool de conexiones hacia B
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            return {"processed": True, "note": "ok"}
+
+        async def close(self):
+            pass
 
     # Parchear en el módulo cargado
-    monkeypatch.setattr(server_mod, "scrape_worker", fake_scrape_worker)
-    monkeypatch.setattr(server_mod, "send_request_and_receive_json", fake_send_request_and_receive_json)
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
 
     # Crear app y cliente de pruebas
     app: web.Application = server_mod.create_app(process_host="127.0.0.1", process_port=9001, workers=2, timeout=5)
@@ -105,6 +234,519 @@ async def test_handle_scrape_endpoint_success(aiohttp_client, monkeypatch):
     txt = await resp2.text()
     assert "missing url" in txt or "error" in txt.lower()
 
+@pytest.mark.asyncio
+async def test_handle_scrape_stream_sends_scraping_data_first(aiohttp_client, monkeypatch):
+    """
+    /scrape/stream envía scraping_data antes de que B termine y luego un evento por
+    cada parte de processing_data, cerrando con "done".
+    """
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
+
+    async def fake_scrape_worker(url, session, timeout, page=None, **kwargs):
+        return {"title": "Fake", "links": [], "meta_tags": {}, "structure": {}, "images_count": 0}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request_stream(self, payload, timeout=30):
+            assert payload["stream"] is True
+            yield {"event": "performance", "data": {"load_time_ms": 1}}
+            yield {"event": "screenshot", "data": b"\x89PNG"}
+            yield {"event": "done", "status": "success"}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+    client = await aiohttp_client(server_mod.create_app(workers=2, timeout=5))
+
+    resp = await client.get("/scrape/stream", params={"url": "https://example.com"})
+    assert resp.status == 200
+    assert resp.headers["Content-Type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in (await resp.text()).splitlines()]
+    assert [e["event"] for e in events] == ["scraping_data", "performance", "screenshot", "done"]
+    assert events[0]["scraping_data"]["title"] == "Fake"
+    assert events[2]["data"] == "iVBORw=="  # bytes de B -> base64 en el JSON
+    assert events[-1]["status"] == "success"
+
+    resp = await client.get("/scrape/stream", params={"url": "https://example.com", "format": "sse"})
+    text = await resp.text()
+    assert resp.headers["Content-Type"].startswith("text/event-stream")
+    assert text.startswith("event: scraping_data\ndata: ")
+    assert "event: done" in text
+
+@pytest.mark.asyncio
+async def test_handle_scrape_batch_bounds_fan_out(aiohttp_client, monkeypatch):
+    """
+    /scrape/batch acepta JSON o NDJSON, respeta el límite por host y devuelve
+    cada resultado apenas termina, con un resumen al final.
+    """
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
+
+    active = {}
+    peak = {}
+
+    async def fake_scrape_worker(url, session, timeout, page=None, **kwargs):
+        host = url.split("/")[2]
+        active[host] = active.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), active[host])
+        # La primera URL es la más lenta: su resultado debe salir al final
+        await asyncio.sleep(0.1 if url.endswith("/0") else 0.01)
+        active[host] -= 1
+        if "fail" in url:
+            raise web.HTTPBadGateway(text=json.dumps({"error": "boom"}), content_type="application/json")
+        return {"title": url, "links": [], "meta_tags": {}, "structure": {}, "images_count": 0}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            return {"processed": True}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+    app = server_mod.create_app(workers=8, timeout=5, per_host=2, batch_window=4)
+    client = await aiohttp_client(app)
+
+    urls = [f"https://a.example/{i}" for i in range(6)] + ["https://b.example/fail", "ftp://x"]
+    resp = await client.post("/scrape/batch", json=urls)
+    assert resp.status == 200
+    lines = [json.loads(line) for line in (await resp.text()).splitlines()]
+    results, summary = lines[:-1], lines[-1]
+    assert sorted(r["index"] for r in results) == list(range(len(urls)))
+    assert results[0]["index"] != 0  # no espera a la URL lenta para empezar a responder
+    assert peak["a.example"] == 2
+    by_index = {r["index"]: r for r in results}
+    assert by_index[1]["status"] == "success" and by_index[1]["scraping_data"]["title"] == urls[1]
+    assert by_index[6] == {"index": 6, "url": urls[6], "status": "failed", "error": "boom", "http_status": 502}
+    assert by_index[7]["status"] == "failed" and by_index[7]["http_status"] == 400
+    assert summary == {"done": True, "total": 8, "success": 6, "partial_failure": 0, "failed": 2}
+
+    ndjson = "\n".join([json.dumps(urls[1]), json.dumps({"url": urls[2]}), "https://b.example/x", ""])
+    resp = await client.post("/scrape/batch", data=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    lines = [json.loads(line) for line in (await resp.text()).splitlines()]
+    assert lines[-1]["total"] == 3 and lines[-1]["success"] == 3
+
+    resp = await client.post("/scrape/batch", data="{", headers={"Content-Type": "application/json"})
+    assert resp.status == 400
+
+@pytest.mark.asyncio
+async def test_host_scheduler_round_robin_limits_and_delays():
+    """Un host con muchas URLs no acapara los lugares globales; se respetan límite e intervalo por host."""
+    import time
+
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from scraper.host_scheduler import HostScheduler
+
+    scheduler = HostScheduler(capacity=2, per_host=2)
+    order, active, peak = [], {}, {}
+
+    async def job(url):
+        host = url.split("/")[2]
+        async with scheduler.slot(url):
+            order.append(host)
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+
+    urls = [f"https://a.example/{i}" for i in range(10)] + ["https://b.example/1", "https://c.example/1"]
+    await asyncio.gather(*(job(u) for u in urls))
+    assert len(order) == 12 and peak["a.example"] == 2
+    # b y c entran en los primeros turnos que se liberan, no detrás de las 10 de a
+    assert order.index("b.example") < 4 and order.index("c.example") < 4
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["queued"] == 0
+
+    # Intervalo mínimo por host (el Crawl-delay de robots.txt manda si es mayor)
+    async def crawl_delay(url):
+        return 0.05 if "slow" in url else None
+
+    scheduler = HostScheduler(capacity=4, per_host=4, min_delay=0.02, crawl_delay=crawl_delay)
+    starts = {"fast.example": [], "slow.example": []}
+
+    async def timed(url):
+        async with scheduler.slot(url):
+            starts[url.split("/")[2]].append(time.monotonic())
+
+    await asyncio.gather(*(timed(f"https://{h}/{i}") for h in starts for i in range(3)))
+    for host, min_gap in (("fast.example", 0.02), ("slow.example", 0.05)):
+        gaps = [b - a for a, b in zip(starts[host], starts[host][1:])]
+        assert all(g >= min_gap * 0.9 for g in gaps), (host, gaps)
+    assert scheduler.stats()["delayed"] == 4
+
+
+@pytest.mark.asyncio
+async def test_handle_scrape_uses_cache_and_single_flight(aiohttp_client, monkeypatch):
+    """
+    Requests concurrentes por la misma URL (normalizada) se resuelven con un único
+    scraping y una única llamada a B; las siguientes salen de la caché.
+    """
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
+
+    calls = {"scrape": 0, "process": 0}
+
+    async def fake_scrape_worker(url, session, timeout, page=None, **kwargs):
+        calls["scrape"] += 1
+        await asyncio.sleep(0.05)
+        return {"title": "Fake", "links": [], "meta_tags": {}, "structure": {}, "images_count": 0}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            calls["process"] += 1
+            return {"screenshot": b"\x89PNG"}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+    client = await aiohttp_client(server_mod.create_app(workers=4, timeout=5))
+
+    urls = ["https://Example.com/", "https://example.com", "https://example.com/#x"]
+    resps = await asyncio.gather(*(client.get("/scrape", params={"url": u}) for u in urls))
+    bodies = [await r.json() for r in resps]
+    assert [b["url"] for b in bodies] == urls
+    assert all(b["status"] == "success" for b in bodies)
+    assert calls == {"scrape": 1, "process": 1}
+
+    resp = await client.get("/scrape", params={"url": "https://example.com"})
+    assert (await resp.json())["processing_data"]["screenshot"] == "iVBORw=="
+    assert calls == {"scrape": 1, "process": 1}
+
+    stats = await (await client.get("/stats")).json()
+    assert stats["cache"]["scraping"]["hits"] == 1
+    assert stats["cache"]["processing"]["misses"] == 1
+    assert stats["single_flight"]["collapsed"] == 2
+    assert "p95_ms" in stats["event_loop_lag"]
+    assert stats["http_pool"]["in_use"] == 0 and "queued_total" in stats["http_pool"]
+
+@pytest.mark.asyncio
+async def test_handle_scrape_fields_selects_parts_and_skips_processor(aiohttp_client, monkeypatch):
+    """?fields= limita scraping_data y las operaciones de B; sin operaciones no se consulta a B."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
+
+    scrapes, payloads = [], []
+
+    async def fake_scrape_worker(url, session, timeout, page=None, fields=None, **kwargs):
+        scrapes.append((fields, page is not None))
+        data = {"title": "Fake", "links": [], "meta_tags": {"d": "x"}, "structure": {}, "images_count": 0}
+        return {f: data[f] for f in (fields or data)}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            payloads.append(payload)
+            return {"status": "success", "processing_data": {op: op for op in payload.get("operations", ())}}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+    client = await aiohttp_client(server_mod.create_app(workers=2, timeout=5, forward_mode="html"))
+
+    resp = await client.get("/scrape", params={"url": "https://a.example", "fields": "title,meta_tags"})
+    body = await resp.json()
+    assert body["status"] == "success"
+    assert body["scraping_data"] == {"title": "Fake", "meta_tags": {"d": "x"}}
+    assert body["processing_data"] == {}
+    assert payloads == [] and scrapes == [(("title", "meta_tags"), False)]
+
+    # Sólo screenshot: B recibe la operación y A no guarda la página para reenviarla
+    resp = await client.get("/scrape", params={"url": "https://b.example", "include": "links,screenshot"})
+    body = await resp.json()
+    assert body["processing_data"]["processing_data"] == {"screenshot": "screenshot"}
+    assert payloads[-1]["operations"] == ["screenshot"] and "page" not in payloads[-1]
+    assert scrapes[-1] == (("links",), False)
+
+    for bad in ("title,nope", "", " , "):
+        resp = await client.get("/scrape", params={"url": "https://a.example", "fields": bad})
+        assert resp.status == 400
+        error = (await resp.json())["error"]
+        assert ("invalid field: nope" if bad.strip(" ,") else "empty fields") in error
+        assert "valid fields: title, links" in error and "processing_data" in error
+
+    # Los resultados parciales no se cachean: la request completa vuelve a scrapear
+    await client.get("/scrape", params={"url": "https://a.example"})
+    assert scrapes[-1] == (None, True) and "operations" not in payloads[-1]
+
+
+@pytest.mark.asyncio
+async def test_scrape_engine_direct_run_and_batch(monkeypatch):
+    """El motor funciona sin el servidor HTTP: run, run_batch y los errores de opciones."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    engine_mod = importlib.import_module("scraper.engine")
+
+    payloads = []
+
+    async def fake_scrape_worker(url, session, timeout, page=None, fields=None, **kwargs):
+        if "fail" in url:
+            raise web.HTTPGatewayTimeout(text=json.dumps({"error": "lento"}), content_type="application/json")
+        if page is not None:
+            page.update({"body": b"<html></html>", "final_url": url, "fetch_ms": 1, "size_bytes": 13, "image_urls": []})
+        data = {"title": url, "links": [], "meta_tags": {}, "structure": {}, "images_count": 0}
+        return {f: data[f] for f in (fields or data)}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            payloads.append(payload)
+            if "down" in payload["url"]:
+                raise ConnectionError("B caído")
+            return {"status": "success", "processing_data": {}}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+
+    with pytest.raises(ValueError):
+        engine_mod.make_options(fields="title,nope")
+    with pytest.raises(ValueError):
+        engine_mod.make_options(forward_mode="full")
+
+    async with engine_mod.ScrapeEngine(batch_window=2) as engine:
+        response = await engine.run("https://a.example/", engine_mod.make_options())
+        assert response["status"] == "success" and response["scraping_data"]["title"] == "https://a.example/"
+        assert "html_zlib" in payloads[-1]["page"]
+
+        only_title = await engine.run("https://c.example/", engine_mod.make_options(fields="title"))
+        assert only_title["scraping_data"] == {"title": "https://c.example/"} and only_title["processing_data"] == {}
+        assert len(payloads) == 1
+
+        urls = ["https://b.example/1", "https://down.example/", "https://fail.example/", "nope"]
+        results = [r async for r in engine.run_batch(urls, engine_mod.make_options())]
+        summary = results.pop()
+        by_index = {r["index"]: r for r in results}
+        assert summary == {"done": True, "total": 4, "success": 1, "partial_failure": 1, "failed": 2}
+        assert by_index[1]["processing_data"]["error"].startswith("processing_server_error")
+        assert by_index[2]["http_status"] == 504 and by_index[2]["error"] == "lento"
+        assert by_index[3]["http_status"] == 400
+
+        stats = engine.stats()
+        assert stats["scheduler"]["granted"] == 5 and stats["scheduler"]["active"] == 0
+        # B caído: se reintentó (con backoff) antes de responder partial_failure
+        assert stats["processor"]["retries"] >= 1 and stats["processor"]["failures"] == 1
+
+        # URLs mal formadas: 400 como antes de la caché, no un 500
+        with pytest.raises(web.HTTPBadRequest):
+            await engine.run("http://[::1/", engine_mod.make_options())
+        bad = ["http://example.com:abc/", "http://example.com:99999/", "http://[::1/"]
+        results = [r async for r in engine.run_batch(bad, engine_mod.make_options())]
+        assert [r["http_status"] for r in results[:-1]] == [400, 400, 400]
+
+        # Un renderizador explícito llega a B y no se sirve (ni guarda) el processing_data cacheado
+        with pytest.raises(ValueError):
+            engine_mod.make_options(renderer="gpu")
+        sent = len(payloads)
+        await engine.run("https://a.example/", engine_mod.make_options(renderer="wireframe"))
+        assert len(payloads) == sent + 1 and payloads[-1]["renderer"] == "wireframe"
+        assert "renderer" not in payloads[0]
+
+
+@pytest.mark.asyncio
+async def test_connector_profile_and_pool_stats(aiohttp_server):
+    """El perfil configura el connector y las estadísticas ven colas y reutilización de conexiones."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from scraper.async_http import ConnectionPoolStats, ConnectorProfile, make_session
+
+    async def slow(request):
+        await asyncio.sleep(0.05)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_get("/", slow)
+    server = await aiohttp_server(app)
+
+    profile = ConnectorProfile(limit=1, limit_per_host=1, keepalive_timeout=5, dns_ttl=60,
+                               happy_eyeballs_delay=0, resolver="threaded")
+    stats = ConnectionPoolStats()
+    session = make_session(profile, stats=stats)
+    try:
+        assert session.connector.limit == 1 and session.connector.use_dns_cache
+
+        async def get():
+            async with session.get(server.make_url("/")) as resp:
+                return await resp.text()
+
+        assert await asyncio.gather(get(), get(), get()) == ["ok"] * 3
+        snap = stats.snapshot(session.connector)
+        assert snap["queued_total"] == 2 and snap["queued"] == 0
+        assert snap["created"] == 1 and snap["reused"] == 2
+        assert snap["in_use"] == 0 and snap["idle"] == 1
+        assert snap["queue_wait_ms_max"] >= 40
+    finally:
+        await session.close()
+
+    with pytest.raises(ValueError):
+        ConnectorProfile(resolver="nope")
+
+
+@pytest.mark.asyncio
+async def test_scrape_worker_conditional_get_reuses_scraping_data(aiohttp_server, monkeypatch):
+    """Tras guardar ETag/Last-Modified, un 304 devuelve el scraping_data anterior sin parsear."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    engine_mod = importlib.import_module("scraper.engine")
+    from common.cache import ResponseCache
+
+    seen = []
+
+    async def page(request):
+        seen.append((request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(
+            text="<html><head><title>T</title></head><body><img src='/i.png'></body></html>",
+            content_type="text/html",
+            headers={"ETag": '"v1"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/p", page)
+    server = await aiohttp_server(app)
+    url = str(server.make_url("/p"))
+
+    parses = []
+
+    class CountingExtractor(engine_mod.HtmlExtractor):
+        def __init__(self, *args, **kwargs):
+            parses.append(1)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(engine_mod, "HtmlExtractor", CountingExtractor)
+
+    cache = ResponseCache({"validators": 60})
+    async with aiohttp.ClientSession() as session:
+        first = await engine_mod.scrape_worker(url, session, 5, cache=cache)
+        page_info = {}
+        second = await engine_mod.scrape_worker(url, session, 5, page=page_info, cache=cache)
+
+    assert seen == [(None, None), ('"v1"', "Wed, 01 Jan 2025 00:00:00 GMT")]
+    assert second == first and first["title"] == "T"
+    assert len(parses) == 1
+    assert "body" not in page_info and page_info["image_urls"] == [url.replace("/p", "/i.png")]
+    # Sin cuerpo que reenviar, el modo html cae a reenviar las URLs de imágenes
+    forwarded = engine_mod.build_forwarded_page(page_info, "html")
+    assert forwarded["image_urls"] == page_info["image_urls"] and "html_zlib" not in forwarded
+
+@pytest.mark.asyncio
+async def test_parse_executor_routes_by_size_and_loop_monitor_sees_blocking():
+    """
+    En modo auto los documentos grandes van al pool de procesos (como bytes) y los
+    chicos a threads, con el mismo resultado; el monitor detecta un loop bloqueado.
+    """
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    from scraper.parse_executor import ParseExecutor, parse_document
+    from common.loop_monitor import LoopLagMonitor
+
+    small = "<html><head><title>ñ</title></head><body><a href='/a'>a</a><img src='i.png'></body></html>"
+    large = small.replace("<body>", "<body>" + "<p>x</p>" * 2000)
+    executor = ParseExecutor("auto", workers=2, process_threshold=4096)
+    try:
+        for html in (small, large):
+            body = html.encode("latin-1")
+            out = await executor.parse(body, "latin-1", "https://example.com/", 3)
+            assert out == parse_document(body, "latin-1", "https://example.com/", 3)
+            assert out[0]["title"] == "ñ" and out[1] == ["https://example.com/i.png"]
+        assert executor.stats == {"inline": 0, "thread": 1, "process": 1}
+    finally:
+        executor.close()
+
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.03)
+    import time
+    time.sleep(0.1)  # bloquea el loop
+    await asyncio.sleep(0.03)
+    await monitor.stop()
+    assert monitor.stats()["max_ms"] >= 80
+
+@pytest.mark.asyncio
+async def test_scrape_worker_streams_body_with_cap_and_early_stop(aiohttp_server, monkeypatch):
+    """
+    El tope se aplica a los bytes recibidos aunque no haya Content-Length, y si
+    sólo se piden campos de <head> la lectura se corta sin esperar el resto.
+    """
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    engine_mod = importlib.import_module("scraper.engine")
+    monkeypatch.setattr(engine_mod, "MAX_PAGE_BYTES", 16 * 1024)
+    from scraper.parse_executor import ParseExecutor
+
+    async def chunked(request):
+        # Sin Content-Length: transfer-encoding chunked
+        resp = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        await resp.write("<html><head><title>Lento</title><meta name='d' content='x'></head><body>".encode())
+        for _ in range(40):
+            await resp.write(b"<p>" + b"x" * 4096 + b"</p>")
+            await asyncio.sleep(0.05)
+        await resp.write(b"</body></html>")
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/big", chunked)
+    server = await aiohttp_server(app)
+    url = str(server.make_url("/big"))
+
+    async with aiohttp.ClientSession() as session:
+        with pytest.raises(web.HTTPRequestEntityTooLarge):
+            await engine_mod.scrape_worker(url, session, 10)
+
+        parser = ParseExecutor("thread", workers=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            data = await engine_mod.scrape_worker(url, session, 10, parser=parser, fields=["title", "meta_tags"])
+        finally:
+            parser.close()
+        assert loop.time() - start < 1  # leer todo tardaría ~2 s
+    assert data == {"title": "Lento", "meta_tags": {"d": "x"}}
+    assert parser.stats["thread"] == 1
+
+
 # La prueba asume que server_scraping.py está en ejecución en host:port
 HOST = os.environ.get("SCRAPER_HOST", "127.0.0.1")
 PORT = int(os.environ.get("SCRAPER_PORT", "8000"))
@@ -127,4 +769,58 @@ async def test_scraper_returns_expected_structure():
     assert "title" in sd
     assert "links" in sd
     # debe estar presente status
-    assert "status" in data
\ No newline at end of file
+    assert "status" in data
+
+@pytest.mark.asyncio
+async def test_blobs_option_returns_urls_served_by_blob_endpoint(aiohttp_client, monkeypatch):
+    """?blobs=url|id reemplaza el base64 por referencias; /blobs/{id} sirve el contenido."""
+    base = pathlib.Path(__file__).resolve().parents[1]
+    if str(base) not in sys.path:
+        sys.path.insert(0, str(base))
+    server_mod = importlib.import_module("server_scraping")
+    engine_mod = importlib.import_module("scraper.engine")
+
+    png = b"\x89PNG\r\n\x1a\n" + b"shot" * 100
+    logo = b"RIFF\x00\x00\x00\x00WEBP" + b"logo" * 50
+
+    async def fake_scrape_worker(url, session, timeout, page=None, fields=None, **kwargs):
+        return {"title": "Fake", "links": [], "meta_tags": {}, "structure": {}, "images_count": 2}
+
+    class FakeProcessorPool:
+        def __init__(self, host, port, size=1, **kwargs):
+            pass
+
+        async def request(self, payload, timeout=30):
+            data = {"screenshot": png, "thumbnails": [logo, logo], "performance": {"load_time_ms": 1}}
+            return {"status": "success", "processing_data": data}
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(engine_mod, "scrape_worker", fake_scrape_worker)
+    monkeypatch.setattr(engine_mod, "ProcessorPool", FakeProcessorPool)
+    client = await aiohttp_client(server_mod.create_app(workers=2, timeout=5))
+
+    inline = await (await client.get("/scrape", params={"url": "https://a.example"})).json()
+    resp = await client.get("/scrape", params={"url": "https://a.example", "blobs": "url"})
+    data = (await resp.json())["processing_data"]["processing_data"]
+    assert data["performance"] == {"load_time_ms": 1}
+    assert data["screenshot"].startswith("/blobs/")
+    # El mismo logo en dos lugares es un único blob
+    assert data["thumbnails"][0] == data["thumbnails"][1]
+    assert len(await resp.read()) < len(json.dumps(inline)) / 2
+
+    shot = await client.get(data["screenshot"])
+    assert shot.status == 200 and shot.content_type == "image/png" and await shot.read() == png
+    assert "immutable" in shot.headers["Cache-Control"]
+    again = await client.get(data["screenshot"], headers={"If-None-Match": shot.headers["ETag"]})
+    assert again.status == 304
+    thumb = await client.get(data["thumbnails"][0])
+    assert thumb.content_type == "image/webp" and await thumb.read() == logo
+
+    ids = await (await client.get("/scrape", params={"url": "https://a.example", "blobs": "id"})).json()
+    assert "/blobs/" + ids["processing_data"]["processing_data"]["screenshot"] == data["screenshot"]
+    assert (await client.get("/blobs/" + "0" * 64)).status == 404
+    assert (await client.get("/scrape", params={"url": "https://a.example", "blobs": "zip"})).status == 400
+    stats = await (await client.get("/stats")).json()
+    assert stats["blobs"]["stored"] == 2